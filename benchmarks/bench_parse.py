@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+"""
+Measure parsing throughput and allocations on a synthetic corpus.
+
+usage: bench_parse.py [--count N] [--seed S] [--repeat R] [--no-vendor]
+                      [--output results.json] [--compare old.json]
+
+Results are written as JSON so that runs of different versions can be
+compared with --compare.  Benchmarks of APIs the installed release
+lacks, or that fail on the corpus, are skipped; --no-vendor leaves
+vendor namespaces out of the corpus for releases that cannot parse them.
+"""
+import argparse
+import datetime
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import radiotap as r
+
+from corpus import make_corpus
+
+def _radiotap_dict(packets):
+    return [r.radiotap_parse(pkt) for pkt in packets]
+
+def _radiotap_valuelist(packets):
+    return [r.radiotap_parse(pkt, valuelist=True) for pkt in packets]
+
+def _radiotap_lazy(packets):
+    results = []
+    for pkt in packets:
+        off, hdr = r.radiotap_parse_lazy(pkt)
+        hdr.get('dbm_antsignal')
+        results.append(hdr)
+    return results
+
+def _ieee80211(packets):
+    results = []
+    for pkt in packets:
+        off, radiotap = r.radiotap_parse(pkt)
+        results.append((radiotap, r.ieee80211_parse(pkt, off)))
+    return results
+
+# (name, function, radiotap API it needs); benchmarks whose API the
+# installed release lacks are skipped, so older releases can be measured
+BENCHMARKS = (
+    ('radiotap_parse', _radiotap_dict, 'radiotap_parse'),
+    ('radiotap_parse_valuelist', _radiotap_valuelist, 'radiotap_parse'),
+    ('radiotap_parse_lazy', _radiotap_lazy, 'radiotap_parse_lazy'),
+    ('radiotap_parse+ieee80211_parse', _ieee80211, 'ieee80211_parse'),
+)
+
+def _allocations(func, packets):
+    """
+    Bytes per packet held by the results, and peak bytes per packet
+    traced while producing them.
+    """
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        results = func(packets)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del results
+    return (current - base) / len(packets), (peak - base) / len(packets)
+
+def run(count, seed, repeat, vendor=True):
+    packets = make_corpus(count, seed, vendor)
+    results = {}
+    for name, func, api in BENCHMARKS:
+        if not hasattr(r, api):
+            print('skipping %s: radiotap.%s not available' % (name, api))
+            continue
+        try:
+            func(packets)  # warm the plan cache
+        except Exception as e:
+            # e.g. releases that cannot parse vendor namespaces
+            print('skipping %s: %s: %s' % (name, type(e).__name__, e))
+            continue
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func(packets)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        retained, peak = _allocations(func, packets[:min(count, 10000)])
+        results[name] = {
+            'packets_per_sec': count / best,
+            'result_bytes_per_packet': retained,
+            'peak_bytes_per_packet': peak,
+        }
+    return {
+        'date': datetime.datetime.now().isoformat(),
+        'python': platform.python_implementation() + ' ' + platform.python_version(),
+        'platform': platform.platform(),
+        'count': count,
+        'seed': seed,
+        'vendor': vendor,
+        'results': results,
+    }
+
+def compare(old, new):
+    for name, result in new['results'].items():
+        before = old['results'].get(name)
+        if before is None:
+            continue
+        ratio = result['packets_per_sec'] / before['packets_per_sec']
+        print('%-32s %10.0f -> %10.0f pkt/s  (%+.1f%%)' % (
+            name, before['packets_per_sec'], result['packets_per_sec'],
+            (ratio - 1) * 100))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--count', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-vendor', dest='vendor', action='store_false')
+    parser.add_argument('--output')
+    parser.add_argument('--compare')
+    args = parser.parse_args(argv)
+
+    result = run(args.count, args.seed, args.repeat, args.vendor)
+    for name, values in result['results'].items():
+        print('%-32s %10.0f pkt/s  %8.0f B/pkt' % (
+            name, values['packets_per_sec'], values['result_bytes_per_packet']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), result)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+Measure thread-pool parsing scaling on a shared buffer.
+
+usage: bench_threads.py [--count N] [--seed S] [--repeat R]
+                        [--threads 1,2,4,8] [--chunk C] [--output results.json]
+
+The corpus is laid out in one buffer and parsed in chunks of C packets
+by a concurrent.futures thread pool of each size; run it under a regular
+and a free-threaded interpreter to compare.  Only the free-threaded
+build is expected to scale beyond one thread.
+"""
+import argparse
+import concurrent.futures
+import datetime
+import json
+import platform
+import sys
+import time
+
+import radiotap as r
+
+from corpus import make_corpus
+
+def _layout(packets):
+    """Concatenate packets into one buffer and return (buffer, spans)."""
+    spans = []
+    offset = 0
+    for pkt in packets:
+        spans.append((offset, offset + len(pkt)))
+        offset += len(pkt)
+    return memoryview(b''.join(packets)), spans
+
+def _parse_chunk(buf, spans):
+    for start, end in spans:
+        pkt = buf[start:end]
+        off, radiotap = r.radiotap_parse(pkt)
+        r.ieee80211_parse(pkt, off)
+    return len(spans)
+
+def _timed(pool, buf, chunks):
+    started = time.perf_counter()
+    parsed = sum(pool.map(lambda spans: _parse_chunk(buf, spans), chunks))
+    return parsed, time.perf_counter() - started
+
+def run(count, seed, repeat, threads, chunk):
+    buf, spans = _layout(make_corpus(count, seed))
+    chunks = [spans[i:i + chunk] for i in range(0, len(spans), chunk)]
+    _parse_chunk(buf, spans[:1000])  # warm the plan cache
+
+    results = {}
+    for workers in threads:
+        with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+            best = min(_timed(pool, buf, chunks)[1] for _ in range(repeat))
+        results[workers] = {'packets_per_sec': count / best}
+    single = results[threads[0]]['packets_per_sec']
+    for values in results.values():
+        values['speedup'] = values['packets_per_sec'] / single
+
+    gil = getattr(sys, '_is_gil_enabled', lambda: True)()
+    return {
+        'date': datetime.datetime.now().isoformat(),
+        'python': platform.python_implementation() + ' ' + platform.python_version(),
+        'gil': gil,
+        'platform': platform.platform(),
+        'count': count,
+        'seed': seed,
+        'chunk': chunk,
+        'results': results,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--count', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--threads', default='1,2,4,8')
+    parser.add_argument('--chunk', type=int, default=1024)
+    parser.add_argument('--output')
+    args = parser.parse_args(argv)
+
+    threads = [int(n) for n in args.threads.split(',')]
+    result = run(args.count, args.seed, args.repeat, threads, args.chunk)
+    print('%s, GIL %s' % (result['python'],
+                          'enabled' if result['gil'] else 'disabled'))
+    for workers, values in result['results'].items():
+        print('%3d threads %10.0f pkt/s  x%.2f' % (
+            workers, values['packets_per_sec'], values['speedup']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+    sys.exit(main())
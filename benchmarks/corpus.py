@@ -0,0 +1,182 @@
+"""
+    reproducible synthetic radiotap corpus for benchmarks
+
+    make_corpus(count, seed) returns a list of packets (radiotap header
+    followed by an 802.11 MAC header and payload) drawn from a fixed mix
+    of header layouts and frame types, so that two runs with the same
+    arguments produce byte-identical corpora.
+"""
+import random
+import struct
+
+OUIS = (b'\x00\x13\x74', b'\x00\x17\x35', b'\x00\x0c\xe7')
+
+# (presence bit, alignment, struct format, value names, encoder) of the
+# fields used below, keyed like their radiotap_parse() names.  Headers
+# are packed with struct alone so that the corpus can be built for any
+# release of the parser.
+_FIELDS = {
+    'TSFT': (0, 8, 'Q', ('TSFT',), None),
+    'flags': (1, 1, 'B', ('flags',), None),
+    'rate': (2, 1, 'B', ('rate',), lambda rate: (int(round(rate * 2)),)),
+    'chan_freq': (3, 2, 'HH', ('chan_freq', 'chan_flags'), None),
+    'dbm_antsignal': (5, 1, 'b', ('dbm_antsignal',), None),
+    'dbm_antnoise': (6, 1, 'b', ('dbm_antnoise',), None),
+    'antenna': (11, 1, 'B', ('antenna',), None),
+    'rx_flags': (14, 2, 'H', ('rx_flags',), None),
+    'mcs_index': (19, 1, 'BBB', ('mcs_known', 'mcs_flags', 'mcs_index'), None),
+    'ampdu_refnum': (20, 4, 'IHBB', ('ampdu_refnum', 'ampdu_flags',
+                                     'ampdu_delim_crc_val', 'ampdu_reserved'),
+                     None),
+    'vht_known': (21, 2, 'HBB4BBBH',
+                  ('vht_known', 'vht_flags', 'vht_bw', 'vht_mcs_nss',
+                   'vht_coding', 'vht_group_id', 'vht_partial_aid'),
+                  lambda known, flags, bw, mcs_nss, coding, group_id, aid:
+                      (known, flags, bw) + tuple(mcs_nss) +
+                      (coding, group_id, aid)),
+}
+
+def _align(offset, alignment):
+    return (offset + alignment - 1) & ~(alignment - 1)
+
+class _Layout(object):
+    """
+    A radiotap header layout: fields by name, then (oui, subns, data,
+    present) vendor namespaces.  pack(**values) overrides the defaults.
+    """
+
+    def __init__(self, fields, vendor=(), **defaults):
+        self.fields = sorted((_FIELDS[name] for name in fields),
+                             key=lambda field: field[0])
+        words = [sum(1 << field[0] for field in self.fields)]
+        for ns in vendor:
+            words[-1] |= (1 << 30) | (1 << 31)
+            words.append(ns[3])
+        self.words = words
+        self.vendor = vendor
+        self.defaults = {'vht_mcs_nss': (0, 0, 0, 0)}
+        self.defaults.update(defaults)
+
+    def pack(self, **values):
+        merged = dict(self.defaults)
+        merged.update(values)
+        body = bytearray()
+        offset = 4 + 4 * len(self.words)
+        for _, alignment, fmt, names, encode in self.fields:
+            pad = _align(offset, alignment) - offset
+            raw = [merged.get(name, 0) for name in names]
+            if encode is not None:
+                raw = encode(*raw)
+            part = b'\x00' * pad + struct.pack('<' + fmt, *raw)
+            body += part
+            offset += len(part)
+        for oui, subns, data, _ in self.vendor:
+            pad = _align(offset, 2) - offset
+            part = b'\x00' * pad + struct.pack('<3sBH', oui, subns,
+                                               len(data)) + data
+            body += part
+            offset += len(part)
+        return struct.pack('<BBH%dI' % len(self.words), 0, 0, offset,
+                           *self.words) + bytes(body)
+
+def _legacy():
+    return _Layout(['TSFT', 'flags', 'rate', 'chan_freq', 'dbm_antsignal',
+                    'antenna', 'rx_flags'],
+                   chan_freq=2412, chan_flags=0x00a0)
+
+def _ht():
+    return _Layout(['TSFT', 'flags', 'chan_freq', 'dbm_antsignal',
+                    'dbm_antnoise', 'rx_flags', 'mcs_index', 'ampdu_refnum'],
+                   chan_freq=5180, chan_flags=0x0140,
+                   mcs_known=0x07, mcs_flags=0x01)
+
+def _vht():
+    return _Layout(['TSFT', 'flags', 'chan_freq', 'dbm_antsignal', 'antenna',
+                    'rx_flags', 'ampdu_refnum', 'vht_known'],
+                   chan_freq=5180, chan_flags=0x0140,
+                   vht_known=0x0044, vht_bw=4)
+
+def _vendor(nvendor):
+    return _Layout(
+        ['TSFT', 'flags', 'rate', 'chan_freq', 'dbm_antsignal'],
+        vendor=[(OUIS[i], i, bytes(range(4 + 4 * i)), 1) for i in range(nvendor)],
+        chan_freq=2437, chan_flags=0x00a0)
+
+def _extended():
+    """two radiotap namespaces, each reporting its own antenna signal"""
+    words = [(1 << 0) | (1 << 1) | (1 << 3) | (1 << 29) | (1 << 31),
+             (1 << 5) | (1 << 11) | (1 << 29) | (1 << 31),
+             (1 << 5) | (1 << 11)]
+    body = struct.pack('<QBxHH', 0, 0x10, 5180, 0x0140) + \
+        struct.pack('<bBbB', -50, 0, -55, 1)
+    length = 4 + 4 * len(words) + len(body)
+    return struct.pack('<BBH3I', 0, 0, length, *words) + body
+
+def _mac(rng, kind):
+    addrs = [bytes([0x02, 0, 0, 0, 0, rng.randrange(64)]) for _ in range(4)]
+    if kind == 'qos':
+        return struct.pack('<HH', 0x0188, 44) + addrs[0] + addrs[1] + \
+            addrs[2] + struct.pack('<HH', rng.randrange(4096) << 4,
+                                   rng.randrange(8)) + bytes(rng.randrange(1500))
+    if kind == 'wds':
+        return struct.pack('<HH', 0x0388, 44) + b''.join(addrs[:3]) + \
+            struct.pack('<H', rng.randrange(4096) << 4) + addrs[3] + \
+            struct.pack('<H', 0) + bytes(rng.randrange(1500))
+    if kind == 'blkack':
+        return struct.pack('<HH', 0x0094, 0) + addrs[0] + addrs[1] + \
+            struct.pack('<HHQ', 0x0005, rng.randrange(4096) << 4,
+                        rng.getrandbits(64))
+    # beacon
+    return struct.pack('<HH', 0x0080, 0) + b'\xff' * 6 + addrs[1] + \
+        addrs[1] + struct.pack('<H', rng.randrange(4096) << 4) + bytes(64)
+
+def _vendor1():
+    return _vendor(1)
+
+def _vendor2():
+    return _vendor(2)
+
+_VENDOR_LAYOUTS = (_vendor1, _vendor2)
+
+# (weight, header factory, values varied per packet)
+_MIX = (
+    (30, _legacy, lambda rng: {'rate': rng.choice((1., 6., 24., 54.)),
+                                'dbm_antsignal': -rng.randrange(30, 95),
+                                'TSFT': rng.getrandbits(40)}),
+    (25, _ht, lambda rng: {'mcs_index': rng.randrange(32),
+                            'ampdu_refnum': rng.randrange(1 << 16),
+                            'dbm_antsignal': -rng.randrange(30, 95)}),
+    (25, _vht, lambda rng: {'vht_mcs_nss': (rng.randrange(10) << 4 |
+                                            rng.randrange(1, 4), 0, 0, 0),
+                             'vht_flags': rng.choice((0, 4)),
+                             'dbm_antsignal': -rng.randrange(30, 95)}),
+    (10, _vendor1, lambda rng: {'dbm_antsignal': -rng.randrange(30, 95)}),
+    (5, _vendor2, lambda rng: {}),
+)
+_FRAMES = (('qos', 60), ('blkack', 15), ('beacon', 20), ('wds', 5))
+
+def make_corpus(count, seed=0, vendor=True):
+    """
+    Build count packets.  Without vendor, the layouts with vendor
+    namespaces are left out of the mix, for releases that cannot parse
+    them.
+    """
+    rng = random.Random(seed)
+    mix = [(weight, factory(), vary) for weight, factory, vary in _MIX
+           if vendor or factory not in _VENDOR_LAYOUTS]
+    extended = _extended()
+    weights = [weight for weight, _, _ in mix] + [5]
+    kinds = [kind for kind, _ in _FRAMES]
+    kind_weights = [weight for _, weight in _FRAMES]
+
+    packets = []
+    for _ in range(count):
+        choice = rng.choices(range(len(weights)), weights)[0]
+        if choice == len(mix):
+            hdr = extended
+        else:
+            _, tpl, vary = mix[choice]
+            hdr = tpl.pack(**vary(rng))
+        kind = rng.choices(kinds, kind_weights)[0]
+        packets.append(hdr + _mac(rng, kind))
+    return packets
@@ -1 +1,8 @@
 from .radiotap import radiotap_parse, ieee80211_parse
+from .radiotap import radiotap_parse_lazy, RadiotapHeader
+from .radiotap import radiotap_parse_checked, PARSE_STATUS_NAMES
+from .radiotap import compile_fields, FieldProjection
+from .radiotap import plan_cache_info, plan_cache_clear
+from .radiotap import enable_instrumentation, disable_instrumentation
+from .radiotap import instrumentation_snapshot
+from .radiotap import register_vendor_namespace, unregister_vendor_namespace
@@ -0,0 +1,232 @@
+"""
+    fixed-memory per-station and per-channel statistics
+
+    example:
+    >>> import radiotap as r, radiotap.pcap as rp, radiotap.aggregate as ra
+    >>> agg = ra.Aggregator(max_stations=5000)
+    >>> for tstamp, pkt in rp.read_pcap('foo.pcap'):
+    ...     off, radiotap = r.radiotap_parse(pkt)
+    ...     off, mac = r.ieee80211_parse(pkt, off)
+    ...     agg.update(radiotap, mac, len(pkt), tstamp)
+    >>> agg.to_dict()['stations']
+
+    Every statistic has a fixed size: signal and rate distributions are
+    histograms over fixed bins, and stations beyond max_stations evict
+    the least recently seen one.  Aggregators built by parallel workers
+    combine with merge().
+"""
+import bisect
+import collections
+
+from radiotap.radiotap import _field_ids
+
+# 1 dB signal bins from -100 to 0 dBm; values outside are clamped
+RSSI_EDGES = tuple(range(-100, 1))
+
+# lower edges of the rate bins in Mbps, from DSSS to EHT
+RATE_EDGES = (0, 1, 2, 5.5, 6, 9, 11, 12, 18, 24, 36, 48, 54, 65, 72.2, 100,
+              150, 200, 300, 400, 600, 866.7, 1200, 1733.3, 2400, 3600, 5000)
+
+# radiotap flags bits
+FLAG_NAMES = ('cfp', 'short_preamble', 'wep', 'fragmentation', 'fcs',
+              'data_pad', 'bad_fcs', 'short_gi')
+
+class Histogram(object):
+    """Counts of values falling into fixed bins given by their lower edges."""
+    __slots__ = ('edges', 'counts')
+
+    def __init__(self, edges):
+        self.edges = edges
+        self.counts = [0] * len(edges)
+
+    def add(self, value, count=1):
+        i = bisect.bisect_right(self.edges, value) - 1
+        self.counts[max(i, 0)] += count
+
+    def merge(self, other):
+        if other.edges != self.edges:
+            raise ValueError('histograms with different bins')
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+
+    def total(self):
+        return sum(self.counts)
+
+    def to_dict(self):
+        return dict((edge, count)
+                    for edge, count in zip(self.edges, self.counts) if count)
+
+def frame_rate(radiotap):
+    """Best rate in Mbps reported by a radiotap_parse() result, or None."""
+    for name in ('eht_rate_mbps', 'he_rate_mbps'):
+        rate = radiotap.get(name)
+        if rate is not None:
+            return rate
+    vht_user = radiotap.get('vht_user')
+    if vht_user and 0 in vht_user:
+        rate = vht_user[0].get('vht_rate_mbps')
+        if rate is not None:
+            return rate
+    rate = radiotap.get('mcs_rate')
+    if rate is not None:
+        return rate
+    return radiotap.get('rate')
+
+class LinkStats(object):
+    """Packet, byte, retry, flag, signal and rate statistics of one link."""
+    __slots__ = ('packets', 'bytes', 'retries', 'data_retries', 'flags',
+                 'rssi', 'rate', 'first_seen', 'last_seen')
+
+    def __init__(self):
+        self.packets = 0
+        self.bytes = 0
+        self.retries = 0
+        self.data_retries = 0
+        self.flags = [0] * len(FLAG_NAMES)
+        self.rssi = Histogram(RSSI_EDGES)
+        self.rate = Histogram(RATE_EDGES)
+        self.first_seen = None
+        self.last_seen = None
+
+    def update(self, radiotap, mac, length=0, tstamp=None):
+        self.packets += 1
+        self.bytes += length
+        if mac.get('fc', 0) & 0x0800:
+            self.retries += 1
+        self.data_retries += radiotap.get('data_retries', 0)
+
+        flags = radiotap.get('flags', 0)
+        for bit in range(len(FLAG_NAMES)):
+            if flags & (1 << bit):
+                self.flags[bit] += 1
+
+        signal = radiotap.get('dbm_antsignal')
+        if signal is not None:
+            self.rssi.add(signal)
+        rate = frame_rate(radiotap)
+        if rate is not None:
+            self.rate.add(rate)
+
+        if tstamp is not None:
+            if self.first_seen is None or tstamp < self.first_seen:
+                self.first_seen = tstamp
+            if self.last_seen is None or tstamp > self.last_seen:
+                self.last_seen = tstamp
+
+    def merge(self, other):
+        self.packets += other.packets
+        self.bytes += other.bytes
+        self.retries += other.retries
+        self.data_retries += other.data_retries
+        self.flags = [a + b for a, b in zip(self.flags, other.flags)]
+        self.rssi.merge(other.rssi)
+        self.rate.merge(other.rate)
+        for tstamp in (other.first_seen, other.last_seen):
+            if tstamp is None:
+                continue
+            if self.first_seen is None or tstamp < self.first_seen:
+                self.first_seen = tstamp
+            if self.last_seen is None or tstamp > self.last_seen:
+                self.last_seen = tstamp
+
+    def to_dict(self):
+        return {
+            'packets': self.packets,
+            'bytes': self.bytes,
+            'retries': self.retries,
+            'data_retries': self.data_retries,
+            'flags': dict((name, count)
+                          for name, count in zip(FLAG_NAMES, self.flags)
+                          if count),
+            'rssi': self.rssi.to_dict(),
+            'rate': self.rate.to_dict(),
+            'first_seen': self.first_seen,
+            'last_seen': self.last_seen,
+        }
+
+class Aggregator(object):
+    """
+    Streaming statistics keyed by transmitter (the mac field named by
+    key, addr2 by default) and by chan_freq.  At most max_stations
+    stations are kept; the least recently updated one is evicted.
+    """
+
+    def __init__(self, max_stations=10000, key='addr2'):
+        self.max_stations = max_stations
+        self.key = key
+        self.stations = collections.OrderedDict()
+        self.channels = {}
+        self.evicted = 0
+
+    def _station(self, station):
+        stations = self.stations
+        stats = stations.get(station)
+        if stats is None:
+            stats = stations[station] = LinkStats()
+            if len(stations) > self.max_stations:
+                stations.popitem(last=False)
+                self.evicted += 1
+        else:
+            stations.move_to_end(station)
+        return stats
+
+    def update(self, radiotap, mac, length=0, tstamp=None):
+        """Account one frame from radiotap_parse() and ieee80211_parse()."""
+        freq = radiotap.get('chan_freq')
+        if freq is not None:
+            stats = self.channels.get(freq)
+            if stats is None:
+                stats = self.channels[freq] = LinkStats()
+            stats.update(radiotap, mac, length, tstamp)
+
+        station = mac.get(self.key)
+        if station is not None:
+            self._station(station).update(radiotap, mac, length, tstamp)
+
+    def update_columns(self, rows, macs=None, lengths=None, tstamps=None):
+        """
+        Account frames from radiotap.batch.radiotap_parse_batch() rows;
+        macs, lengths and tstamps are optional per-row sequences.  Fields
+        absent from a row's present bitmap are skipped, and the VHT rate
+        of user 0 stands in for vht_user.
+        """
+        names = [name for name in rows.dtype.names
+                 if name in _field_ids or name == 'vht_rate_mbps']
+        columns = [(name, _field_ids.get(name), rows[name].tolist())
+                   for name in names]
+        present = rows['present'].tolist()
+        for row in range(len(rows)):
+            bits = present[row]
+            radiotap = {}
+            for name, field_id, values in columns:
+                if field_id is not None and not bits & (1 << field_id):
+                    continue
+                value = values[row]
+                if value != value:
+                    # NaN rate
+                    continue
+                radiotap[name] = value
+            rate = radiotap.pop('vht_rate_mbps', None)
+            if rate is not None:
+                radiotap['vht_user'] = {0: {'vht_rate_mbps': rate}}
+            self.update(radiotap, macs[row] if macs is not None else {},
+                        lengths[row] if lengths is not None else 0,
+                        tstamps[row] if tstamps is not None else None)
+
+    def merge(self, other):
+        """Add the statistics of other, e.g. built by another worker."""
+        for freq, stats in other.channels.items():
+            if freq not in self.channels:
+                self.channels[freq] = LinkStats()
+            self.channels[freq].merge(stats)
+        for station, stats in other.stations.items():
+            self._station(station).merge(stats)
+        self.evicted += other.evicted
+
+    def to_dict(self):
+        return {
+            'stations': dict((station, stats.to_dict())
+                             for station, stats in self.stations.items()),
+            'channels': dict((freq, stats.to_dict())
+                             for freq, stats in self.channels.items()),
+            'evicted': self.evicted,
+        }
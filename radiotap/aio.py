@@ -0,0 +1,75 @@
+"""
+    asyncio parsing of live pcap streams
+
+    example:
+    >>> import asyncio, radiotap.aio as ra
+    >>> async def collect(host, port):
+    ...     reader, writer = await asyncio.open_connection(host, port)
+    ...     async for tstamp, radiotap, mac in ra.read_pcap_stream(reader):
+    ...         print(tstamp, radiotap.get('dbm_antsignal'))
+
+    Records are read one at a time with StreamReader.readexactly(), so
+    headers split across chunks are reassembled by the reader, buffering
+    stays within the reader's limit and a slow consumer pauses the
+    transport instead of queueing data.  Any number of streams can be
+    consumed concurrently as tasks of one event loop.  Only classic pcap
+    streams, as written by "tcpdump -w -", are supported.
+"""
+import asyncio
+import struct
+
+from radiotap.pcap import _PCAP_MAGIC, LINKTYPE_IEEE802_11_RADIOTAP
+from radiotap.radiotap import (radiotap_parse_checked, ieee80211_parse,
+                               PARSE_OK, PARSE_UNKNOWN_FIELD)
+
+MAX_RECORD = 262144
+
+# statuses of radiotap_parse_checked() whose records are yielded
+_USABLE = (PARSE_OK, PARSE_UNKNOWN_FIELD)
+
+async def read_pcap_stream(reader, parse=True, max_record=MAX_RECORD):
+    """
+    Read a pcap stream from the asyncio.StreamReader reader and yield
+    (timestamp, radiotap, mac) tuples, or (timestamp, packet) tuples if
+    parse is false.  The generator ends at end of stream, dropping a
+    truncated last record; records larger than max_record bytes or a
+    non-radiotap link type raise ValueError.
+
+    When parsing, records with a malformed radiotap header (any
+    radiotap_parse_checked() status but PARSE_OK and PARSE_UNKNOWN_FIELD)
+    are skipped rather than ending the stream.
+    """
+    try:
+        header = await reader.readexactly(24)
+    except asyncio.IncompleteReadError:
+        return
+
+    magic, = struct.unpack_from('<I', header)
+    if magic not in _PCAP_MAGIC:
+        raise ValueError('not a pcap stream')
+    endian, tick = _PCAP_MAGIC[magic]
+    linktype, = struct.unpack_from(endian + 'I', header, 20)
+    if linktype != LINKTYPE_IEEE802_11_RADIOTAP:
+        raise ValueError('link type %d is not radiotap' % linktype)
+
+    record_hdr = struct.Struct(endian + 'IIII')
+    while True:
+        try:
+            ts_sec, ts_frac, incl_len, _ = record_hdr.unpack(
+                await reader.readexactly(record_hdr.size))
+            if incl_len > max_record:
+                raise ValueError('pcap record of %d bytes' % incl_len)
+            pkt = await reader.readexactly(incl_len)
+        except asyncio.IncompleteReadError:
+            return
+
+        tstamp = ts_sec + ts_frac * tick
+        if not parse:
+            yield tstamp, pkt
+            continue
+
+        status, off, radiotap = radiotap_parse_checked(pkt)
+        if status not in _USABLE:
+            continue
+        off, mac = ieee80211_parse(pkt, off)
+        yield tstamp, radiotap, mac
@@ -0,0 +1,198 @@
+"""
+    airtime and channel utilization over batched columns
+
+    example:
+    >>> import radiotap.batch as rb, radiotap.airtime as ra
+    >>> rows = rb.radiotap_parse_batch(packets)
+    >>> lengths = [len(pkt) for pkt in packets] - rows['radiotap_len']
+    >>> usage = ra.channel_utilization(rows, lengths, interval=100000)
+    >>> usage['utilization'][:, usage['keys'] == 5180]
+
+    frame_airtime() estimates how long each frame occupied the medium
+    from the rate radiotap_parse_batch() decoded for it (vht_rate_mbps,
+    mcs_rate or rate, in that order of preference), its guard interval
+    and its length: PHY preamble plus the OFDM symbols (or DSSS/CCK
+    bits) of the PSDU.  Bandwidth enters through the rate.  A-MPDU
+    subframes sharing an ampdu_refnum are charged one preamble, plus
+    their delimiters and padding.  Frames without a known rate, HE and
+    EHT frames among them, get NaN.
+
+    utilization() windows airtime by TSFT into fixed intervals of
+    microseconds, per channel or per station.  A frame counts in the
+    interval it starts in; frames without TSFT or airtime are left out.
+
+    Requires numpy.
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+INTERVAL = 1000000
+
+# radiotap flags
+_FLAG_SHORTPRE = 0x02
+_FLAG_FCS = 0x10
+
+# presence bits of the batch columns used here
+_TSFT = 1 << 0
+_FLAGS = 1 << 1
+_RATE = 1 << 2
+_MCS = 1 << 19
+_AMPDU = 1 << 20
+_VHT = 1 << 21
+
+# PHY timing in microseconds
+_DSSS_LONG_PREAMBLE = 192.
+_DSSS_SHORT_PREAMBLE = 96.
+_OFDM_PREAMBLE = 20.                # L-STF, L-LTF, L-SIG
+_HT_MIXED_PREAMBLE = 32.            # legacy part, HT-SIG, HT-STF
+_HT_GREENFIELD_PREAMBLE = 20.       # HT-GF-STF, HT-LTF1, HT-SIG, less one LTF
+_VHT_PREAMBLE = 36.                 # legacy part, VHT-SIG-A/B, VHT-STF
+_LTF = 4.
+_SYMBOL = 4.
+_SYMBOL_SHORT_GI = 3.6
+_SERVICE_TAIL_BITS = 16 + 6
+_AMPDU_DELIMITER = 4
+_FCS_LEN = 4
+
+# HT/VHT long training fields by number of spatial streams
+_LTFS = (1, 1, 2, 4, 4, 6, 6, 8, 8)
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('radiotap.airtime requires numpy')
+
+def _ltfs(nss):
+    table = np.array(_LTFS, dtype=np.float64)
+    return table[np.clip(nss, 1, len(_LTFS) - 1)]
+
+def _first_subframes(in_ampdu, refnum):
+    """True for rows that start a PPDU: the first subframe of a run of
+    rows sharing an ampdu_refnum, and every frame outside an A-MPDU."""
+    first = np.ones(len(refnum), dtype=bool)
+    first[1:] = ~(in_ampdu[1:] & in_ampdu[:-1] & (refnum[1:] == refnum[:-1]))
+    return first | ~in_ampdu
+
+def frame_airtime(rows, lengths):
+    """
+    Airtime in microseconds of each row of a radiotap_parse_batch()
+    array, with lengths the frame lengths that follow the radiotap
+    headers (FCS included or not, as the flags field says).  Returns a
+    float64 array, NaN for frames without a usable rate.
+    """
+    _require_numpy()
+    present = rows['present']
+    lengths = np.asarray(lengths, dtype=np.float64)
+
+    has_fcs = ((present & _FLAGS) != 0) & ((rows['flags'] & _FLAG_FCS) != 0)
+    psdu = lengths + np.where(has_fcs, 0, _FCS_LEN)
+
+    vht = ((present & _VHT) != 0) & ~np.isnan(rows['vht_rate_mbps'])
+    ht = ~vht & ((present & _MCS) != 0) & ~np.isnan(rows['mcs_rate'])
+    legacy = ~vht & ~ht & ((present & _RATE) != 0) & (rows['rate'] > 0)
+    rate = np.select([vht, ht, legacy],
+                     [rows['vht_rate_mbps'], rows['mcs_rate'], rows['rate']],
+                     np.nan)
+
+    mcs_flags = rows['mcs_flags']
+    short_gi = np.where(vht, rows['vht_gi'] == 1, ht & ((mcs_flags & 0x04) != 0))
+    symbol = np.where(short_gi, _SYMBOL_SHORT_GI, _SYMBOL)
+
+    ht_nss = rows['mcs_index'].astype(np.int64) // 8 + 1
+    greenfield = ((rows['mcs_known'] & 0x08) != 0) & ((mcs_flags & 0x08) != 0)
+    ht_preamble = np.where(greenfield, _HT_GREENFIELD_PREAMBLE,
+                           _HT_MIXED_PREAMBLE) + _LTF * _ltfs(ht_nss)
+    vht_preamble = _VHT_PREAMBLE + _LTF * _ltfs(rows['vht_nss'])
+    preamble = np.select([vht, ht], [vht_preamble, ht_preamble],
+                         _OFDM_PREAMBLE)
+
+    # A-MPDU subframes: one preamble per PPDU, delimiter and padding to
+    # 4 bytes per subframe, symbols shared with the other subframes
+    in_ampdu = (vht | ht) & ((present & _AMPDU) != 0)
+    first = _first_subframes(in_ampdu, rows['ampdu_refnum'])
+    psdu = np.where(in_ampdu,
+                    _AMPDU_DELIMITER + np.ceil(psdu / 4.) * 4, psdu)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        bits_per_symbol = np.round(rate * symbol)
+        symbols = (8 * psdu + np.where(first, _SERVICE_TAIL_BITS, 0)) / \
+            bits_per_symbol
+        symbols = np.where(in_ampdu, symbols, np.ceil(symbols))
+        airtime = np.where(first, preamble, 0.) + symbols * symbol
+
+        # DSSS/CCK rates: preamble and PLCP header, then one bit at a time
+        dsss = legacy & np.isin(rows['rate'], (1., 2., 5.5, 11.))
+        short = ((present & _FLAGS) != 0) & \
+            ((rows['flags'] & _FLAG_SHORTPRE) != 0) & (rows['rate'] != 1.)
+        dsss_time = np.where(short, _DSSS_SHORT_PREAMBLE,
+                             _DSSS_LONG_PREAMBLE) + 8 * psdu / rate
+    return np.where(dsss, dsss_time, airtime)
+
+def utilization(tsft, airtime, keys, interval=INTERVAL, start=None):
+    """
+    Sum airtime by key and by interval of TSFT (both in microseconds),
+    skipping NaN airtime.  start is the TSFT of the first interval, by
+    default the first multiple of interval at or before the earliest
+    frame.
+
+    Returns a dict:
+      start:       TSFT of the first interval
+      interval:    interval length
+      keys:        the distinct keys, sorted
+      busy:        airtime per interval (rows) and key (columns)
+      frames:      frame count, shaped like busy
+      utilization: busy / interval
+    """
+    _require_numpy()
+    tsft = np.asarray(tsft, dtype=np.uint64)
+    airtime = np.asarray(airtime, dtype=np.float64)
+    keys = np.asarray(keys)
+    valid = ~np.isnan(airtime)
+    if start is not None:
+        valid &= tsft >= np.uint64(start)
+    tsft, airtime, keys = tsft[valid], airtime[valid], keys[valid]
+
+    if start is None:
+        start = int(tsft.min()) // interval * interval if len(tsft) else 0
+    window = ((tsft - np.uint64(start)) // np.uint64(interval)).astype(np.int64)
+    distinct, key_index = np.unique(keys, return_inverse=True)
+    key_index = key_index.reshape(-1)
+    windows = int(window.max()) + 1 if len(window) else 0
+    cell = window * len(distinct) + key_index
+    size = windows * len(distinct)
+    shape = (windows, len(distinct))
+    busy = np.bincount(cell, weights=airtime, minlength=size).reshape(shape)
+    return {
+        'start': start,
+        'interval': interval,
+        'keys': distinct,
+        'busy': busy,
+        'frames': np.bincount(cell, minlength=size).reshape(shape),
+        'utilization': busy / interval,
+    }
+
+def _with_tsft(rows):
+    return (rows['present'] & _TSFT) != 0
+
+def channel_utilization(rows, lengths, interval=INTERVAL, start=None):
+    """
+    utilization() of a radiotap_parse_batch() array keyed by chan_freq,
+    for the rows that carry a TSFT.
+    """
+    airtime = frame_airtime(rows, lengths)
+    timed = _with_tsft(rows)
+    return utilization(rows['TSFT'][timed], airtime[timed],
+                       rows['chan_freq'][timed], interval, start)
+
+def station_utilization(rows, lengths, stations, interval=INTERVAL,
+                        start=None):
+    """
+    utilization() of a radiotap_parse_batch() array keyed by stations,
+    one key per row such as the addr2 of ieee80211_parse(pkt, off,
+    addr_format='int'), for the rows that carry a TSFT.
+    """
+    airtime = frame_airtime(rows, lengths)
+    timed = _with_tsft(rows)
+    return utilization(rows['TSFT'][timed], airtime[timed],
+                       np.asarray(stations)[timed], interval, start)
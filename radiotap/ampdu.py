@@ -0,0 +1,140 @@
+"""
+    group A-MPDU subframes into aggregates
+    see http://www.radiotap.org/fields/A-MPDU%20status
+
+    example:
+    >>> import radiotap as r, radiotap.pcap as rp
+    >>> from radiotap.ampdu import AmpduAssembler
+    >>> asm = AmpduAssembler()
+    >>> for tstamp, pkt in rp.read_pcap('foo.pcap'):
+    ...     off, radiotap = r.radiotap_parse(pkt)
+    ...     for aggregate in asm.add(radiotap, len(pkt), tstamp):
+    ...         print(aggregate['subframes'], aggregate['bytes'])
+    >>> leftover = asm.flush()
+
+    Subframes of one aggregate share an ampdu_refnum.  An aggregate is
+    emitted when its last subframe is seen (for drivers that report it),
+    or when more than window aggregates are open at once, in which case
+    the oldest one is emitted with complete set to False.
+"""
+import collections
+
+from radiotap.aggregate import frame_rate
+
+AMPDU_REPORT_ZEROLEN = 0x0001
+AMPDU_IS_ZEROLEN = 0x0002
+AMPDU_LAST_KNOWN = 0x0004
+AMPDU_IS_LAST = 0x0008
+AMPDU_DELIM_CRC_ERR = 0x0010
+AMPDU_DELIM_CRC_KNOWN = 0x0020
+AMPDU_EOF = 0x0040
+AMPDU_EOF_KNOWN = 0x0080
+
+class _Aggregate(object):
+    __slots__ = ('refnum', 'subframes', 'bytes', 'zero_length',
+                 'delim_crc_errors', 'rate', 'chan_freq', 'signal_count',
+                 'signal_sum', 'signal_min', 'signal_max', 'first_seen',
+                 'last_seen')
+
+    def __init__(self, refnum, radiotap, tstamp):
+        self.refnum = refnum
+        self.subframes = self.bytes = 0
+        self.zero_length = self.delim_crc_errors = 0
+        self.rate = frame_rate(radiotap)
+        self.chan_freq = radiotap.get('chan_freq')
+        self.signal_count = self.signal_sum = 0
+        self.signal_min = self.signal_max = None
+        self.first_seen = self.last_seen = tstamp
+
+    def add(self, radiotap, flags, length, tstamp):
+        if flags & AMPDU_DELIM_CRC_ERR:
+            self.delim_crc_errors += 1
+            return
+        if flags & AMPDU_IS_ZEROLEN:
+            self.zero_length += 1
+            return
+        self.subframes += 1
+        self.bytes += length
+        signal = radiotap.get('dbm_antsignal')
+        if signal is not None:
+            self.signal_count += 1
+            self.signal_sum += signal
+            if self.signal_min is None or signal < self.signal_min:
+                self.signal_min = signal
+            if self.signal_max is None or signal > self.signal_max:
+                self.signal_max = signal
+        if tstamp is not None:
+            self.last_seen = tstamp
+
+    def record(self, complete):
+        count = self.signal_count
+        return {
+            'refnum': self.refnum,
+            'complete': complete,
+            'subframes': self.subframes,
+            'bytes': self.bytes,
+            'zero_length': self.zero_length,
+            'delim_crc_errors': self.delim_crc_errors,
+            'rate': self.rate,
+            'chan_freq': self.chan_freq,
+            'signal_min': self.signal_min,
+            'signal_max': self.signal_max,
+            'signal_mean': self.signal_sum / count if count else None,
+            'first_seen': self.first_seen,
+            'last_seen': self.last_seen,
+        }
+
+class AmpduAssembler(object):
+    """
+    Streaming A-MPDU assembler keeping at most window aggregates open.
+    Frames without an A-MPDU status field are ignored.
+    """
+
+    def __init__(self, window=4):
+        self.window = window
+        self._open = collections.OrderedDict()
+
+    def add(self, radiotap, length=0, tstamp=None):
+        """
+        Account one radiotap_parse() result; length is the subframe size
+        in bytes.  Returns the list of aggregates completed by it.
+        """
+        refnum = radiotap.get('ampdu_refnum')
+        if refnum is None:
+            return []
+        flags = radiotap['ampdu_flags']
+        aggregates = self._open
+
+        aggregate = aggregates.get(refnum)
+        if aggregate is None:
+            aggregate = aggregates[refnum] = _Aggregate(refnum, radiotap, tstamp)
+        elif next(reversed(aggregates)) != refnum:
+            aggregates.move_to_end(refnum)
+        aggregate.add(radiotap, flags, length, tstamp)
+
+        done = []
+        if flags & (AMPDU_LAST_KNOWN | AMPDU_IS_LAST) == \
+                AMPDU_LAST_KNOWN | AMPDU_IS_LAST:
+            del aggregates[refnum]
+            done.append(aggregate.record(True))
+        while len(aggregates) > self.window:
+            done.append(aggregates.popitem(last=False)[1].record(False))
+        return done
+
+    def flush(self):
+        """Emit every open aggregate as incomplete."""
+        done = [aggregate.record(False) for aggregate in self._open.values()]
+        self._open.clear()
+        return done
+
+def assemble(frames, window=4):
+    """
+    Yield aggregate records from an iterable of (radiotap, length,
+    tstamp) tuples, flushing the open aggregates at the end.
+    """
+    asm = AmpduAssembler(window)
+    for radiotap, length, tstamp in frames:
+        for aggregate in asm.add(radiotap, length, tstamp):
+            yield aggregate
+    for aggregate in asm.flush():
+        yield aggregate
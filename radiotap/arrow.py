@@ -0,0 +1,263 @@
+"""
+    streaming export to Apache Arrow and Parquet
+
+    example:
+    >>> import radiotap.pcap as rp, radiotap.arrow as ra
+    >>> ra.write_parquet('foo.parquet', rp.read_pcap('foo.pcap', parse=True),
+    ...                  row_group_size=65536)
+
+    Rows are (timestamp, radiotap, mac) as produced by read_pcap(parse=True)
+    or parse_file_parallel(), with mac addresses as strings, optionally
+    followed by the radiotap header length (the radiotap_len column, null
+    otherwise).  Every file
+    has the same schema (SCHEMA_COLUMNS): absent fields are null, the
+    per-user VHT dicts are flattened into vht_user<N>_* columns and
+    vendor namespaces become a list of (oui, subns, present, data)
+    structs.  Only one batch of rows is held in memory at a time.
+
+    Requires pyarrow.
+"""
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+from radiotap.batch import BATCH_COLUMNS
+
+ROW_GROUP_SIZE = 65536
+
+_VHT_USERS = 4
+
+# (column name, type) with numpy-style scalar type codes or one of the
+# nested types below
+SCHEMA_COLUMNS = (
+    [('tstamp', '<f8'), ('radiotap_len', '<u2')] +
+    [column for column in BATCH_COLUMNS
+     if column[0] not in ('status', 'present', 'radiotap_len',
+                          'vht_mcs_index', 'vht_nss', 'vht_rate_mbps')] +
+    [('vht_user%d_%s' % (user, name), fmt)
+     for user in range(_VHT_USERS)
+     for name, fmt in (('coding', 'u1'), ('mcs_index', 'u1'),
+                       ('rate_mbps', '<f8'))] +
+    [
+        ('timestamp', '<u8'),
+        ('timestamp_accuracy', '<u2'),
+        ('timestamp_unit_position', 'u1'),
+        ('timestamp_flags', 'u1'),
+        ('he_data1', '<u2'),
+        ('he_data2', '<u2'),
+        ('he_data3', '<u2'),
+        ('he_data4', '<u2'),
+        ('he_data5', '<u2'),
+        ('he_data6', '<u2'),
+        ('he_ppdu_format', 'u1'),
+        ('he_mcs', 'u1'),
+        ('he_nss', 'u1'),
+        ('he_gi', 'u1'),
+        ('he_bandwidth', '<u2'),
+        ('he_rate_mbps', '<f8'),
+        ('he_mu_flags1', '<u2'),
+        ('he_mu_flags2', '<u2'),
+        ('he_mu_ru_channel1', 'list<u1>'),
+        ('he_mu_ru_channel2', 'list<u1>'),
+        ('he_mu_per_user_1', '<u2'),
+        ('he_mu_per_user_2', '<u2'),
+        ('he_mu_per_user_position', 'u1'),
+        ('he_mu_per_user_known', 'u1'),
+        ('zero_length_psdu', 'u1'),
+        ('lsig_data1', '<u2'),
+        ('lsig_data2', '<u2'),
+        ('usig_common', '<u4'),
+        ('usig_value', '<u4'),
+        ('usig_mask', '<u4'),
+        ('eht_known', '<u4'),
+        ('eht_data', 'list<u4>'),
+        ('eht_user_info', 'list<u4>'),
+        ('eht_gi', 'u1'),
+        ('eht_bandwidth', '<u2'),
+        ('eht_mcs', 'u1'),
+        ('eht_nss', 'u1'),
+        ('eht_rate_mbps', '<f8'),
+        ('tlvs', 'tlvs'),
+        ('vendor', 'vendor'),
+        ('fc', '<u2'),
+        ('type', 'u1'),
+        ('subtype', 'u1'),
+        ('duration', '<f8'),
+        ('addr1', 'str'),
+        ('addr2', 'str'),
+        ('addr3', 'str'),
+        ('addr4', 'str'),
+        ('seq', '<u2'),
+        ('frag', 'u1'),
+        ('tid', 'u1'),
+        ('eosp', 'u1'),
+        ('rspi', 'u1'),
+        ('mesh_ps', 'u1'),
+        ('ba_ctrl', '<u2'),
+        ('ba_ssc', '<u2'),
+        ('ba_bitmap', 'bytes'),
+        ('bar_ctrl', '<u2'),
+        ('bar_ssc', '<u2'),
+    ]
+)
+
+# columns filled from the mac dict rather than the radiotap one
+_MAC_COLUMNS = frozenset(('fc', 'type', 'subtype', 'duration', 'addr1',
+                          'addr2', 'addr3', 'addr4', 'seq', 'frag', 'tid',
+                          'eosp', 'rspi', 'mesh_ps', 'ba_ctrl', 'ba_ssc',
+                          'ba_bitmap', 'bar_ctrl', 'bar_ssc'))
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError('radiotap.arrow requires pyarrow')
+
+def _arrow_type(fmt):
+    scalars = {
+        'i1': pa.int8, 'u1': pa.uint8, 'u2': pa.uint16, 'u4': pa.uint32,
+        'u8': pa.uint64, 'f8': pa.float64, 'str': pa.string,
+        'bytes': pa.binary,
+    }
+    if fmt.startswith('list<'):
+        return pa.list_(_arrow_type(fmt[5:-1]))
+    if fmt == 'tlvs':
+        return pa.list_(pa.struct([('type', pa.uint16()),
+                                   ('data', pa.binary())]))
+    if fmt == 'vendor':
+        return pa.list_(pa.struct([('oui', pa.binary(3)),
+                                   ('subns', pa.uint8()),
+                                   ('present', pa.uint64()),
+                                   ('data', pa.binary())]))
+    return scalars[fmt.lstrip('<')]()
+
+def arrow_schema():
+    """The pyarrow.Schema of every batch and file written here."""
+    _require_pyarrow()
+    return pa.schema([(name, _arrow_type(fmt)) for name, fmt in SCHEMA_COLUMNS])
+
+def _bytes(value):
+    return bytes(value) if isinstance(value, memoryview) else value
+
+class RecordBatchBuilder(object):
+    """
+    Accumulate rows column by column and turn them into Arrow record
+    batches of at most batch_size rows.
+    """
+
+    def __init__(self, batch_size=ROW_GROUP_SIZE):
+        _require_pyarrow()
+        self.batch_size = batch_size
+        self.schema = arrow_schema()
+        self._columns = dict((name, []) for name, _ in SCHEMA_COLUMNS)
+        self._rows = 0
+
+    def __len__(self):
+        return self._rows
+
+    def append(self, radiotap, mac=None, tstamp=None, radiotap_len=None):
+        """
+        Add one row.  Returns a full record batch when batch_size rows
+        have accumulated, None otherwise.
+        """
+        mac = mac or {}
+        row = {'tstamp': tstamp, 'radiotap_len': radiotap_len}
+        vendor = []
+        for name, value in radiotap.items():
+            if isinstance(name, bytes):
+                vendor.append({'oui': name, 'subns': value['subns'],
+                               'present': value['present'],
+                               'data': _bytes(value['data'])})
+            elif name == 'vht_user':
+                for user, info in value.items():
+                    prefix = 'vht_user%d_' % user
+                    row[prefix + 'coding'] = info.get('vht_coding')
+                    row[prefix + 'mcs_index'] = info.get('vht_mcs_index')
+                    row[prefix + 'rate_mbps'] = info.get('vht_rate_mbps')
+            elif name == 'tlvs':
+                row['tlvs'] = [{'type': tlv_type, 'data': _bytes(data)}
+                               for tlv_type, data in value]
+            elif name not in _MAC_COLUMNS:
+                row[name] = value
+        if vendor:
+            row['vendor'] = vendor
+        for name in _MAC_COLUMNS:
+            if name in mac:
+                row[name] = _bytes(mac[name])
+
+        for name, values in self._columns.items():
+            values.append(row.get(name))
+        self._rows += 1
+        if self._rows >= self.batch_size:
+            return self.flush()
+        return None
+
+    def flush(self):
+        """Return the accumulated rows as a record batch and start over."""
+        arrays = [pa.array(self._columns[field.name], type=field.type)
+                  for field in self.schema]
+        for values in self._columns.values():
+            del values[:]
+        self._rows = 0
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+def _row_values(row):
+    """(radiotap, mac, tstamp, radiotap_len) of a 3 or 4 item row."""
+    tstamp, radiotap, mac = row[:3]
+    return radiotap, mac, tstamp, row[3] if len(row) > 3 else None
+
+def record_batches(rows, batch_size=ROW_GROUP_SIZE):
+    """
+    Yield record batches from an iterable of (tstamp, radiotap, mac) or
+    (tstamp, radiotap, mac, radiotap_len).
+    """
+    builder = RecordBatchBuilder(batch_size)
+    for row in rows:
+        batch = builder.append(*_row_values(row))
+        if batch is not None:
+            yield batch
+    if len(builder):
+        yield builder.flush()
+
+class ParquetWriter(object):
+    """
+    Write rows to a Parquet file, one row group per row_group_size rows.
+    Extra keyword arguments go to pyarrow.parquet.ParquetWriter, e.g.
+    compression.
+    """
+
+    def __init__(self, path, row_group_size=ROW_GROUP_SIZE, **options):
+        self._builder = RecordBatchBuilder(row_group_size)
+        self._writer = pq.ParquetWriter(path, self._builder.schema, **options)
+        self.rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, radiotap, mac=None, tstamp=None, radiotap_len=None):
+        batch = self._builder.append(radiotap, mac, tstamp, radiotap_len)
+        self.rows += 1
+        if batch is not None:
+            self._writer.write_batch(batch)
+
+    def close(self):
+        if self._writer is None:
+            return
+        if len(self._builder):
+            self._writer.write_batch(self._builder.flush())
+        self._writer.close()
+        self._writer = None
+
+def write_parquet(path, rows, row_group_size=ROW_GROUP_SIZE, **options):
+    """
+    Write an iterable of (tstamp, radiotap, mac) or (tstamp, radiotap,
+    mac, radiotap_len) to a Parquet file and return the number of rows
+    written.
+    """
+    with ParquetWriter(path, row_group_size, **options) as writer:
+        for row in rows:
+            writer.write(*_row_values(row))
+    return writer.rows
@@ -0,0 +1,266 @@
+"""
+    columnar decoding of many radiotap headers at once
+
+    example:
+    >>> import radiotap.batch as rb
+    >>> rows = rb.radiotap_parse_batch(packets)
+    >>> rows['dbm_antsignal'][rows['present'] & (1 << 5) != 0]
+
+    Packets are grouped by their cached parse plan (see
+    radiotap.plan_cache_info()); each group is decoded with a single
+    numpy.frombuffer() over a structured dtype that mirrors the plan.
+    Headers that cannot be decoded from a plan (vendor namespaces,
+    truncated fields) go through radiotap_parse() one by one.
+
+    Requires numpy.
+"""
+import functools
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from radiotap import radiotap as _rt
+from radiotap.filter import compile_filter
+from radiotap.vht import vht_bandwidth_lut, vht_rate_table
+
+# raw values of each radiotap field as they appear on the wire, indexed
+# like radiotap._field_layouts.  Fields whose output names are the raw
+# values reuse those names.
+_raw_names = {
+    2: ('rate_raw',),
+    19: ('mcs_known', 'mcs_flags', 'mcs_index'),
+    21: ('vht_known', 'vht_flags', 'vht_bw', 'vht_mcs_nss_0', 'vht_mcs_nss_1',
+         'vht_mcs_nss_2', 'vht_mcs_nss_3', 'vht_coding', 'vht_group_id',
+         'vht_partial_aid'),
+    23: ('he_data1', 'he_data2', 'he_data3', 'he_data4', 'he_data5',
+         'he_data6'),
+    24: ('he_mu_flags1', 'he_mu_flags2') +
+        tuple('he_mu_ru_channel%d_%d' % (c, i) for c in (1, 2) for i in range(4)),
+}
+
+_numpy_formats = {
+    'b': 'i1', 'B': 'u1', 'H': '<u2', 'I': '<u4', 'L': '<u4', 'Q': '<u8',
+}
+
+# output columns: every scalar field produced by radiotap_parse(), with
+# the VHT rate of user 0 standing in for the per-user vht_user dict.
+BATCH_COLUMNS = [
+    ('status', 'u1'),
+    ('present', '<u4'),
+    ('radiotap_len', '<u2'),
+    ('TSFT', '<u8'),
+    ('flags', 'u1'),
+    ('rate', '<f8'),
+    ('chan_freq', '<u2'),
+    ('chan_flags', '<u2'),
+    ('fhss', '<u2'),
+    ('dbm_antsignal', 'i1'),
+    ('dbm_antnoise', 'i1'),
+    ('lock_quality', '<u2'),
+    ('tx_attenuation', '<u2'),
+    ('db_tx_attenuation', '<u2'),
+    ('dbm_tx_power', 'i1'),
+    ('antenna', 'u1'),
+    ('db_antsignal', 'u1'),
+    ('db_antnoise', 'u1'),
+    ('rx_flags', '<u2'),
+    ('tx_flags', '<u2'),
+    ('rts_retries', 'u1'),
+    ('data_retries', 'u1'),
+    ('xchannel_flags', '<u4'),
+    ('xchannel_freq', '<u2'),
+    ('xchannel_num', 'u1'),
+    ('xchannel_maxpower', 'u1'),
+    ('mcs_known', 'u1'),
+    ('mcs_flags', 'u1'),
+    ('mcs_index', 'u1'),
+    ('mcs_rate', '<f8'),
+    ('ampdu_refnum', '<u4'),
+    ('ampdu_flags', '<u2'),
+    ('ampdu_delim_crc_val', 'u1'),
+    ('ampdu_reserved', 'u1'),
+    ('vht_known', '<u2'),
+    ('vht_flags', 'u1'),
+    ('vht_bw', 'u1'),
+    ('vht_coding', 'u1'),
+    ('vht_group_id', 'u1'),
+    ('vht_gi', 'i1'),
+    ('vht_bandwidth', '<u2'),
+    ('vht_mcs_index', 'u1'),
+    ('vht_nss', 'u1'),
+    ('vht_rate_mbps', '<f8'),
+]
+
+_float_columns = ('rate', 'mcs_rate', 'vht_rate_mbps')
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('radiotap.batch requires numpy')
+
+def _expand(fmt):
+    """Expand a field format such as 'H8BH' to one char per value."""
+    chars = []
+    count = ''
+    for char in fmt:
+        if char.isdigit():
+            count += char
+            continue
+        chars.extend([char] * int(count or 1))
+        count = ''
+    return chars
+
+@functools.lru_cache(maxsize=_rt.PLAN_CACHE_SIZE)
+def _plan_dtype(layout):
+    """
+    Build the structured dtype of one plan from its layout, a tuple of
+    (field id, header offset) pairs.  Returns (dtype, present mask).
+    A field repeated in later radiotap namespaces (e.g. per-antenna
+    dbm_antsignal) keeps its last occurrence, as in radiotap_parse().
+    """
+    columns = {}
+    present = 0
+    end = 0
+    for field_id, offset in layout:
+        present |= 1 << field_id
+        fmt = _rt._field_layouts[field_id][1]
+        raw = _raw_names.get(field_id, _rt._field_layouts[field_id][2])
+        for name, char in zip(raw, _expand(fmt)):
+            columns[name] = (_numpy_formats[char], offset)
+            offset += struct.calcsize('<' + char)
+        end = max(end, offset)
+    return np.dtype({'names': list(columns),
+                     'formats': [fmt for fmt, _ in columns.values()],
+                     'offsets': [offset for _, offset in columns.values()],
+                     'itemsize': end}), present
+
+@functools.lru_cache(maxsize=1)
+def _rate_tables():
+    mcs = np.array(_rt.mcs_rate_table, dtype='<f8')
+    vht = np.array([[np.nan if v is None else v for v in row]
+                    for row in vht_rate_table], dtype='<f8')
+    bandwidth = np.array([bw for bw, _, _ in vht_bandwidth_lut], dtype='<u2')
+    return mcs, vht, bandwidth
+
+def _decode_group(out, rows, raw, present):
+    """Copy the raw columns of one plan group into out and derive the rest."""
+    mcs_table, vht_table, bw_table = _rate_tables()
+    out['present'][rows] = present
+    for name in raw.dtype.names:
+        if name in out.dtype.names:
+            out[name][rows] = raw[name]
+
+    if present & (1 << 2):
+        out['rate'][rows] = raw['rate_raw'] / 2.
+
+    if present & (1 << 19):
+        flags = raw['mcs_flags'].astype(np.intp)
+        index = raw['mcs_index'].astype(np.intp)
+        col = 2 * ((flags & 0x3) == 1) + ((flags & 0x4) != 0)
+        valid = index < len(mcs_table)
+        out['mcs_rate'][rows] = np.where(
+            valid, mcs_table[np.minimum(index, len(mcs_table) - 1), col],
+            np.nan)
+
+    if present & (1 << 21):
+        known = raw['vht_known']
+        gi_known = (known & 0x0004) != 0
+        gi = ((raw['vht_flags'] & 0x04) >> 2).astype(np.intp)
+        bw_index = (raw['vht_bw'] & 0x1f).astype(np.intp)
+        bw_known = ((known & 0x0040) != 0) & (bw_index < len(bw_table))
+        bandwidth = np.where(
+            bw_known, bw_table[np.minimum(bw_index, len(bw_table) - 1)], 0)
+        user = raw['vht_mcs_nss_0']
+        mcs = (user >> 4).astype(np.intp)
+        nss = (user & 0x0f).astype(np.intp)
+
+        out['vht_gi'][rows] = np.where(gi_known, gi, -1)
+        out['vht_bandwidth'][rows] = bandwidth
+        out['vht_mcs_index'][rows] = mcs
+        out['vht_nss'][rows] = nss
+
+        base = np.select([bandwidth == 20, bandwidth == 40, bandwidth == 80,
+                          bandwidth == 160], [0, 2, 4, 6], -1)
+        col = base + gi
+        row = mcs + (nss - 1) * 10
+        valid = (gi_known & bw_known & (base >= 0) & (nss >= 1) & (mcs <= 9) &
+                 (row < len(vht_table)))
+        out['vht_rate_mbps'][rows] = np.where(
+            valid, vht_table[np.where(valid, row, 0), np.where(valid, col, 0)],
+            np.nan)
+
+def _decode_one(out, row, packet):
+    """
+    Fill a single row from radiotap_parse_checked() for headers without
+    a usable plan.
+    """
+    status, radiotap_len, fields = _rt.radiotap_parse_checked(packet)
+    out['status'][row] = status
+    out['radiotap_len'][row] = radiotap_len
+    present = 0
+    for name, value in fields.items():
+        if name in _rt._field_ids:
+            present |= 1 << _rt._field_ids[name]
+        if name in out.dtype.names and value is not None:
+            out[name][row] = value
+    user = fields.get('vht_user', {}).get(0)
+    if user and 'vht_rate_mbps' in user:
+        out['vht_mcs_index'][row] = user['vht_mcs_index']
+        if user['vht_rate_mbps'] is not None:
+            out['vht_rate_mbps'][row] = user['vht_rate_mbps']
+    out['present'][row] = present
+
+def radiotap_parse_batch(packets, where=None):
+    """
+    Decode the radiotap headers of a sequence of packets into a NumPy
+    structured array with one row per packet and the columns listed in
+    BATCH_COLUMNS.
+
+    The 'present' column is a bitmask of the radiotap field ids decoded
+    for that row; columns of absent fields hold 0 (NaN for rates).
+    Malformed headers never raise: 'status' holds the PARSE_* code of
+    radiotap_parse_checked() and the row whatever could be decoded, and
+    unusable headers yield a row with radiotap_len 0.  vht_nss is only
+    filled for headers decoded in bulk, since radiotap_parse() does not
+    report it.
+
+    where is an optional filter expression or radiotap.filter.Filter;
+    only matching packets get a row.
+    """
+    _require_numpy()
+    if where is not None:
+        packets = compile_filter(where).filter(packets)
+    packets = list(packets)
+    out = np.zeros(len(packets), dtype=BATCH_COLUMNS)
+    for name in _float_columns:
+        out[name] = np.nan
+    out['vht_gi'] = -1
+
+    groups = {}
+    for row, packet in enumerate(packets):
+        status, radiotap_len, _, key = _rt._check_header(packet)
+        if status:
+            out['status'][row] = status
+            continue
+        plan = _rt._plan_cache.lookup(key)
+        if plan is None or plan.end > radiotap_len:
+            _decode_one(out, row, packet)
+            continue
+        if plan.unknown is not None:
+            out['status'][row] = _rt.PARSE_UNKNOWN_FIELD
+        out['radiotap_len'][row] = radiotap_len
+        if not plan.fields:
+            continue
+        layout = tuple((f[0], f[1]) for f in plan.fields)
+        groups.setdefault(layout, []).append(row)
+
+    for layout, rows in groups.items():
+        dtype, present = _plan_dtype(layout)
+        size = dtype.itemsize
+        buf = b''.join(bytes(packets[row][:size]) for row in rows)
+        raw = np.frombuffer(buf, dtype=dtype)
+        _decode_group(out, np.asarray(rows, dtype=np.intp), raw, present)
+
+    return out
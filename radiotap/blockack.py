@@ -0,0 +1,172 @@
+"""
+    bulk analysis of compressed block-ack bitmaps
+
+    example:
+    >>> import radiotap.blockack as rb
+    >>> macs = [r.ieee80211_parse(pkt, r.radiotap_parse(pkt)[0])[1]
+    ...         for pkt in packets]
+    >>> columns = rb.blockack_columns(macs)
+    >>> frames = rb.analyze(columns)
+    >>> rb.summarize(columns, frames)['retransmitted']
+
+    Block-acks are kept as columns: ba_ssc as uint16, the 8-byte bitmap
+    as one little-endian uint64, and a flow number per distinct
+    (addr1, addr2, tid).  Every statistic is computed with NumPy bit
+    operations over whole columns; consecutive block-acks of a flow are
+    compared to estimate how far the window advanced and how many
+    unacknowledged MPDUs were retransmitted or given up.
+
+    Requires numpy.
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BA_WINDOW = 64
+SEQ_MODULO = 4096
+
+# BA control: the BA type bits, and their value for a compressed
+# block-ack (basic, multi-TID, GCR and other variants have others)
+BA_TYPE_MASK = 0x001e
+BA_TYPE_COMPRESSED = 0x0004
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('radiotap.blockack requires numpy')
+
+def popcount(values):
+    """Number of set bits of each uint64 in values."""
+    values = np.asarray(values, dtype=np.uint64)
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values).astype(np.int64)
+    bits = np.unpackbits(values.reshape(-1, 1).view(np.uint8), axis=1)
+    return bits.sum(axis=1, dtype=np.int64).reshape(values.shape)
+
+def bitmap_column(bitmaps):
+    """Turn a sequence of 8-byte block-ack bitmaps into a uint64 array."""
+    _require_numpy()
+    return np.frombuffer(b''.join(bytes(b) for b in bitmaps),
+                         dtype='<u8').astype(np.uint64)
+
+def blockack_columns(macs):
+    """
+    Collect the compressed block-acks among ieee80211_parse() results
+    into columns: index (position in macs), ba_ssc, ba_bitmap, tid and
+    flow.  Flow numbers are assigned in order of first appearance.
+    Other block-ack variants, whose bitmaps are not 64 bits of one TID,
+    are skipped.
+    """
+    _require_numpy()
+    index, ssc, bitmaps, tids, flows = [], [], [], [], []
+    flow_ids = {}
+    for i, mac in enumerate(macs):
+        bitmap = mac.get('ba_bitmap')
+        if bitmap is None or len(bitmap) != 8 or \
+                mac['ba_ctrl'] & BA_TYPE_MASK != BA_TYPE_COMPRESSED:
+            continue
+        tid = mac['ba_ctrl'] >> 12
+        key = (mac['addr1'], mac['addr2'], tid)
+        flow = flow_ids.setdefault(key, len(flow_ids))
+        index.append(i)
+        ssc.append(mac['ba_ssc'])
+        bitmaps.append(bitmap)
+        tids.append(tid)
+        flows.append(flow)
+    return {
+        'index': np.array(index, dtype=np.int64),
+        'ba_ssc': np.array(ssc, dtype=np.uint16),
+        'ba_bitmap': bitmap_column(bitmaps),
+        'tid': np.array(tids, dtype=np.uint8),
+        'flow': np.array(flows, dtype=np.int64),
+    }
+
+def _highest_bit(values):
+    """1-based position of the highest set bit of each uint64, 0 if none."""
+    result = np.zeros(values.shape, dtype=np.int64)
+    values = values.copy()
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = values >= (np.uint64(1) << np.uint64(shift))
+        result[high] += shift
+        values[high] >>= np.uint64(shift)
+    result[values != 0] += 1
+    return result
+
+def analyze(columns):
+    """
+    Per block-ack statistics for columns from blockack_columns() (or any
+    mapping with ba_ssc, ba_bitmap and flow arrays, in capture order).
+
+    Returns a dict of arrays:
+      seq:           starting sequence number
+      acked:         MPDUs acknowledged by the bitmap
+      missing:       unacknowledged MPDUs below the highest acknowledged one
+      advance:       window advance since the previous block-ack of the
+                     flow, modulo 4096 (0 for the first one)
+      retransmitted: MPDUs missing in the previous block-ack of the flow
+                     and acknowledged by this one
+      abandoned:     MPDUs missing in the previous block-ack of the flow
+                     that fell out of the window unacknowledged
+    """
+    _require_numpy()
+    ssc = np.asarray(columns['ba_ssc'], dtype=np.uint16)
+    bitmap = np.asarray(columns['ba_bitmap'], dtype=np.uint64)
+    flow = np.asarray(columns['flow'], dtype=np.int64)
+    count = len(ssc)
+
+    seq = (ssc >> 4).astype(np.int64)
+    acked = popcount(bitmap)
+    top = _highest_bit(bitmap)
+    missing = top - acked
+
+    # previous block-ack of the same flow, via a stable sort by flow
+    order = np.argsort(flow, kind='stable')
+    prev = np.full(count, -1, dtype=np.int64)
+    same = flow[order][1:] == flow[order][:-1]
+    prev[order[1:][same]] = order[:-1][same]
+    has_prev = prev >= 0
+    prev = np.where(has_prev, prev, 0)
+
+    advance = np.where(has_prev, (seq - seq[prev]) % SEQ_MODULO, 0)
+
+    # holes of the previous bitmap: clear bits below its highest set bit
+    prev_top = top[prev]
+    below_top = np.where(prev_top >= BA_WINDOW, ~np.uint64(0),
+                         (np.uint64(1) << np.minimum(prev_top, BA_WINDOW - 1)
+                          .astype(np.uint64)) - np.uint64(1))
+    holes = ~bitmap[prev] & below_top
+    holes = np.where(has_prev, holes, np.uint64(0))
+
+    in_window = advance < BA_WINDOW
+    shift = np.minimum(advance, BA_WINDOW - 1).astype(np.uint64)
+    shifted = np.where(in_window, holes >> shift, np.uint64(0))
+    retransmitted = popcount(shifted & bitmap)
+    passed = np.where(in_window, (np.uint64(1) << shift) - np.uint64(1),
+                      ~np.uint64(0))
+    abandoned = popcount(holes & passed)
+
+    return {
+        'seq': seq,
+        'acked': acked,
+        'missing': missing,
+        'advance': advance,
+        'retransmitted': retransmitted,
+        'abandoned': abandoned,
+    }
+
+def summarize(columns, frames):
+    """
+    Totals per flow of the analyze() arrays, as a dict of arrays indexed
+    by flow number, plus the tid of each flow and its block-ack count.
+    """
+    _require_numpy()
+    flow = np.asarray(columns['flow'], dtype=np.int64)
+    flows = int(flow.max()) + 1 if len(flow) else 0
+    totals = {'blockacks': np.bincount(flow, minlength=flows)}
+    for name in ('acked', 'missing', 'advance', 'retransmitted', 'abandoned'):
+        totals[name] = np.bincount(flow, weights=frames[name],
+                                   minlength=flows).astype(np.int64)
+    tid = np.zeros(flows, dtype=np.uint8)
+    tid[flow] = columns['tid']
+    totals['tid'] = tid
+    return totals
@@ -0,0 +1,360 @@
+"""
+    filter expressions evaluated on raw header bytes
+
+    example:
+    >>> from radiotap.filter import compile_filter
+    >>> keep = compile_filter('chan_freq == 5180 and dbm_antsignal > -70 '
+    ...                       'and type == data')
+    >>> wanted = [pkt for pkt in packets if keep.match(pkt)]
+
+    Expressions use Python syntax: comparisons (==, !=, <, <=, >, >=, in,
+    not in, chained as in -80 < dbm_antsignal < -40) combined with and,
+    or and not.  The left side of a comparison, or a bare condition, is a
+    field name optionally masked as in flags & 0x40.  Names are those
+    radiotap_parse() reports for scalar radiotap fields, plus fc, type,
+    subtype, addr1, addr2 and addr3 of the 802.11 header; addresses are
+    compared to strings like '00:11:22:33:44:55' and type to mgmt, ctrl,
+    data or ext.  A comparison involving a field the packet lacks is
+    false.
+
+    A filter is compiled once per presence bitmap layout, like the parse
+    plans of radiotap_parse(): each field becomes a struct read at its
+    fixed offset and comparisons on fields the layout lacks fold to
+    false, so rejected packets are never fully decoded.  Headers with
+    vendor namespaces are decoded with radiotap_parse() instead, and
+    truncated headers never match.
+"""
+import ast
+import functools
+import operator
+
+from radiotap import radiotap as _rt
+
+_type_names = {
+    'mgmt': _rt.FC_TYPE_MGMT,
+    'ctrl': _rt.FC_TYPE_CTRL,
+    'data': _rt.FC_TYPE_DATA,
+    'ext': _rt.FC_TYPE_EXT,
+}
+
+_operators = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda value, values: value in values,
+    ast.NotIn: lambda value, values: value not in values,
+}
+
+# the operator to use when the field is on the right-hand side
+_reversed = {
+    ast.Eq: ast.Eq,
+    ast.NotEq: ast.NotEq,
+    ast.Lt: ast.Gt,
+    ast.LtE: ast.GtE,
+    ast.Gt: ast.Lt,
+    ast.GtE: ast.LtE,
+}
+
+_MAC_NAMES = ('fc', 'type', 'subtype', 'addr1', 'addr2', 'addr3')
+_ADDR_NAMES = ('addr1', 'addr2', 'addr3')
+
+# radiotap names whose values are not scalars
+_NESTED_NAMES = frozenset(('vht_user', 'he_mu_ru_channel1',
+                           'he_mu_ru_channel2', 'eht_data', 'eht_user_info',
+                           'tlvs'))
+
+def _addr_bytes(value):
+    if not isinstance(value, str):
+        raise ValueError('addresses are compared to strings: %r' % (value,))
+    return bytes.fromhex(value.replace(':', '').replace('-', ''))
+
+# --- parsing: Python AST to a tuple tree -----------------------------------
+#
+#   ('and', (node, ...)), ('or', (node, ...)), ('not', node),
+#   ('test', term), ('cmp', term, op, value)
+#
+# where term is (name, mask) with mask None when unmasked.
+
+def _literal(node, name):
+    if isinstance(node, ast.Constant) and \
+            isinstance(node.value, (int, float, str)) and \
+            not isinstance(node.value, bool):
+        value = node.value
+    elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) and \
+            isinstance(node.operand, ast.Constant) and \
+            isinstance(node.operand.value, (int, float)):
+        value = -node.operand.value
+    elif isinstance(node, ast.Name) and node.id in _type_names:
+        value = _type_names[node.id]
+    elif isinstance(node, (ast.Tuple, ast.List, ast.Set)):
+        return frozenset(_literal(elt, name) for elt in node.elts)
+    else:
+        raise ValueError('expected a constant: %s' % ast.dump(node))
+    if name in _ADDR_NAMES:
+        return _addr_bytes(value)
+    return value
+
+def _term(node):
+    """Return (name, mask) if node is a field or a masked field, else None."""
+    mask = None
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitAnd):
+        mask = node.right
+        node = node.left
+        if not (isinstance(mask, ast.Constant) and
+                isinstance(mask.value, int)):
+            raise ValueError('masks must be integers: %s' % ast.dump(mask))
+        mask = mask.value
+    if not isinstance(node, ast.Name) or node.id in _type_names:
+        return None
+    name = node.id
+    if name not in _MAC_NAMES:
+        if name not in _rt._field_ids or name in _NESTED_NAMES:
+            raise ValueError('cannot filter on %r' % name)
+    if mask is not None and name in _ADDR_NAMES:
+        raise ValueError('cannot mask %r' % name)
+    return name, mask
+
+def _comparison(op, left, right):
+    term = _term(left)
+    if term is not None:
+        value = _literal(right, term[0])
+    else:
+        term = _term(right)
+        if term is None or type(op) not in _reversed:
+            raise ValueError('comparisons need a field on one side')
+        value = _literal(left, term[0])
+        op = _reversed[type(op)]()
+    if isinstance(value, frozenset) != isinstance(op, (ast.In, ast.NotIn)):
+        raise ValueError('in and not in compare to a tuple of constants')
+    return ('cmp', term, _operators[type(op)], value)
+
+def _tree(node):
+    if isinstance(node, ast.BoolOp):
+        kind = 'and' if isinstance(node.op, ast.And) else 'or'
+        return (kind, tuple(_tree(value) for value in node.values))
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        return ('not', _tree(node.operand))
+    if isinstance(node, ast.Compare):
+        left = node.left
+        parts = []
+        for op, right in zip(node.ops, node.comparators):
+            parts.append(_comparison(op, left, right))
+            left = right
+        return parts[0] if len(parts) == 1 else ('and', tuple(parts))
+    term = _term(node)
+    if term is None:
+        raise ValueError('unsupported expression: %s' % ast.dump(node))
+    return ('test', term)
+
+def _names(tree):
+    if tree[0] in ('and', 'or'):
+        return set().union(*(_names(node) for node in tree[1]))
+    if tree[0] == 'not':
+        return _names(tree[1])
+    return set([tree[1][0]])
+
+# --- compiling: tuple tree to closures over (packet, radiotap_len) ---------
+#
+# Subtrees that are decided by the layout alone compile to True or False.
+
+def _mac_getter(name):
+    fc_classes = _rt._fc_classes
+    if name == 'fc':
+        def get(packet, rtlen):
+            if len(packet) >= rtlen + 2:
+                return packet[rtlen] | (packet[rtlen + 1] << 8)
+    elif name in ('type', 'subtype'):
+        index = 0 if name == 'type' else 1
+        def get(packet, rtlen):
+            if len(packet) > rtlen:
+                return fc_classes[packet[rtlen]][index]
+    else:
+        start = {'addr1': 4, 'addr2': 10, 'addr3': 16}[name]
+        if name == 'addr1':
+            layouts = None
+        elif name == 'addr2':
+            layouts = frozenset(layout for layout in range(5)
+                                if layout != _rt._LAYOUT_ADDR1)
+        else:
+            layouts = frozenset([_rt._LAYOUT_THREE_ADDR])
+        def get(packet, rtlen):
+            if len(packet) < rtlen + start + 6:
+                return None
+            if layouts is not None and \
+                    fc_classes[packet[rtlen]][2] not in layouts:
+                return None
+            return bytes(packet[rtlen + start:rtlen + start + 6])
+    return get
+
+def _plan_getter(name, plan):
+    """
+    Return (getter, nullable) reading name at its fixed offset in the
+    plan's layout, or None if the layout lacks the field.
+    """
+    field = plan.names.get(name)
+    if field is None:
+        return None
+    field_id, offset, names, decode, _, _ = field
+    if field_id == _rt._TLV_FIELD:
+        parse_tlvs = _rt._parse_tlvs
+        return (lambda packet, rtlen: parse_tlvs(packet, offset)[1].get(name),
+                True)
+    unpack_from = _rt._field_structs[field_id].unpack_from
+    if decode is None:
+        index = names.index(name)
+        return lambda packet, rtlen: unpack_from(packet, offset)[index], False
+    return (lambda packet, rtlen: decode(*unpack_from(packet, offset))[name],
+            True)
+
+def _parsed_getter(name, projection):
+    """Getter through radiotap_parse(), for layouts without a plan."""
+    parse = _rt.radiotap_parse
+    def get(packet, rtlen):
+        return parse(packet, fields=projection)[1].get(name)
+    return get, True
+
+def _and(tests):
+    tests = [test for test in tests if test is not True]
+    if any(test is False for test in tests):
+        return False
+    if not tests:
+        return True
+    return functools.reduce(
+        lambda a, b: lambda packet, rtlen: a(packet, rtlen) and b(packet, rtlen),
+        tests)
+
+def _or(tests):
+    tests = [test for test in tests if test is not False]
+    if any(test is True for test in tests):
+        return True
+    if not tests:
+        return False
+    return functools.reduce(
+        lambda a, b: lambda packet, rtlen: a(packet, rtlen) or b(packet, rtlen),
+        tests)
+
+def _not(test):
+    if test is True or test is False:
+        return not test
+    return lambda packet, rtlen: not test(packet, rtlen)
+
+def _compile_tree(tree, getter):
+    kind = tree[0]
+    if kind == 'and':
+        return _and([_compile_tree(node, getter) for node in tree[1]])
+    if kind == 'or':
+        return _or([_compile_tree(node, getter) for node in tree[1]])
+    if kind == 'not':
+        return _not(_compile_tree(tree[1], getter))
+
+    (name, mask) = tree[1]
+    found = getter(name)
+    if found is None:
+        return False
+    get, nullable = found
+    if mask is not None:
+        get_raw = get
+        if nullable:
+            def get(packet, rtlen):
+                value = get_raw(packet, rtlen)
+                return None if value is None else value & mask
+        else:
+            get = lambda packet, rtlen: get_raw(packet, rtlen) & mask
+
+    if kind == 'test':
+        return lambda packet, rtlen: bool(get(packet, rtlen))
+
+    _, _, op, value = tree
+    if not nullable:
+        return lambda packet, rtlen: op(get(packet, rtlen), value)
+    def test(packet, rtlen):
+        v = get(packet, rtlen)
+        return v is not None and op(v, value)
+    return test
+
+def _checked(test):
+    """
+    Guard the test of a layout without a plan (vendor namespaces) so
+    that headers radiotap_parse_checked() finds malformed never match.
+    """
+    check = _rt.radiotap_parse_checked
+    usable = (_rt.PARSE_OK, _rt.PARSE_UNKNOWN_FIELD)
+    def guarded(packet, rtlen):
+        if check(packet)[0] not in usable:
+            return False
+        return test is True or (test is not False and test(packet, rtlen))
+    return guarded
+
+class Filter(object):
+    """
+    Compiled filter expression, see compile_filter().  match(packet)
+    tells whether a packet, starting with its radiotap header, matches.
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        try:
+            node = ast.parse(expression.strip(), mode='eval').body
+        except SyntaxError as e:
+            raise ValueError('invalid filter %r: %s' % (expression, e))
+        self._tree = _tree(node)
+        self.names = frozenset(_names(self._tree))
+        self._projection = _rt.compile_fields(
+            [name for name in self.names if name not in _MAC_NAMES])
+        self._tests = _rt._PlanCache(_rt.PLAN_CACHE_SIZE, self._compile)
+
+    def __repr__(self):
+        return 'Filter(%r)' % (self.expression,)
+
+    def _compile(self, key):
+        """Compile the expression for one presence bitmap layout."""
+        plan = _rt._plan_cache.lookup(key)
+        if plan is None:
+            projection = self._projection
+            def getter(name):
+                if name in _MAC_NAMES:
+                    return _mac_getter(name), True
+                return _parsed_getter(name, projection)
+            return 0, _checked(_compile_tree(self._tree, getter))
+
+        def getter(name):
+            if name in _MAC_NAMES:
+                return _mac_getter(name), True
+            return _plan_getter(name, plan)
+        return plan.end, _compile_tree(self._tree, getter)
+
+    def match(self, packet):
+        status, radiotap_len, _, key = _rt._check_header(packet)
+        if status:
+            return False
+        end, test = self._tests.lookup(key)
+        if end > radiotap_len:
+            return False
+        if test is True or test is False:
+            return test
+        return test(packet, radiotap_len)
+
+    __call__ = match
+
+    def filter(self, packets):
+        """Yield the packets that match."""
+        match = self.match
+        for packet in packets:
+            if match(packet):
+                yield packet
+
+@functools.lru_cache(maxsize=64)
+def _compile_filter(expression):
+    return Filter(expression)
+
+def compile_filter(expression):
+    """
+    Compile a filter expression into a Filter; a Filter is returned as
+    is.  Compiled filters are cached by expression.
+    """
+    if isinstance(expression, Filter):
+        return expression
+    return _compile_filter(expression)
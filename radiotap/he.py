@@ -0,0 +1,77 @@
+"""
+    he and eht lookups and helpers
+    see http://www.radiotap.org/fields/HE
+        http://www.radiotap.org/fields/U-SIG
+        http://www.radiotap.org/fields/EHT
+"""
+
+# (bits per subcarrier, coding rate) by mcs index; 12 and 13 are EHT only
+he_mcs_modulation = (
+    (1, 1 / 2.),
+    (2, 1 / 2.),
+    (2, 3 / 4.),
+    (4, 1 / 2.),
+    (4, 3 / 4.),
+    (6, 2 / 3.),
+    (6, 3 / 4.),
+    (6, 5 / 6.),
+    (8, 3 / 4.),
+    (8, 5 / 6.),
+    (10, 3 / 4.),
+    (10, 5 / 6.),
+    (12, 3 / 4.),
+    (12, 5 / 6.),
+)
+
+# guard interval in microseconds by radiotap gi value
+he_gi_us = (0.8, 1.6, 3.2, None)
+
+# data subcarriers by the HE data5 "data bandwidth/RU allocation" value:
+# 20, 40, 80, 160 MHz, then 26, 52, 106, 242, 484, 996 and 2x996-tone RUs
+he_data_subcarriers = (234, 468, 980, 1960, 24, 48, 102, 234, 468, 980, 1960)
+
+he_bandwidth_mhz = (20, 40, 80, 160)
+
+# data subcarriers and bandwidth by the U-SIG bandwidth value
+eht_data_subcarriers = (234, 468, 980, 1960, 3920, 3920)
+eht_bandwidth_mhz = (20, 40, 80, 160, 320, 320)
+
+_HE_SYMBOL_US = 12.8
+
+def _ofdm_rate(mcs, nss, gi, subcarriers):
+    bits, coding = he_mcs_modulation[mcs]
+    return round(nss * subcarriers * bits * coding /
+                 (_HE_SYMBOL_US + he_gi_us[gi]), 1)
+
+def _rate_key(mcs, nss, gi, bw):
+    """pack (mcs, nss, gi, bandwidth) into a table index, 4+4+2+4 bits"""
+    return (mcs << 10) | (nss << 6) | (gi << 4) | bw
+
+def _build_rate_table(max_mcs, subcarriers):
+    rates = [None] * (1 << 14)
+    for mcs in range(max_mcs + 1):
+        for nss in range(1, 16):
+            for gi in range(3):
+                for bw, tones in enumerate(subcarriers):
+                    rates[_rate_key(mcs, nss, gi, bw)] = \
+                        _ofdm_rate(mcs, nss, gi, tones)
+    return tuple(rates)
+
+_he_rates = _build_rate_table(11, he_data_subcarriers)
+_eht_rates = _build_rate_table(13, eht_data_subcarriers)
+
+def he_rate(mcs, nss, gi, bw_ru):
+    """mcs is 0-11, nss the number of spatial streams,
+       gi: 0=0.8us 1=1.6us 2=3.2us, bw_ru: the HE data5 bandwidth/RU value
+       Returns None for combinations without a defined rate."""
+    if not (0 <= mcs < 16 and 0 <= nss < 16 and 0 <= gi < 4 and 0 <= bw_ru < 16):
+        return None
+    return _he_rates[_rate_key(mcs, nss, gi, bw_ru)]
+
+def eht_rate(mcs, nss, gi, bw):
+    """mcs is 0-13, nss the number of spatial streams,
+       gi: 0=0.8us 1=1.6us 2=3.2us, bw: the U-SIG bandwidth value
+       Returns None for combinations without a defined rate."""
+    if not (0 <= mcs < 16 and 0 <= nss < 16 and 0 <= gi < 4 and 0 <= bw < 16):
+        return None
+    return _eht_rates[_rate_key(mcs, nss, gi, bw)]
@@ -0,0 +1,387 @@
+"""
+    management frame bodies and their information elements
+    see IEEE 802.11-2020 9.3.3 and 9.4.2
+
+    example:
+    >>> import radiotap as r, radiotap.pcap as rp, radiotap.ie as ri
+    >>> for tstamp, pkt in rp.read_pcap('foo.pcap'):
+    ...     off, radiotap = r.radiotap_parse(pkt)
+    ...     off, mac = r.ieee80211_parse(pkt, off)
+    ...     off, mgmt = ri.mgmt_parse(pkt, off, mac)
+    ...     if mgmt:
+    ...         print(mgmt.get('beacon_interval'), mgmt['ies'].get('ssid'))
+
+    mgmt_parse() decodes the fixed fields of a management frame body and
+    indexes the information elements after them in a single pass that
+    only records (element id, offset, length).  An element is decoded
+    when it is asked for, so skimming a beacon for its SSID costs one
+    index scan and one slice.  Extension elements (id 255) are numbered
+    0xff00 | extension id, e.g. IE_HE_CAPABILITIES.
+
+    SSID, DS parameter set, HT, VHT and HE capabilities and RSN elements
+    have decoders; other elements are returned as memoryviews into the
+    packet.
+"""
+import struct
+
+from radiotap.radiotap import FC_TYPE_MGMT, _fc_classes, macstr
+
+IE_SSID = 0
+IE_SUPPORTED_RATES = 1
+IE_DS_PARAMETER_SET = 3
+IE_TIM = 5
+IE_COUNTRY = 7
+IE_HT_CAPABILITIES = 45
+IE_RSN = 48
+IE_EXTENDED_SUPPORTED_RATES = 50
+IE_HT_OPERATION = 61
+IE_EXTENDED_CAPABILITIES = 127
+IE_VHT_CAPABILITIES = 191
+IE_VHT_OPERATION = 192
+IE_VENDOR_SPECIFIC = 221
+IE_EXTENSION = 255
+IE_HE_CAPABILITIES = 0xff23
+IE_HE_OPERATION = 0xff24
+
+# subtypes of management frames
+MGMT_ASSOC_REQ = 0
+MGMT_ASSOC_RESP = 1
+MGMT_REASSOC_REQ = 2
+MGMT_REASSOC_RESP = 3
+MGMT_PROBE_REQ = 4
+MGMT_PROBE_RESP = 5
+MGMT_BEACON = 8
+MGMT_ATIM = 9
+MGMT_DISASSOC = 10
+MGMT_AUTH = 11
+MGMT_DEAUTH = 12
+MGMT_ACTION = 13
+
+# fixed fields ahead of the elements by management subtype; subtypes
+# not listed here (action frames among them) are not indexed
+_fixed_fields = {
+    MGMT_ASSOC_REQ: ('<HH', ('capability', 'listen_interval')),
+    MGMT_ASSOC_RESP: ('<HHH', ('capability', 'status', 'aid')),
+    MGMT_REASSOC_REQ: ('<HH6s', ('capability', 'listen_interval',
+                                 'current_ap')),
+    MGMT_REASSOC_RESP: ('<HHH', ('capability', 'status', 'aid')),
+    MGMT_PROBE_REQ: ('<', ()),
+    MGMT_PROBE_RESP: ('<QHH', ('timestamp', 'beacon_interval',
+                               'capability')),
+    MGMT_BEACON: ('<QHH', ('timestamp', 'beacon_interval', 'capability')),
+    MGMT_DISASSOC: ('<H', ('reason',)),
+    MGMT_AUTH: ('<HHH', ('auth_algorithm', 'auth_seq', 'status')),
+    MGMT_DEAUTH: ('<H', ('reason',)),
+}
+_fixed_fields = dict((subtype, (struct.Struct(fmt), names))
+                     for subtype, (fmt, names) in _fixed_fields.items())
+
+# cipher and AKM suites of RSN elements are numbered OUI << 8 | type
+CIPHER_SUITES = {
+    0x000fac01: 'WEP-40',
+    0x000fac02: 'TKIP',
+    0x000fac04: 'CCMP-128',
+    0x000fac05: 'WEP-104',
+    0x000fac06: 'BIP-CMAC-128',
+    0x000fac08: 'GCMP-128',
+    0x000fac09: 'GCMP-256',
+    0x000fac0a: 'CCMP-256',
+    0x000fac0b: 'BIP-GMAC-128',
+    0x000fac0c: 'BIP-GMAC-256',
+    0x000fac0d: 'BIP-CMAC-256',
+}
+
+AKM_SUITES = {
+    0x000fac01: '802.1X',
+    0x000fac02: 'PSK',
+    0x000fac03: 'FT-802.1X',
+    0x000fac04: 'FT-PSK',
+    0x000fac05: '802.1X-SHA256',
+    0x000fac06: 'PSK-SHA256',
+    0x000fac08: 'SAE',
+    0x000fac09: 'FT-SAE',
+    0x000fac12: 'OWE',
+    0x000fac18: 'SAE-EXT-KEY',
+}
+
+_ht_cap_struct = struct.Struct('<HB16sHIB')
+_vht_cap_struct = struct.Struct('<IHHHH')
+_u16 = struct.Struct('<H')
+_suite = struct.Struct('>I')
+
+def _decode_ssid(data):
+    return bytes(data)
+
+def _decode_ds_parameter_set(data):
+    return data[0]
+
+def _decode_ht_capabilities(data):
+    ht_cap_info, ampdu_params, mcs_set, ht_ext_cap, txbf_cap, asel_cap = \
+        _ht_cap_struct.unpack_from(data)
+    return {
+        'ht_cap_info': ht_cap_info,
+        'ldpc': ht_cap_info & 0x0001,
+        'chan_width_40': (ht_cap_info >> 1) & 1,
+        'sgi_20': (ht_cap_info >> 5) & 1,
+        'sgi_40': (ht_cap_info >> 6) & 1,
+        'ampdu_params': ampdu_params,
+        # supported MCS indices 0-76 as a bitmask
+        'rx_mcs_bitmask': int.from_bytes(mcs_set[:10], 'little') &
+            ((1 << 77) - 1),
+        'ht_ext_cap': ht_ext_cap,
+        'txbf_cap': txbf_cap,
+        'asel_cap': asel_cap,
+    }
+
+def _mcs_map_nss(mcs_map):
+    """Number of spatial streams a VHT/HE MCS map supports."""
+    nss = 0
+    for i in range(8):
+        if (mcs_map >> (2 * i)) & 0x3 != 0x3:
+            nss = i + 1
+    return nss
+
+def _decode_vht_capabilities(data):
+    vht_cap_info, rx_mcs_map, rx_highest, tx_mcs_map, tx_highest = \
+        _vht_cap_struct.unpack_from(data)
+    return {
+        'vht_cap_info': vht_cap_info,
+        'max_mpdu_length': vht_cap_info & 0x3,
+        'supported_chan_width': (vht_cap_info >> 2) & 0x3,
+        'sgi_80': (vht_cap_info >> 5) & 1,
+        'sgi_160': (vht_cap_info >> 6) & 1,
+        'rx_mcs_map': rx_mcs_map,
+        'rx_highest': rx_highest & 0x1fff,
+        'tx_mcs_map': tx_mcs_map,
+        'tx_highest': tx_highest & 0x1fff,
+        'rx_nss': _mcs_map_nss(rx_mcs_map),
+        'tx_nss': _mcs_map_nss(tx_mcs_map),
+    }
+
+def _decode_he_capabilities(data):
+    if len(data) < 21:
+        raise struct.error('HE capabilities element too short')
+    he_mac_cap = int.from_bytes(data[0:6], 'little')
+    he_phy_cap = int.from_bytes(data[6:17], 'little')
+    chan_width_set = (data[6] >> 1) & 0x7f
+    he = {
+        'he_mac_cap': he_mac_cap,
+        'he_phy_cap': he_phy_cap,
+        'chan_width_set': chan_width_set,
+    }
+    # rx/tx MCS maps for <= 80 MHz, then 160 and 80+80 MHz if supported
+    offset = 17
+    for suffix, present in (('80', True),
+                            ('160', chan_width_set & 0x4),
+                            ('80p80', chan_width_set & 0x8)):
+        if not present:
+            continue
+        rx, tx = struct.unpack_from('<HH', data, offset)
+        he['rx_mcs_' + suffix] = rx
+        he['tx_mcs_' + suffix] = tx
+        offset += 4
+    he['rx_nss'] = _mcs_map_nss(he['rx_mcs_80'])
+    he['tx_nss'] = _mcs_map_nss(he['tx_mcs_80'])
+    return he
+
+def _suites(data, offset):
+    count, = _u16.unpack_from(data, offset)
+    offset += 2
+    suites = [_suite.unpack_from(data, offset + 4 * i)[0]
+              for i in range(count)]
+    return offset + 4 * count, suites
+
+def _decode_rsn(data):
+    """
+    Decode an RSN element.  Its trailing fields are optional, so only
+    the fields the element carries are returned.
+    """
+    version, = _u16.unpack_from(data)
+    rsn = {'version': version}
+    if len(data) < 6:
+        return rsn
+    rsn['group_cipher'], = _suite.unpack_from(data, 2)
+    offset = 6
+    if len(data) >= offset + 2:
+        offset, rsn['pairwise_ciphers'] = _suites(data, offset)
+    if len(data) >= offset + 2:
+        offset, rsn['akm_suites'] = _suites(data, offset)
+    if len(data) >= offset + 2:
+        rsn['rsn_capabilities'], = _u16.unpack_from(data, offset)
+        offset += 2
+    if len(data) >= offset + 2:
+        count, = _u16.unpack_from(data, offset)
+        offset += 2
+        rsn['pmkids'] = [bytes(data[offset + 16 * i:offset + 16 * (i + 1)])
+                         for i in range(count)]
+        offset += 16 * count
+    if len(data) >= offset + 4:
+        rsn['group_mgmt_cipher'], = _suite.unpack_from(data, offset)
+    return rsn
+
+# (name, decoder) by element id
+_decoders = {
+    IE_SSID: ('ssid', _decode_ssid),
+    IE_DS_PARAMETER_SET: ('ds_parameter_set', _decode_ds_parameter_set),
+    IE_HT_CAPABILITIES: ('ht_capabilities', _decode_ht_capabilities),
+    IE_RSN: ('rsn', _decode_rsn),
+    IE_VHT_CAPABILITIES: ('vht_capabilities', _decode_vht_capabilities),
+    IE_HE_CAPABILITIES: ('he_capabilities', _decode_he_capabilities),
+}
+
+# element id by decoder name
+IE_IDS = dict((name, element_id)
+              for element_id, (name, _) in _decoders.items())
+
+class InformationElements(object):
+    """
+    Index of the information elements in packet[offset:end], built by
+    one scan that records (element id, data offset, data length) per
+    element.  Elements are looked up by id or decoder name (e.g. 'ssid')
+    and decoded on first access.  truncated is set when the last element
+    runs past end; it is left out of the index.
+    """
+
+    def __init__(self, packet, offset, end=None):
+        if end is None:
+            end = len(packet)
+        self.packet = memoryview(packet)
+        self.truncated = False
+        self._decoded = {}
+        index = []
+        while offset + 2 <= end:
+            element_id = packet[offset]
+            length = packet[offset + 1]
+            data = offset + 2
+            offset = data + length
+            if offset > end:
+                self.truncated = True
+                break
+            if element_id == IE_EXTENSION and length:
+                element_id = 0xff00 | packet[data]
+                data += 1
+                length -= 1
+            index.append((element_id, data, length))
+        if offset < end:
+            # a single byte left over
+            self.truncated = True
+        self.index = index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        """Iterate over the element ids, in packet order."""
+        return (element_id for element_id, _, _ in self.index)
+
+    def __contains__(self, element_id):
+        return self._find(element_id) is not None
+
+    def __getitem__(self, element_id):
+        value = self.get(element_id, self)
+        if value is self:
+            raise KeyError(element_id)
+        return value
+
+    def _find(self, element_id):
+        element_id = IE_IDS.get(element_id, element_id)
+        for entry in self.index:
+            if entry[0] == element_id:
+                return entry
+        return None
+
+    def raw(self, element_id):
+        """The data of the first element element_id as a memoryview, or None."""
+        entry = self._find(element_id)
+        if entry is None:
+            return None
+        _, data, length = entry
+        return self.packet[data:data + length]
+
+    def all(self, element_id):
+        """The data of every element element_id, e.g. vendor specific ones."""
+        element_id = IE_IDS.get(element_id, element_id)
+        return [self.packet[data:data + length]
+                for entry_id, data, length in self.index
+                if entry_id == element_id]
+
+    def get(self, element_id, default=None):
+        """
+        The first element element_id, decoded if there is a decoder for
+        it and as a memoryview otherwise.  Elements too short for their
+        decoder come back as None.
+        """
+        element_id = IE_IDS.get(element_id, element_id)
+        if element_id in self._decoded:
+            return self._decoded[element_id]
+        data = self.raw(element_id)
+        if data is None:
+            return default
+        if element_id not in _decoders:
+            return data
+        try:
+            value = _decoders[element_id][1](data)
+        except (struct.error, IndexError):
+            value = None
+        self._decoded[element_id] = value
+        return value
+
+    def decode(self):
+        """Decode every element that has a decoder into a dict by name."""
+        return dict((_decoders[element_id][0], self.get(element_id))
+                    for element_id in set(self) if element_id in _decoders)
+
+def find_ie(packet, offset, element_id, end=None):
+    """
+    The data of the first element element_id in packet[offset:end] as a
+    memoryview, or None, scanning no further than needed.
+    """
+    if end is None:
+        end = len(packet)
+    extension = None
+    if element_id > IE_EXTENSION:
+        extension = element_id & 0xff
+        element_id = IE_EXTENSION
+    while offset + 2 <= end:
+        data = offset + 2
+        offset = data + packet[offset + 1]
+        if offset > end:
+            return None
+        if packet[data - 2] != element_id:
+            continue
+        if extension is None:
+            return memoryview(packet)[data:offset]
+        if offset > data and packet[data] == extension:
+            return memoryview(packet)[data + 1:offset]
+    return None
+
+def mgmt_parse(packet, offset, mac, end=None):
+    """
+    Parse the body of a management frame at offset in packet, with mac
+    the header from ieee80211_parse().  Return a tuple (offset, mgmt)
+    with mgmt a dictionary of the fixed fields and 'ies', the
+    InformationElements of the frame.  mgmt is empty for other frames,
+    truncated ones and subtypes without elements.
+
+    Pass end to exclude a trailing FCS, i.e. len(packet) - 4 when the
+    radiotap flags have 0x10 set.
+    """
+    if end is None:
+        end = len(packet)
+    if not mac or not offset:
+        return offset, {}
+    type, subtype, _, _ = _fc_classes[mac['fc'] & 0xff]
+    if type != FC_TYPE_MGMT or subtype not in _fixed_fields:
+        return offset, {}
+    if mac['fc'] & 0x8000:
+        # +HTC: HT control field after the header
+        offset += 4
+    fixed, names = _fixed_fields[subtype]
+    if end - offset < fixed.size:
+        return offset, {}
+    mgmt = dict(zip(names, fixed.unpack_from(packet, offset)))
+    if 'current_ap' in mgmt:
+        mgmt['current_ap'] = macstr(mgmt['current_ap'])
+    offset += fixed.size
+    mgmt['ies'] = InformationElements(packet, offset, end)
+    return end, mgmt
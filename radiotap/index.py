@@ -0,0 +1,317 @@
+"""
+    sidecar index files for random access into captures
+
+    example:
+    >>> import radiotap.index as ri
+    >>> with ri.CaptureIndex('foo.pcap') as idx:
+    ...     for tstamp, radiotap, mac in idx.query(start=1700000000,
+    ...                                            end=1700000060,
+    ...                                            station='00:11:22:33:44:55'):
+    ...         print(tstamp, radiotap.get('dbm_antsignal'))
+
+    The index lives next to the capture (foo.pcap.rtidx) and holds one
+    fixed-size entry per radiotap record: record and packet offsets,
+    TSFT, capture timestamp, chan_freq, frame type and subtype, addr1 and
+    addr2.  Entries are plain little-endian structs (see INDEX_FIELDS),
+    so the file can be memory-mapped as an array, e.g. with numpy.memmap.
+
+    Building the index is incremental: build_index() appends entries for
+    records added since the last run, so it can follow a growing capture.
+"""
+import mmap
+import os
+import struct
+
+from radiotap.pcap import PcapReader
+from radiotap.radiotap import radiotap_parse, ieee80211_parse, compile_fields
+
+INDEX_SUFFIX = '.rtidx'
+INDEX_MAGIC = b'RTIDX\x00\x00\x00'
+INDEX_VERSION = 1
+
+# valid bits of an entry
+HAS_TSFT = 0x01
+HAS_CHANNEL = 0x02
+HAS_ADDR1 = 0x04
+HAS_ADDR2 = 0x08
+
+# numpy dtype description of one entry
+INDEX_FIELDS = [
+    ('offset', '<u8'),
+    ('data', '<u8'),
+    ('tsft', '<u8'),
+    ('tstamp', '<f8'),
+    ('length', '<u4'),
+    ('chan_freq', '<u2'),
+    ('type', 'u1'),
+    ('subtype', 'u1'),
+    ('valid', 'u1'),
+    ('addr1', 'S6'),
+    ('addr2', 'S6'),
+    ('pad', 'V3'),
+]
+
+_header = struct.Struct('<8sII')
+_entry = struct.Struct('<QQQdIHBBB6s6s3x')
+_tstamp = struct.Struct('<d')
+_TSTAMP_OFFSET = 24
+
+_index_fields = compile_fields(['TSFT', 'chan_freq'])
+
+def index_path(path):
+    """Default sidecar index path for the capture at path."""
+    return path + INDEX_SUFFIX
+
+def _station_bytes(station):
+    if isinstance(station, int):
+        return station.to_bytes(6, 'big')
+    if isinstance(station, str):
+        return bytes.fromhex(station.replace(':', '').replace('-', ''))
+    return bytes(station)
+
+def _entry_values(offset, tstamp, data, data_end, pkt):
+    valid = 0
+    tsft = chan_freq = 0
+    fc_type = subtype = 0xff
+    addr1 = addr2 = b''
+
+    try:
+        off, radiotap = radiotap_parse(pkt, fields=_index_fields)
+    except struct.error:
+        # truncated radiotap header: indexed by position only
+        off, radiotap = 0, {}
+    if 'TSFT' in radiotap:
+        tsft = radiotap['TSFT']
+        valid |= HAS_TSFT
+    if 'chan_freq' in radiotap:
+        chan_freq = radiotap['chan_freq']
+        valid |= HAS_CHANNEL
+    mac = ieee80211_parse(pkt, off, addr_format='bytes')[1] if off else {}
+    if mac:
+        fc_type, subtype = mac['type'], mac['subtype']
+        addr1 = mac['addr1']
+        valid |= HAS_ADDR1
+        if 'addr2' in mac:
+            addr2 = mac['addr2']
+            valid |= HAS_ADDR2
+
+    return (offset, data, tsft, float('nan') if tstamp is None else tstamp,
+            data_end - data, chan_freq, fc_type, subtype, valid, addr1, addr2)
+
+def _last_entry(index):
+    """
+    Check the index file, drop a partially written last entry and return
+    the last entry as a tuple, or None.
+    """
+    size = os.path.getsize(index)
+    with open(index, 'r+b') as f:
+        header = f.read(_header.size)
+        if len(header) < _header.size or \
+                _header.unpack(header) != (INDEX_MAGIC, INDEX_VERSION,
+                                           _entry.size):
+            raise ValueError('%s: not a radiotap index' % index)
+        entries = (size - _header.size) // _entry.size
+        if _header.size + entries * _entry.size != size:
+            f.truncate(_header.size + entries * _entry.size)
+        if not entries:
+            return None
+        f.seek(_header.size + (entries - 1) * _entry.size)
+        return _entry.unpack(f.read(_entry.size))
+
+def build_index(path, index=None):
+    """
+    Create or extend the sidecar index of the capture at path and return
+    the number of entries added.  An index whose last entry no longer
+    matches the capture (e.g. the capture was replaced) is rebuilt.
+    """
+    index = index or index_path(path)
+    last = None
+    if os.path.exists(index) and os.path.getsize(index):
+        last = _last_entry(index)
+
+    with PcapReader(path) as reader:
+        buf = reader.buf
+        records = reader.locate()
+        if last is not None:
+            # resume after the last indexed record if it is still there
+            records = reader.locate(last[0])
+            offset, tstamp, data, data_end = next(records, (None,) * 4)
+            if offset != last[0] or _entry.pack(*last) != _entry.pack(
+                    *_entry_values(offset, tstamp, data, data_end,
+                                   buf[data:data_end])):
+                records = reader.locate()
+                with open(index, 'r+b') as f:
+                    f.truncate(_header.size)
+
+        added = 0
+        with open(index, 'ab') as f:
+            if f.tell() == 0:
+                f.write(_header.pack(INDEX_MAGIC, INDEX_VERSION, _entry.size))
+            for offset, tstamp, data, data_end in records:
+                f.write(_entry.pack(*_entry_values(offset, tstamp, data,
+                                                   data_end,
+                                                   buf[data:data_end])))
+                added += 1
+    return added
+
+class CaptureIndex(object):
+    """
+    A capture file together with its sidecar index, built or brought up
+    to date when opened unless update is false.
+    """
+
+    def __init__(self, path, index=None, update=True):
+        self.path = path
+        self.index = index or index_path(path)
+        if update or not os.path.exists(self.index):
+            build_index(path, self.index)
+        self._reader = None
+        self._open()
+
+    def _open(self):
+        self._file = open(self.index, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if _header.unpack_from(self._map) != (INDEX_MAGIC, INDEX_VERSION,
+                                              _entry.size):
+            self._map.close()
+            self._file.close()
+            raise ValueError('%s: not a radiotap index' % self.index)
+        # whole entries only, in case another process is appending
+        count = (len(self._map) - _header.size) // _entry.size
+        self.entries = memoryview(self._map)[
+            _header.size:_header.size + count * _entry.size]
+        self._reader = PcapReader(self.path)
+        self._time_ordered = None
+
+    def close(self):
+        if self._reader is None:
+            return
+        self.entries.release()
+        try:
+            self._map.close()
+        except BufferError:
+            # array() views still referenced by the caller
+            pass
+        self._file.close()
+        self._reader.close()
+        self._reader = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.entries) // _entry.size
+
+    def update(self):
+        """Index records appended to the capture since it was opened."""
+        self.close()
+        added = build_index(self.path, self.index)
+        self._open()
+        return added
+
+    def entry(self, i):
+        """Entry i as a dict named like INDEX_FIELDS."""
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        values = _entry.unpack_from(self.entries, i * _entry.size)
+        return dict(zip([name for name, _ in INDEX_FIELDS], values))
+
+    def array(self):
+        """The entries as a numpy structured array backed by the index file."""
+        import numpy as np
+        return np.frombuffer(self.entries, dtype=np.dtype(INDEX_FIELDS))
+
+    def _tstamp(self, i):
+        return _tstamp.unpack_from(self.entries,
+                                   i * _entry.size + _TSTAMP_OFFSET)[0]
+
+    def _sorted_by_time(self):
+        """True if no capture timestamp is missing or goes backwards."""
+        if self._time_ordered is None:
+            tstamps = [self._tstamp(i) for i in range(len(self))]
+            self._time_ordered = all(t == t for t in tstamps) and \
+                all(a <= b for a, b in zip(tstamps, tstamps[1:]))
+        return self._time_ordered
+
+    def _bisect(self, tstamp):
+        """Number of the first entry at or after tstamp."""
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._tstamp(mid) < tstamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def select(self, start=None, end=None, tsft_start=None, tsft_end=None,
+               station=None, chan_freq=None):
+        """
+        Return the numbers of the entries with a capture timestamp in
+        [start, end), a TSFT in [tsft_start, tsft_end), station as addr1
+        or addr2 and the given chan_freq; None matches anything.
+
+        A time range is looked up by bisection when the entries are in
+        timestamp order, as in most captures, and scanned otherwise.
+        """
+        if station is not None:
+            station = _station_bytes(station)
+        tsft = tsft_start is not None or tsft_end is not None
+        first, last = 0, len(self)
+        if (start is not None or end is not None) and self._sorted_by_time():
+            if start is not None:
+                first = self._bisect(start)
+            if end is not None:
+                last = max(first, self._bisect(end))
+            start = end = None
+        selected = []
+        with self.entries[first * _entry.size:last * _entry.size] as entries:
+            for i, (_, _, entry_tsft, tstamp, _, freq, _, _, valid, addr1,
+                    addr2) in enumerate(_entry.iter_unpack(entries), first):
+                if start is not None and not tstamp >= start:
+                    continue
+                if end is not None and not tstamp < end:
+                    continue
+                if tsft:
+                    if not valid & HAS_TSFT:
+                        continue
+                    if tsft_start is not None and entry_tsft < tsft_start:
+                        continue
+                    if tsft_end is not None and entry_tsft >= tsft_end:
+                        continue
+                if chan_freq is not None and \
+                        (not valid & HAS_CHANNEL or freq != chan_freq):
+                    continue
+                if station is not None and \
+                        not (valid & HAS_ADDR1 and addr1 == station) and \
+                        not (valid & HAS_ADDR2 and addr2 == station):
+                    continue
+                selected.append(i)
+        return selected
+
+    def packet(self, i):
+        """The packet of entry i as a memoryview into the capture."""
+        data, = struct.unpack_from('<Q', self.entries, i * _entry.size + 8)
+        length, = struct.unpack_from('<I', self.entries, i * _entry.size + 32)
+        return self._reader.buf[data:data + length]
+
+    def query(self, parse=True, **criteria):
+        """
+        Yield the records matching select(**criteria) as (timestamp,
+        radiotap, mac) tuples, or (timestamp, memoryview) if parse is
+        false.  Only the matching packets are read and parsed.
+        """
+        for i in self.select(**criteria):
+            tstamp = self._tstamp(i)
+            if tstamp != tstamp:
+                tstamp = None
+            pkt = self.packet(i)
+            if not parse:
+                yield tstamp, pkt
+                continue
+            off, radiotap = radiotap_parse(pkt)
+            off, mac = ieee80211_parse(pkt, off)
+            yield tstamp, radiotap, mac
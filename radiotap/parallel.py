@@ -0,0 +1,159 @@
+"""
+    parse large capture files on several cores
+
+    example:
+    >>> import radiotap.parallel as rp
+    >>> stats = {}
+    >>> for tstamp, radiotap, mac in rp.parse_file_parallel('foo.pcap',
+    ...                                                     workers=8,
+    ...                                                     stats=stats):
+    ...     pass
+    >>> stats['packets_per_sec']
+
+    The file is indexed once in the parent, cut into record-aligned byte
+    ranges and each range is parsed by a worker process that maps the
+    same file, so the input is shared through the page cache rather than
+    sent to the workers.  With executor='thread' the ranges are parsed by
+    threads sharing a single mapping instead.
+"""
+import collections
+import concurrent.futures
+import os
+import time
+
+from radiotap.pcap import PcapReader
+from radiotap.radiotap import radiotap_parse, ieee80211_parse
+
+CHUNK_RECORDS = 4096
+
+# per worker process
+_reader = None
+
+def _open_worker(path):
+    global _reader
+    _reader = PcapReader(path)
+
+def _detach_value(value):
+    if isinstance(value, memoryview):
+        return value.tobytes()
+    if isinstance(value, dict):
+        return _detach(value)
+    if isinstance(value, list):
+        # e.g. tlvs, a list of (type, memoryview)
+        return [_detach_value(v) for v in value]
+    if isinstance(value, tuple) and any(isinstance(v, memoryview)
+                                        for v in value):
+        return tuple(_detach_value(v) for v in value)
+    return value
+
+def _detach(fields):
+    """Replace memoryviews by bytes so that results can be pickled."""
+    if isinstance(fields, list):
+        return [_detach(f) for f in fields]
+    for k, v in fields.items():
+        if isinstance(v, (memoryview, dict, list)):
+            fields[k] = _detach_value(v)
+    return fields
+
+def _parse_records(reader, start, end, state, detach):
+    results = []
+    nbytes = 0
+    for tstamp, pkt in reader.records(start, end, state):
+        nbytes += len(pkt)
+        off, radiotap = radiotap_parse(pkt)
+        off, mac = ieee80211_parse(pkt, off)
+        if detach:
+            radiotap, mac = _detach(radiotap), _detach(mac)
+        results.append((tstamp, radiotap, mac))
+    return results, nbytes
+
+def _parse_range(start, end, state):
+    return _parse_records(_reader, start, end, state, True)
+
+def chunk_ranges(path, chunk_records=CHUNK_RECORDS):
+    """
+    Index the capture at path and return a list of (start, end, state)
+    byte ranges holding chunk_records records each, see
+    PcapReader.chunks(); end is None for the last.
+    """
+    with PcapReader(path) as reader:
+        return reader.chunks(chunk_records)
+
+def parse_file_parallel(path, workers=None, ordered=True,
+                        chunk_records=CHUNK_RECORDS, stats=None,
+                        executor='process'):
+    """
+    Parse every record of the capture at path with radiotap_parse() and
+    ieee80211_parse() in a pool of workers and yield (timestamp,
+    radiotap, mac) tuples.
+
+    executor is 'process' for worker processes, each mapping the file,
+    or 'thread' for threads of this process sharing one mapping.
+    Threads avoid pickling the results and starting processes, but only
+    run in parallel on a free-threaded interpreter; vendor data and TLVs
+    then stay memoryviews into the file rather than bytes.
+
+    If ordered is true, records come out in capture order; otherwise
+    each chunk is yielded as soon as it is done.  At most two chunks per
+    worker are in flight, which bounds memory use.  If stats is a dict
+    it is filled with packets, bytes, seconds and packets_per_sec once
+    the generator finishes.
+    """
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    packets = nbytes = 0
+    ranges = collections.deque(chunk_ranges(path, chunk_records))
+
+    reader = None
+    if executor == 'process':
+        pool = concurrent.futures.ProcessPoolExecutor(
+            workers, initializer=_open_worker, initargs=(path,))
+        task = _parse_range
+    elif executor == 'thread':
+        reader = PcapReader(path)
+        pool = concurrent.futures.ThreadPoolExecutor(workers)
+        task = lambda start, end, state: _parse_records(reader, start, end,
+                                                         state, False)
+    else:
+        raise ValueError('executor must be process or thread: %r' % executor)
+
+    pending = collections.deque()
+
+    def fill():
+        while ranges and len(pending) < 2 * workers:
+            pending.append(pool.submit(task, *ranges.popleft()))
+
+    try:
+        fill()
+        while pending:
+            if ordered:
+                future = pending.popleft()
+            else:
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                future = done.pop()
+                pending.remove(future)
+            results, chunk_bytes = future.result()
+            fill()
+
+            packets += len(results)
+            nbytes += chunk_bytes
+            for record in results:
+                yield record
+    finally:
+        for future in pending:
+            future.cancel()
+        pool.shutdown()
+        if reader is not None:
+            # only once no thread is using it
+            reader.close()
+        if stats is not None:
+            seconds = time.perf_counter() - started
+            stats.update({
+                'workers': workers,
+                'executor': executor,
+                'packets': packets,
+                'bytes': nbytes,
+                'seconds': seconds,
+                'packets_per_sec': packets / seconds if seconds else 0.,
+            })
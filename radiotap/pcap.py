@@ -0,0 +1,281 @@
+"""
+    memory-mapped pcap and pcapng reader
+
+    example:
+    >>> import radiotap.pcap as rp
+    >>> for tstamp, radiotap, mac in rp.read_pcap('foo.pcap', parse=True):
+    ...     print(tstamp, radiotap.get('dbm_antsignal'), mac.get('addr2'))
+
+    Records are returned as memoryviews into the mapped file, so reading
+    a capture of any size takes constant memory.  A view stays valid
+    while the reader is open; views still referenced after close() keep
+    the mapping alive until they are released.
+"""
+import mmap
+import struct
+
+from radiotap.filter import compile_filter
+from radiotap.radiotap import radiotap_parse, ieee80211_parse
+
+LINKTYPE_IEEE802_11_RADIOTAP = 127
+
+# classic pcap magic numbers, as read little-endian
+_PCAP_MAGIC = {
+    0xa1b2c3d4: ('<', 1e-6),
+    0xd4c3b2a1: ('>', 1e-6),
+    0xa1b23c4d: ('<', 1e-9),
+    0x4d3cb2a1: ('>', 1e-9),
+}
+
+_PCAPNG_SHB = 0x0a0d0d0a
+_PCAPNG_BYTE_ORDER_MAGIC = 0x1a2b3c4d
+_PCAPNG_IDB = 1
+_PCAPNG_PB = 2
+_PCAPNG_SPB = 3
+_PCAPNG_EPB = 6
+_PCAPNG_OPT_IF_TSRESOL = 9
+
+def _tsresol(value):
+    """Convert an if_tsresol option value to seconds per tick."""
+    if value & 0x80:
+        return 2. ** -(value & 0x7f)
+    return 10. ** -value
+
+class PcapReader(object):
+    """
+    Iterate over the radiotap records of a classic pcap or pcapng file
+    as (timestamp, memoryview) tuples.
+
+    Classic pcap files must use LINKTYPE_IEEE802_11_RADIOTAP; in pcapng
+    files, packets of interfaces with other link types are skipped.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty file
+            self._map = b''
+        self.buf = memoryview(self._map)
+
+        if len(self.buf) < 4:
+            self.close()
+            raise ValueError('%s: not a pcap or pcapng file' % path)
+
+        magic, = struct.unpack_from('<I', self.buf)
+        if magic == _PCAPNG_SHB:
+            self.format = 'pcapng'
+            self.data_offset = 0
+        elif magic in _PCAP_MAGIC:
+            self.format = 'pcap'
+            self._endian, self._tick = _PCAP_MAGIC[magic]
+            if len(self.buf) < 24:
+                self.close()
+                raise ValueError('%s: truncated pcap header' % path)
+            self.snaplen, self.linktype = \
+                struct.unpack_from(self._endian + 'II', self.buf, 16)
+            if self.linktype != LINKTYPE_IEEE802_11_RADIOTAP:
+                self.close()
+                raise ValueError('%s: link type %d is not radiotap' %
+                                 (path, self.linktype))
+            self.data_offset = 24
+        else:
+            self.close()
+            raise ValueError('%s: not a pcap or pcapng file' % path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        return self.records()
+
+    def close(self):
+        if self._file is None:
+            return
+        self.buf.release()
+        if not isinstance(self._map, bytes):
+            try:
+                self._map.close()
+            except BufferError:
+                # records still referenced by the caller
+                pass
+        self._file.close()
+        self._file = None
+
+    def records(self, start=None, end=None, state=None):
+        """
+        Yield (timestamp, memoryview) for every radiotap record whose
+        record header starts in the byte range [start, end).  start must
+        be a record boundary as returned by index() or chunks().
+
+        state is the reader state at start as returned by chunks(); a
+        pcapng file is otherwise scanned from its beginning to recover
+        the section and interface state in effect at start.
+        """
+        buf = self.buf
+        for offset, tstamp, data, data_end in self.locate(start, end, state):
+            yield tstamp, buf[data:data_end]
+
+    def locate(self, start=None, end=None, state=None):
+        """
+        Like records(), but yield (offset, timestamp, data, data_end):
+        the record offset and the byte range of its packet in the file.
+        """
+        if self.format == 'pcap':
+            return self._pcap_records(start, end)
+        return self._pcapng_records(start, end, state)
+
+    def index(self):
+        """Return the byte offsets of all radiotap records in the file."""
+        return [offset for offset, _, _, _ in self.locate()]
+
+    def chunks(self, chunk_records):
+        """
+        Cut the file into ranges of chunk_records radiotap records in a
+        single pass and return them as (start, end, state) tuples, end
+        being None for the last; each can be passed on to records().
+        """
+        if self.format == 'pcap':
+            walk = ((offset, None) for offset, _, _, _ in self._pcap_records(
+                None, None))
+        else:
+            walk = ((offset, state) for offset, _, state in
+                    self._pcapng_walk(None, None, None))
+        starts = [(offset, state) for i, (offset, state) in enumerate(walk)
+                  if i % chunk_records == 0]
+        ends = [offset for offset, _ in starts[1:]] + [None]
+        return [(start, end, state)
+                for (start, state), end in zip(starts, ends)]
+
+    def _pcap_records(self, start, end):
+        buf = self.buf
+        hdr = struct.Struct(self._endian + 'IIII')
+        tick = self._tick
+        offset = self.data_offset if start is None else start
+        end = len(buf) if end is None else min(end, len(buf))
+        while offset + hdr.size <= end:
+            ts_sec, ts_frac, incl_len, orig_len = hdr.unpack_from(buf, offset)
+            data = offset + hdr.size
+            if data + incl_len > len(buf):
+                # truncated last record
+                break
+            yield offset, ts_sec + ts_frac * tick, data, data + incl_len
+            offset = data + incl_len
+
+    def _pcapng_records(self, start, end, state):
+        for offset, record, _ in self._pcapng_walk(start, end, state):
+            yield (offset,) + record
+
+    def _pcapng_walk(self, start, end, state):
+        """
+        Yield (offset, (timestamp, data, data_end), state) per radiotap
+        record, state being (byte order, interfaces) of its section.
+        Without a state for start, the blocks before start are scanned
+        for it.
+        """
+        buf = self.buf
+        if state is not None and start is not None:
+            offset = start
+        else:
+            state = ('<', ())
+            offset = 0
+        endian, interfaces = state
+        end = len(buf) if end is None else min(end, len(buf))
+        while offset + 12 <= end:
+            block_type, block_len = struct.unpack_from(endian + 'II', buf, offset)
+            if block_type == _PCAPNG_SHB:
+                magic, = struct.unpack_from('<I', buf, offset + 8)
+                endian = '<' if magic == _PCAPNG_BYTE_ORDER_MAGIC else '>'
+                block_type, block_len = \
+                    struct.unpack_from(endian + 'II', buf, offset)
+                interfaces = ()
+                state = (endian, interfaces)
+            if block_len < 12 or offset + block_len > len(buf):
+                # truncated or corrupt last block
+                break
+
+            body = offset + 8
+            body_end = offset + block_len - 4
+            if block_type == _PCAPNG_IDB:
+                interfaces += (self._pcapng_interface(endian, body, body_end),)
+                state = (endian, interfaces)
+            elif start is not None and offset < start:
+                # only gathering section state up to start
+                pass
+            elif block_type in (_PCAPNG_EPB, _PCAPNG_PB, _PCAPNG_SPB):
+                record = self._pcapng_packet(endian, interfaces, block_type,
+                                             body, body_end)
+                if record is not None:
+                    yield offset, record, state
+            offset += block_len
+
+    def _pcapng_interface(self, endian, body, body_end):
+        buf = self.buf
+        linktype, _, snaplen = struct.unpack_from(endian + 'HHI', buf, body)
+        tick = 1e-6
+        offset = body + 8
+        while offset + 4 <= body_end:
+            code, length = struct.unpack_from(endian + 'HH', buf, offset)
+            if code == 0:
+                break
+            if code == _PCAPNG_OPT_IF_TSRESOL and length >= 1:
+                tick = _tsresol(buf[offset + 4])
+            offset += 4 + ((length + 3) & ~3)
+        return linktype, snaplen, tick
+
+    def _pcapng_packet(self, endian, interfaces, block_type, body, body_end):
+        buf = self.buf
+        if block_type == _PCAPNG_SPB:
+            if not interfaces:
+                return None
+            orig_len, = struct.unpack_from(endian + 'I', buf, body)
+            linktype, snaplen, tick = interfaces[0]
+            data = body + 4
+            incl_len = min(orig_len, body_end - data)
+            if snaplen:
+                incl_len = min(incl_len, snaplen)
+            tstamp = None
+        else:
+            if block_type == _PCAPNG_EPB:
+                if_id, ts_high, ts_low, incl_len, _ = \
+                    struct.unpack_from(endian + 'IIIII', buf, body)
+            else:
+                if_id, _, ts_high, ts_low, incl_len, _ = \
+                    struct.unpack_from(endian + 'HHIIII', buf, body)
+            if if_id >= len(interfaces):
+                return None
+            linktype, snaplen, tick = interfaces[if_id]
+            data = body + 20
+            incl_len = min(incl_len, body_end - data)
+            tstamp = ((ts_high << 32) | ts_low) * tick
+
+        if linktype != LINKTYPE_IEEE802_11_RADIOTAP:
+            return None
+        return tstamp, data, data + incl_len
+
+def read_pcap(path, parse=False, where=None):
+    """
+    Yield the radiotap records of the capture file at path as
+    (timestamp, memoryview) tuples, or as (timestamp, radiotap, mac)
+    tuples if parse is true.  where is an optional filter expression or
+    radiotap.filter.Filter; records that do not match it are skipped
+    before any parsing.
+    """
+    match = compile_filter(where).match if where is not None else None
+    with PcapReader(path) as reader:
+        for tstamp, pkt in reader:
+            if match is not None and not match(pkt):
+                continue
+            if not parse:
+                yield tstamp, pkt
+                continue
+
+            off, radiotap = radiotap_parse(pkt)
+            off, mac = ieee80211_parse(pkt, off)
+            yield tstamp, radiotap, mac
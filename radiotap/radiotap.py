@@ -2,14 +2,28 @@
 # parse radiotap fields from pcap buffers into a dictionary
 #
 # example:
-# >>> import radiotap as r, pcap
-# >>> pc = pcap.pcap(name='foo.pcap')
-# >>> tstamp, pkt = pc[0]
-# >>> off, radiotap = r.radiotap_parse(pkt)
-# >>> off, mac = r.ieee80211_parse(pkt, off)
+# >>> import radiotap as r, radiotap.pcap
+# >>> for tstamp, pkt in radiotap.pcap.read_pcap('foo.pcap'):
+# ...     off, radiotap = r.radiotap_parse(pkt)
+# ...     off, mac = r.ieee80211_parse(pkt, off)
+#
+# radiotap_parse(), radiotap_parse_checked() and ieee80211_parse() are
+# thread-safe: the rate and layout tables are never modified after import,
+# cached plans are immutable and found without locking, and plan cache
+# updates and instrumentation counters are locked, so threads may parse
+# packets of a shared buffer concurrently (see
+# radiotap.parallel with executor='thread').  A RadiotapHeader from
+# radiotap_parse_lazy() memoizes on access and belongs to one thread.
+import collections
+import functools
+import operator
+import re
 import struct
+import threading
+import time
 
 from radiotap.vht import *
+from radiotap.he import *
 
 
 mcs_rate_table = [
@@ -47,6 +61,17 @@ mcs_rate_table = [
     (260.00, 288.80, 540.00, 600.00),
 ]
 
+# mcs_rate_table flattened and padded to every u8 mcs index, indexed by
+# mcs index << 2 | 2 * is_40 + short_gi; None for undefined indices
+_mcs_rates = tuple(
+    mcs_rate_table[i][col] if i < len(mcs_rate_table) else None
+    for i in range(256) for col in range(4))
+
+# vht_bandwidth_lut bandwidths padded to every 5-bit bandwidth value
+_vht_bandwidths = tuple(
+    vht_bandwidth_lut[i][0] if i < len(vht_bandwidth_lut) else None
+    for i in range(32))
+
 def align(val, align):
     return (val + align - 1) & ~(align-1)
 
@@ -59,9 +84,12 @@ def _parse_flags(packet, offset):
     flags, = struct.unpack_from('<B', packet, offset)
     return offset + 1, {'flags' : flags}
 
+def _decode_rate(rate):
+    return {'rate' : rate / 2.}
+
 def _parse_rate(packet, offset):
     rate, = struct.unpack_from('<B', packet, offset)
-    return offset + 1, {'rate' : rate / 2.}
+    return offset + 1, _decode_rate(rate)
 
 def _parse_channel(packet, offset):
     offset = align(offset, 2)
@@ -118,8 +146,9 @@ def _parse_rx_flags(packet, offset):
     return offset + 2, {'rx_flags' : rx_flags}
 
 def _parse_tx_flags(packet, offset):
-    tx_flags, = struct.unpack_from('<B', packet, offset)
-    return offset + 1, {'tx_flags' : tx_flags}
+    offset = align(offset, 2)
+    tx_flags, = struct.unpack_from('<H', packet, offset)
+    return offset + 2, {'tx_flags' : tx_flags}
 
 def _parse_rts_retries(packet, offset):
     rts_retries, = struct.unpack_from('<B', packet, offset)
@@ -140,23 +169,27 @@ def _parse_xchannel(packet, offset):
         'xchannel_maxpower' : xchannel_maxpower
     }
 
-def _parse_mcs(packet, offset):
-    mcs_known, mcs_flags, mcs_index = \
-        struct.unpack_from('<BBB', packet, offset)
+def _decode_mcs(mcs_known, mcs_flags, mcs_index):
     is_40 = (mcs_flags & 0x3) == 1
     short_gi = (mcs_flags & 0x04) != 0
 
-    mcs_rate = mcs_rate_table[mcs_index][2 * is_40 + short_gi]
-    return offset + 3, {
+    mcs_rate = _mcs_rates[(mcs_index << 2) | (2 * is_40 + short_gi)]
+    return {
         'mcs_known': mcs_known,
         'mcs_flags': mcs_flags,
         'mcs_index': mcs_index,
         'mcs_rate': mcs_rate
     }
 
+def _parse_mcs(packet, offset):
+    mcs_known, mcs_flags, mcs_index = \
+        struct.unpack_from('<BBB', packet, offset)
+    return offset + 3, _decode_mcs(mcs_known, mcs_flags, mcs_index)
+
 def _parse_ampdu(packet, offset):
     """see http://www.radiotap.org/defined-fields/A-MPDU%20status
        u32 reference number, u16 flags, u8 delimiter CRC value, u8 reserved"""
+    offset = align(offset, 4)
     ampdu_refnum, ampdu_flags, ampdu_delim_crc_val, ampdu_reserved = \
         struct.unpack_from('<LHBB', packet, offset)
     return offset + 8, {
@@ -167,19 +200,15 @@ def _parse_ampdu(packet, offset):
     }
 
 
-def _parse_vht(packet, offset):
-    """ see http://www.radiotap.org/defined-fields/VHT
-        u16 known, u8 flags, u8 bandwidth, u8 mcs_nss[4], u8 coding, u8 group_id, u16 partial_aid """
-    vht_known, vht_flags, vht_bw, vht_user_0, vht_user_1, vht_user_2, vht_user_3, \
-        vht_coding, vht_group_id, vht_partial_aid = struct.unpack_from('<H8BH', packet, offset)
-
+def _decode_vht(vht_known, vht_flags, vht_bw, vht_user_0, vht_user_1, vht_user_2, vht_user_3,
+                vht_coding, vht_group_id, vht_partial_aid):
     vht_gi = vht_bandwidth = None
     if vht_known & 0x0004:
         # GI is known
         vht_gi = (vht_flags & 0x04) >> 0x02
     if vht_known & 0x0040:
         # BW is known
-        vht_bandwidth = vht_bandwidth_lut[0x1f & vht_bw][0]
+        vht_bandwidth = _vht_bandwidths[0x1f & vht_bw]
 
     # per-user info for MIMO-MU
     vht_per_user =  {}
@@ -192,7 +221,7 @@ def _parse_vht(packet, offset):
             if not(vht_gi is None) and not(vht_bandwidth is None):
                 vht_per_user[i].update(vht_rate_description(vht_mcs_index_n,vht_nss_n,vht_gi,vht_bandwidth))
 
-    return offset + 12, {
+    return {
         'vht_known': vht_known,
         'vht_flags': vht_flags,
         'vht_bw': vht_bw,
@@ -203,6 +232,171 @@ def _parse_vht(packet, offset):
         'vht_user': vht_per_user,
     }
 
+def _parse_vht(packet, offset):
+    """ see http://www.radiotap.org/defined-fields/VHT
+        u16 known, u8 flags, u8 bandwidth, u8 mcs_nss[4], u8 coding, u8 group_id, u16 partial_aid """
+    offset = align(offset, 2)
+    return offset + 12, _decode_vht(*struct.unpack_from('<H8BH', packet, offset))
+
+def _parse_timestamp(packet, offset):
+    """ see http://www.radiotap.org/fields/timestamp
+        u64 timestamp, u16 accuracy, u8 unit/position, u8 flags """
+    offset = align(offset, 8)
+    timestamp, accuracy, unit_position, flags = \
+        struct.unpack_from('<QHBB', packet, offset)
+    return offset + 12, {
+        'timestamp': timestamp,
+        'timestamp_accuracy': accuracy,
+        'timestamp_unit_position': unit_position,
+        'timestamp_flags': flags,
+    }
+
+def _decode_he(he_data1, he_data2, he_data3, he_data4, he_data5, he_data6):
+    he_mcs = he_gi = he_bw_ru = he_rate_mbps = None
+    if he_data1 & 0x0020:
+        # data MCS is known
+        he_mcs = (he_data3 >> 8) & 0xf
+    if he_data2 & 0x0002:
+        # GI is known
+        he_gi = (he_data5 >> 4) & 0x3
+    if he_data1 & 0x4000:
+        # data bandwidth/RU allocation is known
+        he_bw_ru = he_data5 & 0xf
+
+    # NSTS has no known bit; 0 means unknown
+    he_nss = he_data6 & 0xf or None
+    if he_nss and he_data1 & 0x0200 and he_data3 & 0x8000:
+        # STBC doubles the space-time streams
+        he_nss = he_nss // 2 or None
+
+    if None not in (he_mcs, he_nss, he_gi, he_bw_ru):
+        he_rate_mbps = he_rate(he_mcs, he_nss, he_gi, he_bw_ru)
+        if he_rate_mbps is not None and he_data1 & 0x0040 and \
+                he_data3 & 0x1000:
+            # dual carrier modulation halves the rate
+            he_rate_mbps = round(he_rate_mbps / 2., 1)
+
+    return {
+        'he_data1': he_data1,
+        'he_data2': he_data2,
+        'he_data3': he_data3,
+        'he_data4': he_data4,
+        'he_data5': he_data5,
+        'he_data6': he_data6,
+        'he_ppdu_format': he_data1 & 0x3,
+        'he_mcs': he_mcs,
+        'he_nss': he_nss,
+        'he_gi': he_gi,
+        'he_bandwidth': he_bandwidth_mhz[he_bw_ru]
+            if he_bw_ru is not None and he_bw_ru < 4 else None,
+        'he_rate_mbps': he_rate_mbps,
+    }
+
+def _parse_he(packet, offset):
+    """ see http://www.radiotap.org/fields/HE
+        u16 data1, data2, data3, data4, data5, data6 """
+    offset = align(offset, 2)
+    return offset + 12, _decode_he(*struct.unpack_from('<6H', packet, offset))
+
+def _decode_he_mu(he_mu_flags1, he_mu_flags2, *ru_channels):
+    return {
+        'he_mu_flags1': he_mu_flags1,
+        'he_mu_flags2': he_mu_flags2,
+        'he_mu_ru_channel1': ru_channels[:4],
+        'he_mu_ru_channel2': ru_channels[4:],
+    }
+
+def _parse_he_mu(packet, offset):
+    """ see http://www.radiotap.org/fields/HE-MU
+        u16 flags1, u16 flags2, u8 RU_channel1[4], u8 RU_channel2[4] """
+    offset = align(offset, 2)
+    return offset + 12, _decode_he_mu(*struct.unpack_from('<HH8B', packet, offset))
+
+def _parse_he_mu_other_user(packet, offset):
+    """ see http://www.radiotap.org/fields/HE-MU-other-user
+        u16 per_user_1, per_user_2, u8 per_user_position, per_user_known """
+    offset = align(offset, 2)
+    per_user_1, per_user_2, position, known = \
+        struct.unpack_from('<HHBB', packet, offset)
+    return offset + 6, {
+        'he_mu_per_user_1': per_user_1,
+        'he_mu_per_user_2': per_user_2,
+        'he_mu_per_user_position': position,
+        'he_mu_per_user_known': known,
+    }
+
+def _parse_zero_length_psdu(packet, offset):
+    zero_length_psdu, = struct.unpack_from('<B', packet, offset)
+    return offset + 1, {'zero_length_psdu' : zero_length_psdu}
+
+def _parse_lsig(packet, offset):
+    offset = align(offset, 2)
+    lsig_data1, lsig_data2 = struct.unpack_from('<HH', packet, offset)
+    return offset + 4, {'lsig_data1' : lsig_data1, 'lsig_data2' : lsig_data2}
+
+TLV_USIG = 33
+TLV_EHT = 34
+
+def _decode_eht(fields):
+    """derive EHT rate information from decoded U-SIG and EHT TLVs"""
+    eht_gi = eht_bandwidth = eht_mcs = eht_nss = bw = None
+    if fields.get('eht_known', 0) & 0x0004:
+        eht_gi = (fields['eht_data'][0] >> 7) & 0x3
+    if fields.get('usig_common', 0) & 0x0002:
+        bw = (fields['usig_common'] >> 15) & 0x7
+        if bw < len(eht_bandwidth_mhz):
+            eht_bandwidth = eht_bandwidth_mhz[bw]
+    for user_info in fields.get('eht_user_info', ()):
+        if user_info & 0x0002:
+            eht_mcs = (user_info >> 20) & 0xf
+            if user_info & 0x0010:
+                eht_nss = (user_info >> 24) & 0xf or None
+            break
+
+    eht_rate_mbps = None
+    if None not in (eht_gi, eht_bandwidth, eht_mcs, eht_nss):
+        eht_rate_mbps = eht_rate(eht_mcs, eht_nss, eht_gi, bw)
+
+    fields.update({
+        'eht_gi': eht_gi,
+        'eht_bandwidth': eht_bandwidth,
+        'eht_mcs': eht_mcs,
+        'eht_nss': eht_nss,
+        'eht_rate_mbps': eht_rate_mbps,
+    })
+
+def _parse_tlvs(packet, offset):
+    """ see http://www.radiotap.org/fields/TLV
+        u16 type, u16 length, u8 data[length], padded to 4 bytes; the
+        list runs to the end of the radiotap header.  U-SIG and EHT are
+        decoded, other TLVs are returned as (type, data) in 'tlvs'. """
+    radiotap_len, = struct.unpack_from('<H', packet, 2)
+    offset = align(offset, 4)
+    fields = {}
+    tlvs = []
+    while offset + 4 <= radiotap_len:
+        tlv_type, length = struct.unpack_from('<HH', packet, offset)
+        data = offset + 4
+        if data + length > radiotap_len:
+            break
+        if tlv_type == TLV_USIG and length >= 12:
+            fields['usig_common'], fields['usig_value'], fields['usig_mask'] = \
+                struct.unpack_from('<III', packet, data)
+        elif tlv_type == TLV_EHT and length >= 40:
+            values = struct.unpack_from('<%dI' % (length // 4), packet, data)
+            fields['eht_known'] = values[0]
+            fields['eht_data'] = values[1:10]
+            fields['eht_user_info'] = values[10:]
+        else:
+            tlvs.append((tlv_type, memoryview(packet)[data:data + length]))
+        offset = data + align(length, 4)
+
+    if 'eht_known' in fields or 'usig_common' in fields:
+        _decode_eht(fields)
+    if tlvs:
+        fields['tlvs'] = tlvs
+    return radiotap_len, fields
+
 def _parse_vendor(packet, offset):
     offset = align(offset, 2)
     oui, subns, length = struct.unpack_from("<3sBH", packet, offset)
@@ -210,70 +404,147 @@ def _parse_vendor(packet, offset):
     return offset + length, {
         'oui': oui,
         'subns': subns,
-        'data': packet[offset:offset + length],
+        'data': memoryview(packet)[offset:offset + length],
         'present': 0
     }
 
+_dispatch_table = [
+    _parse_mactime,
+    _parse_flags,
+    _parse_rate,
+    _parse_channel,
+    _parse_fhss,
+    _parse_dbm_antsignal,
+    _parse_dbm_antnoise,
+    _parse_lock_quality,
+    _parse_tx_attenuation,
+    _parse_db_tx_attenuation,
+    _parse_dbm_tx_power,
+    _parse_antenna,
+    _parse_db_antsignal,
+    _parse_db_antnoise,
+    _parse_rx_flags,
+    _parse_tx_flags,
+    _parse_rts_retries,
+    _parse_data_retries,
+    _parse_xchannel,
+    _parse_mcs,
+    _parse_ampdu,
+    _parse_vht,
+    _parse_timestamp,
+    _parse_he,
+    _parse_he_mu,
+    _parse_he_mu_other_user,
+    _parse_zero_length_psdu,
+    _parse_lsig,
+    _parse_tlvs,
+]
+
+# field id of the TLV list, which has no fixed layout and ends the header
+_TLV_FIELD = 28
+
+# static layout of every radiotap namespace field, indexed like
+# _dispatch_table: (alignment, struct format, output names, decoder).
+# fields without a decoder map their unpacked values onto the names
+# one to one.
+_field_layouts = [
+    (8, 'Q', ('TSFT',), None),
+    (1, 'B', ('flags',), None),
+    (1, 'B', ('rate',), _decode_rate),
+    (2, 'HH', ('chan_freq', 'chan_flags'), None),
+    (1, 'H', ('fhss',), None),
+    (1, 'b', ('dbm_antsignal',), None),
+    (1, 'b', ('dbm_antnoise',), None),
+    (2, 'H', ('lock_quality',), None),
+    (2, 'H', ('tx_attenuation',), None),
+    (2, 'H', ('db_tx_attenuation',), None),
+    (1, 'b', ('dbm_tx_power',), None),
+    (1, 'B', ('antenna',), None),
+    (1, 'B', ('db_antsignal',), None),
+    (1, 'B', ('db_antnoise',), None),
+    (2, 'H', ('rx_flags',), None),
+    (2, 'H', ('tx_flags',), None),
+    (1, 'B', ('rts_retries',), None),
+    (1, 'B', ('data_retries',), None),
+    (4, 'IHBB', ('xchannel_flags', 'xchannel_freq', 'xchannel_num',
+                 'xchannel_maxpower'), None),
+    (1, 'BBB', ('mcs_known', 'mcs_flags', 'mcs_index', 'mcs_rate'),
+     _decode_mcs),
+    (4, 'LHBB', ('ampdu_refnum', 'ampdu_flags', 'ampdu_delim_crc_val',
+                 'ampdu_reserved'), None),
+    (2, 'H8BH', ('vht_known', 'vht_flags', 'vht_bw', 'vht_coding',
+                 'vht_group_id', 'vht_gi', 'vht_bandwidth', 'vht_user'),
+     _decode_vht),
+    (8, 'QHBB', ('timestamp', 'timestamp_accuracy', 'timestamp_unit_position',
+                 'timestamp_flags'), None),
+    (2, '6H', ('he_data1', 'he_data2', 'he_data3', 'he_data4', 'he_data5',
+               'he_data6', 'he_ppdu_format', 'he_mcs', 'he_nss', 'he_gi',
+               'he_bandwidth', 'he_rate_mbps'), _decode_he),
+    (2, 'HH8B', ('he_mu_flags1', 'he_mu_flags2', 'he_mu_ru_channel1',
+                 'he_mu_ru_channel2'), _decode_he_mu),
+    (2, 'HHBB', ('he_mu_per_user_1', 'he_mu_per_user_2',
+                 'he_mu_per_user_position', 'he_mu_per_user_known'), None),
+    (1, 'B', ('zero_length_psdu',), None),
+    (2, 'HH', ('lsig_data1', 'lsig_data2'), None),
+]
+
+_tlv_names = ('usig_common', 'usig_value', 'usig_mask', 'eht_known',
+              'eht_data', 'eht_user_info', 'eht_gi', 'eht_bandwidth',
+              'eht_mcs', 'eht_nss', 'eht_rate_mbps', 'tlvs')
+
+_field_structs = [struct.Struct('<' + fmt) for _, fmt, _, _ in _field_layouts]
+
+# output name -> radiotap field id
+_field_ids = dict((name, i)
+                  for i, layout in enumerate(_field_layouts)
+                  for name in layout[2])
+_field_ids.update((name, _TLV_FIELD) for name in _tlv_names)
+
 def _parse_radiotap_field(namespace, field_id, packet, offset):
 
     if namespace and namespace != 'radiotap':
         # skipped already
         return offset, None
 
-    dispatch_table = [
-        _parse_mactime,
-        _parse_flags,
-        _parse_rate,
-        _parse_channel,
-        _parse_fhss,
-        _parse_dbm_antsignal,
-        _parse_dbm_antnoise,
-        _parse_lock_quality,
-        _parse_tx_attenuation,
-        _parse_db_tx_attenuation,
-        _parse_dbm_tx_power,
-        _parse_antenna,
-        _parse_db_antsignal,
-        _parse_db_antnoise,
-        _parse_rx_flags,
-        _parse_tx_flags,
-        _parse_rts_retries,
-        _parse_data_retries,
-        _parse_xchannel,
-        _parse_mcs,
-        _parse_ampdu,
-        _parse_vht,
-    ]
-    if field_id >= len(dispatch_table):
+    if field_id >= len(_dispatch_table):
         return None, {}
 
-    return dispatch_table[field_id](packet, offset)
+    return _dispatch_table[field_id](packet, offset)
 
-def _present_bits(bitmap):
-    offset = 0
+def _present_bits(bitmap, offset=0, end=None):
+    """
+    Yield (namespace, field id) for the presence bitmap words found in
+    bitmap[offset:end], and (namespace, None) on namespace switches.
+    Works on offsets so that bitmap may be the whole packet.
+    """
+    if end is None:
+        end = len(bitmap)
     count = 0
     reset_count = False
     namespace = 'radiotap'
-    while offset < len(bitmap):
-        present, = struct.unpack_from("<I", bitmap[offset:])
-        for i in range(0, 32):
+    while offset < end:
+        present, = struct.unpack_from("<I", bitmap, offset)
+        while present:
+            # visit set bits only, lowest first
+            bit = present & -present
+            present ^= bit
+            i = bit.bit_length() - 1
             # reserved bits:
             #  29 = radiotap namespace
             #  30 = vendor namespace
             #  31 = extended bitmap
-            if present & (1 << i):
-                if i == 29:
-                    namespace = 'radiotap'
-                    reset_count = True
-                    yield namespace, None
-                elif i == 30:
-                    namespace = 'vendor'
-                    reset_count = True
-                    yield namespace, None
-                elif i == 31:
-                    pass
-                else:
-                    yield namespace, count + i
+            if i == 29:
+                namespace = 'radiotap'
+                reset_count = True
+                yield namespace, None
+            elif i == 30:
+                namespace = 'vendor'
+                reset_count = True
+                yield namespace, None
+            elif i == 31:
+                pass
+            else:
+                yield namespace, count + i
         if reset_count:
             count = 0
             reset_count = False
@@ -287,8 +558,11 @@ def _add_fields(d, namespace, fields):
 
     if isinstance(d, list):
         d.append(fields)
-    else:
+    elif namespace == 'radiotap':
         d.update(fields)
+    else:
+        # vendor namespaces are keyed by OUI
+        d[namespace] = fields
 
 def _add_vendor_presence_bit(d, oui, bit):
 
@@ -298,153 +572,1106 @@ def _add_vendor_presence_bit(d, oui, bit):
         tgt = d[oui]
     tgt['present'] |= 1 << bit
 
-def radiotap_parse(packet, valuelist=False):
+class _ParsePlan(object):
     """
-    Parse out a the radiotap header from a packet.  Return a tuple
-    (offset, fields) where offset is the new offset and values
-    is a dictionary of field name to value.
+    Precompiled layout of the fields announced by one sequence of
+    presence bitmaps: a single struct covering every field (alignment
+    padding included) and, per field, where its values land in the
+    unpacked tuple.  names maps each output name to its field.  tlvs is
+    the offset of the trailing TLV list, or None if there is none, and
+    unknown the unknown field id that ended the plan, if any.
+
+    Radiotap fields without a decoder are output in one go: plain_names
+    lists their names in order and plain_values picks their values out
+    of the unpacked tuple.  decoded holds (decode, start, stop) for the
+    others.
+    """
+    __slots__ = ('struct', 'fields', 'start', 'end', 'names', 'tlvs',
+                 'unknown', 'plain_names', 'plain_values', 'decoded')
+
+    def __init__(self, struct, fields, start, end, tlvs=None, unknown=None):
+        self.struct = struct
+        self.unknown = unknown
+        self.fields = fields
+        self.start = start
+        self.end = end
+        self.tlvs = tlvs
+        self.names = dict((name, field)
+                          for field in fields for name in field[2])
+        if tlvs is not None:
+            tlv_field = (_TLV_FIELD, tlvs, _tlv_names, None, 0, 0)
+            self.names.update((name, tlv_field) for name in _tlv_names)
+
+        plain = [(name, i) for _, _, names, decode, start, stop in fields
+                 if decode is None
+                 for name, i in zip(names, range(start, stop))]
+        self.plain_names = tuple(name for name, _ in plain)
+        self.plain_values = _value_getter([i for _, i in plain])
+        self.decoded = tuple((decode, start, stop)
+                             for _, _, _, decode, start, stop in fields
+                             if decode is not None)
+
+def _value_getter(index):
+    """A function picking the values at index out of a tuple."""
+    if index == list(range(len(index))):
+        # a prefix: zip() stops at the last name anyway
+        return None
+    if len(index) == 1:
+        i, = index
+        return lambda values: (values[i],)
+    return operator.itemgetter(*index)
+
+def _compile_plan(bitmap):
+    """
+    Compile the presence bitmap words in bitmap into a _ParsePlan.
+    bitmap is either the raw bytes of the words or, for the common
+    single word case, its integer value.  Returns None when the layout
+    depends on the packet contents, i.e. when a vendor namespace is
+    present.
+    """
+    if isinstance(bitmap, int):
+        bitmap = struct.pack('<I', bitmap)
+    start = offset = 4 + len(bitmap)
+    fmt = ['<']
+    fields = []
+    nvalues = 0
+    tlvs = unknown = None
+    for namespace, i in _present_bits(bitmap):
+        if namespace != 'radiotap':
+            return None
+        if i is None:
+            continue
+        if i == _TLV_FIELD:
+            tlvs = offset
+            break
+        if i >= len(_field_layouts):
+            unknown = i
+            break
 
-    If valuelist is true, every field is returned in file order as a list
-    of items rather than as a single dictionary.  This allows retrieving
-    items that are specified more than once via the namespacing feature.
+        alignment, field_fmt, names, decode = _field_layouts[i]
+        field_offset = align(offset, alignment)
+        if field_offset != offset:
+            fmt.append('%dx' % (field_offset - offset))
+        fmt.append(field_fmt)
+        size = _field_structs[i].size
+        count = len(_field_structs[i].unpack(bytes(size)))
+        fields.append((i, field_offset, names, decode,
+                       nvalues, nvalues + count))
+        nvalues += count
+        offset = field_offset + size
+
+    return _ParsePlan(struct.Struct(''.join(fmt)), tuple(fields), start,
+                      offset, tlvs, unknown)
+
+PLAN_CACHE_SIZE = 256
+
+_missing = object()
+
+PlanCacheInfo = collections.namedtuple(
+    'PlanCacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+class _PlanCache(object):
+    """
+    Bounded mapping of presence bitmap keys to parse plans, safe to
+    share between threads.  Plans are immutable, so a hit is a plain
+    dict lookup without locking and hits are counted per thread; only a
+    miss takes the lock, to store the plan it compiled outside the lock
+    (when two threads miss on the same key, the first plan stored wins).
+    A plan whose compilation overlapped a clear() is returned but not
+    stored, as it may have been built from the tables clear() follows.
+    A full cache evicts the plan stored the longest ago, a cheap
+    approximation of LRU for the few layouts a capture cycles through.
+    """
+
+    def __init__(self, maxsize, compile=_compile_plan):
+        self.maxsize = maxsize
+        self.compile = compile
+        self.misses = 0
+        self._plans = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._hit_counters = []
+
+    def _hit_counter(self):
+        try:
+            return self._local.hits
+        except AttributeError:
+            counter = self._local.hits = [0]
+            with self._lock:
+                self._hit_counters.append(counter)
+            return counter
+
+    @property
+    def hits(self):
+        return sum(counter[0] for counter in self._hit_counters)
+
+    def lookup(self, key):
+        plan = self._plans.get(key, _missing)
+        if plan is not _missing:
+            self._hit_counter()[0] += 1
+            return plan
+
+        generation = self._generation
+        plan = self.compile(key)
+        with self._lock:
+            self.misses += 1
+            if generation != self._generation:
+                return plan
+            plans = self._plans
+            if key in plans:
+                return plans[key]
+            if len(plans) >= self.maxsize:
+                del plans[next(iter(plans))]
+            plans[key] = plan
+        return plan
+
+    def clear(self):
+        with self._lock:
+            self._plans = {}
+            self._generation += 1
+            self.misses = 0
+            for counter in self._hit_counters:
+                counter[0] = 0
+
+    def __len__(self):
+        return len(self._plans)
+
+_plan_cache = _PlanCache(PLAN_CACHE_SIZE)
+
+def plan_cache_info():
+    """
+    Report statistics of the parse plan cache as a named tuple
+    (hits, misses, maxsize, currsize), like functools.lru_cache does.
+    """
+    return PlanCacheInfo(_plan_cache.hits, _plan_cache.misses,
+                         _plan_cache.maxsize, len(_plan_cache))
+
+def plan_cache_clear():
+    """Drop all cached parse plans and reset the statistics."""
+    _plan_cache.clear()
+
+# vendor namespace decoders, see register_vendor_namespace()
+_vendor_layouts = {}
+_vendor_lock = threading.Lock()
+
+# names every vendor namespace dict already carries
+_vendor_reserved = frozenset(('oui', 'subns', 'data', 'present'))
+
+def _oui_bytes(oui):
+    if isinstance(oui, str):
+        oui = bytes.fromhex(oui.replace(':', '').replace('-', ''))
+    oui = bytes(oui)
+    if len(oui) != 3:
+        raise ValueError('an OUI is 3 bytes: %r' % (oui,))
+    return oui
+
+def _vendor_field(entry):
+    """Check one vendor field description, return (alignment, fmt, names)."""
+    if len(entry) == 3:
+        names, fmt, alignment = entry
+    else:
+        names, fmt = entry
+        alignment = None
+    size = struct.calcsize('<' + fmt)
+    count = len(struct.unpack('<' + fmt, bytes(size)))
+    if isinstance(names, str):
+        names = (names,)
+    else:
+        names = tuple(names)
+        if len(names) != count:
+            raise ValueError('%d names for the %d values of %r' %
+                             (len(names), count, fmt))
+    for name in names:
+        if name in _vendor_reserved:
+            raise ValueError('vendor field name %r is reserved' % name)
+    if alignment is None:
+        # natural alignment: the size of the largest value
+        alignment = max([struct.calcsize('<' + code)
+                         for code in re.sub(r'[\d\s]', '', fmt)
+                         if code not in 'spx'] or [1])
+    return alignment, fmt, names
+
+def register_vendor_namespace(oui, subns, fields):
+    """
+    Decode the vendor namespace (oui, subns) while parsing.  fields
+    describes its fields by presence bit: each entry is None for an
+    unused bit or (name, fmt), with fmt a little-endian struct format
+    such as 'h' or '4b' and name a single name (holding a tuple when fmt
+    has several values) or one name per value.  A third item overrides
+    the alignment, which otherwise follows the radiotap rule of aligning
+    a field to the size of its largest value.
+
+    The decoded values are added to the namespace dict next to oui,
+    subns, present and data; decoding stops at a presence bit missing
+    from fields and is skipped when the fields do not fit the data.
+    """
+    layout = tuple(None if entry is None else _vendor_field(entry)
+                   for entry in fields)
+    key = (_oui_bytes(oui), subns)
+    with _vendor_lock:
+        _vendor_layouts[key] = layout
+        _vendor_plans.clear()
+
+def unregister_vendor_namespace(oui, subns):
+    """Stop decoding the vendor namespace (oui, subns)."""
+    key = (_oui_bytes(oui), subns)
+    with _vendor_lock:
+        _vendor_layouts.pop(key, None)
+        _vendor_plans.clear()
+
+def _compile_vendor_plan(key):
+    """
+    Compile the fields present in one vendor namespace into a _ParsePlan
+    reading from the start of its data.  key is (oui, subns, present,
+    the header offset of the data modulo 8), the latter being all the
+    alignment depends on.  Returns None if nothing can be decoded.
+    """
+    oui, subns, present, base = key
+    layout = _vendor_layouts.get((oui, subns))
+    if layout is None:
+        return None
+    offset = base
+    fmt = ['<']
+    fields = []
+    nvalues = 0
+    while present:
+        bit = present & -present
+        present ^= bit
+        i = bit.bit_length() - 1
+        if i >= len(layout) or layout[i] is None:
+            break
+        alignment, field_fmt, names = layout[i]
+        field_offset = align(offset, alignment)
+        if field_offset != offset:
+            fmt.append('%dx' % (field_offset - offset))
+        fmt.append(field_fmt)
+        field_struct = struct.Struct('<' + field_fmt)
+        count = len(field_struct.unpack(bytes(field_struct.size)))
+        fields.append((i, field_offset - base, names, None,
+                       nvalues, nvalues + count))
+        nvalues += count
+        offset = field_offset + field_struct.size
+    if not fields:
+        return None
+    return _ParsePlan(struct.Struct(''.join(fmt)), tuple(fields), 0,
+                      offset - base)
+
+_vendor_plans = _PlanCache(PLAN_CACHE_SIZE, _compile_vendor_plan)
+
+def _decode_vendor(fields, data_offset):
+    """
+    Add the values of a registered vendor namespace to its dict; the
+    data starts at data_offset in the header.
+    """
+    plan = _vendor_plans.lookup((fields['oui'], fields['subns'],
+                                 fields['present'], data_offset & 7))
+    if plan is None or plan.end > len(fields['data']):
+        return
+    values = plan.struct.unpack_from(fields['data'])
+    for _, _, names, _, start, stop in plan.fields:
+        if len(names) == 1:
+            fields[names[0]] = values[start] if stop - start == 1 \
+                else values[start:stop]
+        else:
+            fields.update(zip(names, values[start:stop]))
+
+class FieldProjection(object):
+    """
+    Precompiled selection of radiotap fields, see compile_fields().
+    """
+
+    def __init__(self, fields):
+        self.fields = frozenset(fields)
+        self.vendor = frozenset(f for f in self.fields if isinstance(f, bytes))
+        unknown = self.fields - self.vendor - set(_field_ids)
+        if unknown:
+            raise ValueError('unknown radiotap fields: %s' %
+                             ', '.join(sorted(unknown)))
+        self.field_ids = frozenset(_field_ids[f] for f in self.fields
+                                   if f not in self.vendor)
+        self._plans = _PlanCache(PLAN_CACHE_SIZE, self._project)
+
+    def _project(self, key):
+        """
+        Cut the full plan for key down to the selected fields; the
+        struct stops after the last of them.  end stays that of the
+        full plan so truncated headers are recognized the same way.
+        """
+        plan = _plan_cache.lookup(key)
+        if plan is None:
+            return None
+
+        fmt = ['<']
+        fields = []
+        offset = plan.start
+        nvalues = 0
+        for field in plan.fields:
+            field_id, field_offset, names, decode, start, stop = field
+            if field_id not in self.field_ids:
+                continue
+            if field_offset != offset:
+                fmt.append('%dx' % (field_offset - offset))
+            fmt.append(_field_layouts[field_id][1])
+            count = stop - start
+            fields.append((field_id, field_offset, names, decode,
+                           nvalues, nvalues + count))
+            nvalues += count
+            offset = field_offset + _field_structs[field_id].size
+
+        tlvs = plan.tlvs if _TLV_FIELD in self.field_ids else None
+        return _ParsePlan(struct.Struct(''.join(fmt)), tuple(fields),
+                          plan.start, plan.end, tlvs)
+
+@functools.lru_cache(maxsize=64)
+def _compile_fields(fields):
+    return FieldProjection(fields)
+
+def compile_fields(fields):
+    """
+    Compile an iterable of field names into a FieldProjection for the
+    fields argument of radiotap_parse().  Names are those radiotap_parse()
+    returns; vendor namespaces are selected by their OUI (bytes).
+    """
+    if isinstance(fields, FieldProjection):
+        return fields
+    return _compile_fields(tuple(sorted(fields, key=repr)))
+
+def _decode_plan(plan, packet, radiotap):
+    values = plan.struct.unpack_from(packet, plan.start)
+    if isinstance(radiotap, dict):
+        plain = values if plan.plain_values is None \
+            else plan.plain_values(values)
+        radiotap.update(zip(plan.plain_names, plain))
+        for decode, start, stop in plan.decoded:
+            radiotap.update(decode(*values[start:stop]))
+        if plan.tlvs is not None:
+            radiotap.update(_parse_tlvs(packet, plan.tlvs)[1])
+        return
+    for _, _, names, decode, start, stop in plan.fields:
+        if decode is None:
+            fields = dict(zip(names, values[start:stop]))
+        else:
+            fields = decode(*values[start:stop])
+        _add_fields(radiotap, 'radiotap', fields)
+    if plan.tlvs is not None:
+        _add_fields(radiotap, 'radiotap', _parse_tlvs(packet, plan.tlvs)[1])
+
+def _parse_header(packet):
+    """
+    Check the fixed part of the radiotap header and find the end of the
+    presence bitmaps.  Return a tuple (radiotap_len, offset, key), with
+    a radiotap_len of 0 if packet does not start with a usable header.
+    key identifies the presence bitmaps in the plan cache: the first
+    word itself if there is only one, else the raw bytes of all words.
     """
     radiotap_header_fmt = '<BBHI'
     radiotap_header_len = struct.calcsize(radiotap_header_fmt)
 
     if len(packet) < radiotap_header_len:
-        return 0, {}
+        return 0, 0, None
 
     header = struct.unpack_from(radiotap_header_fmt, packet)
 
     version, pad, radiotap_len, present = header
     if version != 0 or pad != 0 or radiotap_len > len(packet):
-        return 0, {}
+        return 0, 0, None
+
+    if not present & (1 << 31):
+        return radiotap_len, radiotap_header_len, present
 
     # skip to end of presence bitmaps
     offset = radiotap_header_len
-    present_offset = offset - 4
     while present & (1 << 31):
-        present, = struct.unpack_from("<I", packet[offset:])
+        present, = struct.unpack_from("<I", packet, offset)
         offset += 4
 
+    return radiotap_len, offset, bytes(packet[4:offset])
+
+def _lookup_plan(packet):
+    """
+    Return a tuple (radiotap_len, plan) for the header at the start of
+    packet.  plan is None when the header cannot be decoded from a
+    cached plan (vendor namespaces, or fields past radiotap_len), and
+    radiotap_len is 0 for an unusable header.
+    """
+    radiotap_len, offset, key = _parse_header(packet)
+    if not radiotap_len:
+        return 0, None
+
+    plan = _plan_cache.lookup(key)
+    if plan is not None and plan.end > radiotap_len:
+        plan = None
+    return radiotap_len, plan
+
+def radiotap_parse(packet, valuelist=False, fields=None):
+    """
+    Parse out a the radiotap header from a packet.  Return a tuple
+    (offset, fields) where offset is the new offset and values
+    is a dictionary of field name to value.
+
+    If valuelist is true, every field is returned in file order as a list
+    of items rather than as a single dictionary.  This allows retrieving
+    items that are specified more than once via the namespacing feature.
+
+    If fields is given (an iterable of names or a FieldProjection from
+    compile_fields()), only the radiotap fields carrying one of those
+    names are decoded, along with the vendor namespaces whose OUI is
+    listed.  A field is returned with all of its names, e.g. asking for
+    chan_freq also yields chan_flags.  Without vendor namespaces in the
+    selection, parsing stops once every selected field has been seen.
+
+    The field layout implied by each distinct set of presence bitmaps is
+    compiled once and kept in a bounded cache (see plan_cache_info()), so
+    that headers without vendor namespaces decode with a single unpack.
+
+    packet may be any bytes-like object (bytes, bytearray, memoryview);
+    it is read in place and vendor namespace data is returned as
+    memoryviews into it.
+    """
+    radiotap_len, offset, key = _parse_header(packet)
+    if not radiotap_len:
+        if _instrumentation is not None:
+            _instrumentation.header_error(packet)
+        return 0, {}
+
     radiotap = [] if valuelist else {}
 
+    if fields is None:
+        projection = None
+        plan = _plan_cache.lookup(key)
+    else:
+        projection = compile_fields(fields)
+        plan = projection._plans.lookup(key)
+    inst = _instrumentation
+    if inst is None:
+        if plan is not None and plan.end <= radiotap_len:
+            _decode_plan(plan, packet, radiotap)
+        else:
+            _parse_fields(packet, offset, radiotap_len, radiotap, projection,
+                          _parse_radiotap_field)
+    else:
+        inst.parse(packet, offset, radiotap_len, radiotap, projection, plan)
+    return radiotap_len, radiotap
+
+def _parse_fields(packet, offset, radiotap_len, radiotap, projection,
+                  parse_field):
+    """
+    Decode the fields of the header one by one through parse_field
+    (normally _parse_radiotap_field), following the presence bitmaps
+    that end at offset.  Returns a PARSE_* status; decoding stops at an
+    unknown field or a vendor namespace running past radiotap_len.
+    """
+    if projection is not None and not projection.vendor:
+        remaining = set(projection.field_ids)
+
     vendor_ns = None
-    for namespace, i in _present_bits(packet[present_offset:offset]):
+    keep_vendor = True
+    # registered vendor namespace waiting for all its presence bits
+    decode_vendor = None
+    for namespace, i in _present_bits(packet, 4, offset):
         if i is None:
+            if decode_vendor is not None:
+                _decode_vendor(*decode_vendor)
+                decode_vendor = None
             # namespace switch; if vendor switch to vendor namespace
             if namespace == 'vendor':
+                data_offset = align(offset, 2) + 6
                 offset, fields = _parse_vendor(packet, offset)
+                if offset > radiotap_len:
+                    # skip_length runs past the header
+                    return PARSE_VENDOR_OVERRUN
                 vendor_ns = fields['oui']
-                _add_fields(radiotap, vendor_ns, fields)
+                keep_vendor = projection is None or vendor_ns in projection.vendor
+                if keep_vendor:
+                    _add_fields(radiotap, vendor_ns, fields)
+                    if _vendor_layouts:
+                        decode_vendor = fields, data_offset
             continue
 
         elif namespace == 'vendor':
-            # just track the presence bit...
-            _add_vendor_presence_bit(radiotap, vendor_ns, i)
+            # just track the presence bit, the data was skipped already
+            if keep_vendor:
+                _add_vendor_presence_bit(radiotap, vendor_ns, i)
+            continue
 
-        offset, fields = _parse_radiotap_field(namespace, i, packet, offset)
+        elif projection is not None and i not in projection.field_ids:
+            # skip over a field that was not asked for
+            if i >= len(_field_layouts):
+                break
+            offset = align(offset, _field_layouts[i][0]) + _field_structs[i].size
+            if offset == radiotap_len:
+                break
+            continue
+
+        offset, fields = parse_field(namespace, i, packet, offset)
         _add_fields(radiotap, namespace, fields)
-        if offset == radiotap_len or offset is None:
+        if offset is None:
+            return PARSE_UNKNOWN_FIELD
+        if offset == radiotap_len:
             break
+        if projection is not None and not projection.vendor and \
+                namespace == 'radiotap':
+            remaining.discard(i)
+            if not remaining:
+                break
+    if decode_vendor is not None:
+        _decode_vendor(*decode_vendor)
+    return PARSE_OK
+
+# status codes of radiotap_parse_checked()
+PARSE_OK = 0
+PARSE_TRUNCATED = 1
+PARSE_BAD_VERSION = 2
+PARSE_UNKNOWN_FIELD = 3
+PARSE_VENDOR_OVERRUN = 4
+
+PARSE_STATUS_NAMES = ('ok', 'truncated', 'bad_version', 'unknown_field',
+                      'vendor_overrun')
+
+def _check_header(packet):
+    """
+    Like _parse_header(), but never raises: return a tuple (status,
+    radiotap_len, offset, key) where status is a PARSE_* code and the
+    presence bitmaps are checked to end within radiotap_len.
+    """
+    if len(packet) < 8:
+        return PARSE_TRUNCATED, 0, 0, None
+    version, pad, radiotap_len, present = struct.unpack_from('<BBHI', packet)
+    if version != 0 or pad != 0:
+        return PARSE_BAD_VERSION, 0, 0, None
+    if radiotap_len < 8 or radiotap_len > len(packet):
+        return PARSE_TRUNCATED, 0, 0, None
+    if not present & (1 << 31):
+        return PARSE_OK, radiotap_len, 8, present
+
+    offset = 8
+    while present & (1 << 31):
+        if offset + 4 > radiotap_len:
+            return PARSE_TRUNCATED, 0, 0, None
+        present, = struct.unpack_from('<I', packet, offset)
+        offset += 4
+    return PARSE_OK, radiotap_len, offset, bytes(packet[4:offset])
 
-    return radiotap_len, radiotap
+def radiotap_parse_checked(packet, valuelist=False, fields=None):
+    """
+    Parse like radiotap_parse(), but never raise on malformed input.
+    Return a tuple (status, offset, fields) where status is one of the
+    PARSE_* codes (named in PARSE_STATUS_NAMES) and fields holds
+    whatever could be decoded before the problem:
+
+      PARSE_TRUNCATED       the header or a field ends past radiotap_len
+                            or the packet
+      PARSE_BAD_VERSION     unknown header version or non-zero pad
+      PARSE_UNKNOWN_FIELD   decoding stopped at a field id it does not know
+      PARSE_VENDOR_OVERRUN  a vendor namespace runs past radiotap_len
+
+    offset is radiotap_len, or 0 if the fixed header is unusable.  The
+    cached parse plan bounds-checks the whole layout against radiotap_len
+    up front, so well-formed headers cost the same as radiotap_parse().
+    """
+    status, radiotap_len, offset, key = _check_header(packet)
+    radiotap = [] if valuelist else {}
+    if status:
+        return status, 0, radiotap
 
-def macstr(macbytes):
-    return ':'.join(['%02x' % ord(k) for k in macbytes])
+    if fields is None:
+        projection = None
+        plan = _plan_cache.lookup(key)
+    else:
+        projection = compile_fields(fields)
+        plan = projection._plans.lookup(key)
+
+    if plan is not None and plan.end <= radiotap_len:
+        _decode_plan(plan, packet, radiotap)
+        if projection is not None:
+            plan = _plan_cache.lookup(key)
+        if plan.unknown is not None:
+            status = PARSE_UNKNOWN_FIELD
+        return status, radiotap_len, radiotap
+
+    if plan is not None:
+        # decode the fields that fit
+        for field_id, field_offset, names, decode, start, stop in plan.fields:
+            field_struct = _field_structs[field_id]
+            if field_offset + field_struct.size > radiotap_len:
+                break
+            values = field_struct.unpack_from(packet, field_offset)
+            if decode is None:
+                _add_fields(radiotap, 'radiotap', dict(zip(names, values)))
+            else:
+                _add_fields(radiotap, 'radiotap', decode(*values))
+        return PARSE_TRUNCATED, radiotap_len, radiotap
+
+    # vendor namespaces: field by field, reading no further than the header
+    header = memoryview(packet)[:radiotap_len]
+    try:
+        status = _parse_fields(header, offset, radiotap_len, radiotap,
+                               projection, _parse_radiotap_field)
+    except struct.error:
+        status = PARSE_TRUNCATED
+    return status, radiotap_len, radiotap
+
+class _Instrumentation(object):
+    """
+    Counters kept by radiotap_parse() while instrumentation is enabled,
+    see enable_instrumentation().  Counters are updated under a lock so
+    that parsing threads may share them; decoding itself is not locked.
+    """
 
-def is_blkack(mac):
-    fc = mac.get('fc', 0)
+    def __init__(self, timing_sample):
+        self.counters = collections.Counter()
+        self.fields = collections.Counter()
+        self.unknown_fields = collections.Counter()
+        self.vendor_namespaces = collections.Counter()
+        self.timing = {}
+        self.timing_sample = timing_sample
+        self._countdown = timing_sample
+        self._lock = threading.Lock()
+
+    def header_error(self, packet):
+        with self._lock:
+            self.counters['headers'] += 1
+            if len(packet) >= 8 and (packet[0] != 0 or packet[1] != 0):
+                self.counters['bad_version'] += 1
+            else:
+                self.counters['truncated'] += 1
+
+    def _sample(self):
+        if not self.timing_sample:
+            return False
+        self._countdown -= 1
+        if self._countdown:
+            return False
+        self._countdown = self.timing_sample
+        return True
+
+    def parse(self, packet, offset, radiotap_len, radiotap, projection, plan):
+        with self._lock:
+            self.counters['headers'] += 1
+            timed = self._sample()
+        if plan is not None and plan.end <= radiotap_len and not timed:
+            _decode_plan(plan, packet, radiotap)
+            with self._lock:
+                self.counters['plan_decoded'] += 1
+                self.fields.update(('radiotap', f[0]) for f in plan.fields)
+                if plan.tlvs is not None:
+                    self.fields[('radiotap', _TLV_FIELD)] += 1
+                if plan.unknown is not None:
+                    self.unknown_fields[plan.unknown] += 1
+            return
+
+        with self._lock:
+            if plan is not None and plan.end > radiotap_len:
+                self.counters['truncated_fields'] += 1
+            self.counters['field_by_field'] += 1
+        parse_field = self._timed_parse_field if timed else self._parse_field
+        try:
+            _parse_fields(packet, offset, radiotap_len, radiotap, projection,
+                          parse_field)
+        except struct.error:
+            with self._lock:
+                self.counters['errors'] += 1
+            raise
+
+        vendors = radiotap if isinstance(radiotap, list) else radiotap.values()
+        vendors = [(macstr(fields['oui']), fields['subns'])
+                   for fields in vendors
+                   if isinstance(fields, dict) and 'oui' in fields]
+        if vendors:
+            with self._lock:
+                self.vendor_namespaces.update(vendors)
+
+    def _parse_field(self, namespace, field_id, packet, offset):
+        with self._lock:
+            if namespace == 'radiotap' and field_id >= len(_dispatch_table):
+                self.unknown_fields[field_id] += 1
+            else:
+                self.fields[(namespace, field_id)] += 1
+        return _parse_radiotap_field(namespace, field_id, packet, offset)
+
+    def _timed_parse_field(self, namespace, field_id, packet, offset):
+        if namespace != 'radiotap' or field_id >= len(_dispatch_table):
+            return self._parse_field(namespace, field_id, packet, offset)
+        started = time.perf_counter()
+        result = self._parse_field(namespace, field_id, packet, offset)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            timing = self.timing.setdefault(
+                _dispatch_table[field_id].__name__, [0, 0.])
+            timing[0] += 1
+            timing[1] += elapsed
+        return result
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self.counters)
+            field_counts = dict(self.fields)
+            unknown_fields = dict(self.unknown_fields)
+            vendor_namespaces = dict(self.vendor_namespaces)
+            timing = dict((name, tuple(value))
+                          for name, value in self.timing.items())
+
+        fields = {}
+        for (namespace, field_id), count in field_counts.items():
+            fields.setdefault(namespace, {})[field_id] = count
+        snapshot = dict((name, counters.get(name, 0)) for name in (
+            'headers', 'plan_decoded', 'field_by_field', 'truncated',
+            'bad_version', 'truncated_fields', 'errors'))
+        snapshot.update({
+            'fields': fields,
+            'unknown_fields': unknown_fields,
+            'vendor_namespaces': dict(
+                ('%s/%d' % ns, count)
+                for ns, count in vendor_namespaces.items()),
+            'timing': dict(
+                (name, {'calls': calls, 'seconds': seconds,
+                        'mean_us': seconds / calls * 1e6})
+                for name, (calls, seconds) in timing.items()),
+        })
+        return snapshot
+
+_instrumentation = None
+
+def enable_instrumentation(timing_sample=0):
+    """
+    Start counting in radiotap_parse(): headers seen, how they were
+    decoded, truncated and bad-version headers, struct errors, fields
+    per namespace and field id, unknown field ids and vendor namespaces.
+    If timing_sample is N > 0, every Nth header is decoded field by
+    field with each _parse_* function timed.  Enabling again resets
+    the counters.  While disabled the parser only pays for one check.
+    """
+    global _instrumentation
+    _instrumentation = _Instrumentation(timing_sample)
+
+def disable_instrumentation():
+    global _instrumentation
+    _instrumentation = None
+
+def instrumentation_snapshot():
+    """
+    Return the current counters as a dictionary, or None if
+    instrumentation is disabled.  Field counts are keyed by namespace
+    ('radiotap' or 'vendor') and field id; timing by parser function.
+    """
+    inst = _instrumentation
+    if inst is None:
+        return None
+    return inst.snapshot()
+
+class RadiotapHeader(object):
+    """
+    Read-only view of a radiotap header that decodes fields on demand.
+
+    Fields are looked up by the names radiotap_parse() uses, either as
+    items or as attributes (hdr['chan_freq'], hdr.dbm_antsignal); each
+    field is decoded from the buffer the first time one of its names is
+    accessed and memoized.  Headers with vendor namespaces, or whose
+    fields run past the header length, are decoded eagerly.
+
+    present is the plan cache key of the presence bitmaps: the first
+    word if there is only one, else the raw bytes of all words.
+    """
+    __slots__ = ('packet', 'length', 'present', '_plan', '_values',
+                 '_tlvs_decoded')
+
+    def __init__(self, packet, length, present, plan, values):
+        self.packet = packet
+        self.length = length
+        self.present = present
+        self._plan = plan
+        self._values = values
+        self._tlvs_decoded = False
+
+    def _decode_tlvs(self):
+        # which TLV names exist depends on the TLVs the header carries
+        if not self._tlvs_decoded:
+            self._values.update(_parse_tlvs(self.packet, self._plan.tlvs)[1])
+            self._tlvs_decoded = True
+
+    def _decode(self, name):
+        try:
+            field_id, offset, names, decode, _, _ = self._plan.names[name]
+        except (AttributeError, KeyError):
+            raise KeyError(name)
+        if field_id == _TLV_FIELD:
+            self._decode_tlvs()
+            return self._values[name]
+        values = _field_structs[field_id].unpack_from(self.packet, offset)
+        if decode is None:
+            self._values.update(zip(names, values))
+        else:
+            self._values.update(decode(*values))
+        return self._values[name]
+
+    def __getitem__(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            return self._decode(name)
+
+    def __getattr__(self, name):
+        # unset slots (e.g. while copy or pickle rebuild the header) must
+        # not be looked up as fields, which would read them again
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __reduce__(self):
+        # the plan holds a struct and packet may be a memoryview: rebuild
+        # from a copy of the header bytes instead
+        return _lazy_header, (bytes(self.packet[:self.length]),)
+
+    def __contains__(self, name):
+        if name in self._values:
+            return True
+        if self._plan is None or name not in self._plan.names:
+            return False
+        if self._plan.names[name][0] == _TLV_FIELD:
+            self._decode_tlvs()
+            return name in self._values
+        return True
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def keys(self):
+        if self._plan is None:
+            return list(self._values)
+        names = [name for name, field in self._plan.names.items()
+                 if field[0] != _TLV_FIELD]
+        if self._plan.tlvs is not None:
+            self._decode_tlvs()
+            names.extend(name for name in _tlv_names if name in self._values)
+        return names
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def to_dict(self):
+        """Decode every field and return them as radiotap_parse() would."""
+        if self._plan is None:
+            return dict(self._values)
+        fields = {}
+        _decode_plan(self._plan, self.packet, fields)
+        self._values.update(fields)
+        self._tlvs_decoded = True
+        return fields
+
+def radiotap_parse_lazy(packet):
+    """
+    Like radiotap_parse(), but return a tuple (offset, header) where
+    header is a RadiotapHeader that decodes fields only when accessed.
+    """
+    radiotap_len, offset, key = _parse_header(packet)
+    if not radiotap_len:
+        return 0, RadiotapHeader(packet, 0, None, None, {})
+
+    plan = _plan_cache.lookup(key)
+    if plan is not None and plan.end <= radiotap_len:
+        return radiotap_len, RadiotapHeader(packet, radiotap_len, key, plan, {})
+
+    radiotap_len, fields = radiotap_parse(packet)
+    return radiotap_len, RadiotapHeader(packet, radiotap_len, key, None, fields)
+
+def _lazy_header(packet):
+    return radiotap_parse_lazy(packet)[1]
+
+def macstr(macbytes):
+    return ':'.join(['%02x' % k for k in bytearray(macbytes)])
+
+# ieee80211_parse() formats the few distinct addresses of a capture once
+# and hands out the same string object afterwards
+_macstr_cached = functools.lru_cache(maxsize=4096)(macstr)
+
+def _macint(macbytes):
+    return int.from_bytes(macbytes, 'big')
+
+_addr_formats = {
+    'str': _macstr_cached,
+    'int': _macint,
+    'bytes': bytes,
+}
+
+FC_TYPE_MGMT = 0
+FC_TYPE_CTRL = 1
+FC_TYPE_DATA = 2
+FC_TYPE_EXT = 3
+
+# MAC header layouts following frame control, duration and addr1
+_LAYOUT_ADDR1 = 0       # CTS, ACK, control wrapper, extension frames
+_LAYOUT_ADDR2 = 1       # RTS, PS-Poll, CF-End, NDP announcement, ...
+_LAYOUT_BLKACKREQ = 2
+_LAYOUT_BLKACK = 3
+_LAYOUT_THREE_ADDR = 4  # management and data frames
+
+_ctrl_layouts = {
+    2: _LAYOUT_ADDR2,       # Trigger
+    4: _LAYOUT_ADDR2,       # beamforming report poll
+    5: _LAYOUT_ADDR2,       # VHT NDP announcement
+    8: _LAYOUT_BLKACKREQ,
+    9: _LAYOUT_BLKACK,
+    10: _LAYOUT_ADDR2,      # PS-Poll
+    11: _LAYOUT_ADDR2,      # RTS
+    14: _LAYOUT_ADDR2,      # CF-End
+    15: _LAYOUT_ADDR2,      # CF-End + CF-Ack
+}
+
+def _fc_class(fc):
     type = (fc >> 2) & 0x3
     subtype = (fc >> 4) & 0x0f
+    if type == FC_TYPE_CTRL:
+        layout = _ctrl_layouts.get(subtype, _LAYOUT_ADDR1)
+    elif type == FC_TYPE_EXT:
+        layout = _LAYOUT_ADDR1
+    else:
+        layout = _LAYOUT_THREE_ADDR
+    qos = type == FC_TYPE_DATA and bool(subtype & 0x8)
+    return type, subtype, layout, qos
+
+# (type, subtype, layout, qos) indexed by the first frame control byte
+_fc_classes = tuple(_fc_class(fc) for fc in range(256))
+
+def is_blkack(mac):
+    type, subtype, _, _ = _fc_classes[mac.get('fc', 0) & 0xff]
 
     # control frame and block ack
     return type == 1 and subtype == 0x9
 
 def is_qos_data(mac):
-    fc = mac.get('fc', 0)
-    type = (fc >> 2) & 0x3
-    subtype = (fc >> 4) & 0x0f
+    type, subtype, _, _ = _fc_classes[mac.get('fc', 0) & 0xff]
 
     return type == 2 and subtype == 0x8
 
 def is_qos_null(mac):
-    fc = mac.get('fc', 0)
-    type = (fc >> 2) & 0x3
-    subtype = (fc >> 4) & 0x0f
+    type, subtype, _, _ = _fc_classes[mac.get('fc', 0) & 0xff]
 
     return type == 2 and subtype == 0xc
 
 def is_qos(mac):
-    return is_qos_null(mac) or is_qos_data(mac)
+    """true for every QoS data subtype, QoS null included"""
+    return _fc_classes[mac.get('fc', 0) & 0xff][3]
 
-def ieee80211_parse(packet, offset):
-    hdr_fmt = "<HH6s"
-    hdr_len = struct.calcsize(hdr_fmt)
+def is_wds(mac):
+    """true for data frames with both ToDS and FromDS set (4 addresses)"""
+    fc = mac.get('fc', 0)
+    return _fc_classes[fc & 0xff][0] == FC_TYPE_DATA and fc & 0x0300 == 0x0300
+
+_hdr_struct = struct.Struct("<HH6s")
+_addr2_struct = struct.Struct("<6s")
+_blkackreq_struct = struct.Struct("<6sHH")
+_blkack_struct = struct.Struct("<6sHH8s")
+_three_addr_struct = struct.Struct("<6s6sH")
+_addr4_struct = struct.Struct("<6s")
+_qos_ctrl_struct = struct.Struct("<H")
 
-    if len(packet) - offset < hdr_len:
+def ieee80211_parse(packet, offset, addr_format='str'):
+    """
+    Parse the 802.11 MAC header at offset in packet.  Return a tuple
+    (offset, mac) where offset points past the header and mac is a
+    dictionary of header fields, including the frame 'type' and
+    'subtype'.
+
+    Addresses are returned according to addr_format: 'str' for
+    colon-separated hex strings (the same object for repeated
+    addresses), 'int' for 48-bit integers or 'bytes' for the raw bytes.
+    The header layout follows the frame control field: control frames
+    only carry the addresses they define, data frames carry addr4 only
+    when both ToDS and FromDS are set, and QoS data frames a QoS
+    control field.
+    """
+    addr = _addr_formats[addr_format]
+
+    if len(packet) - offset < _hdr_struct.size:
         return 0, {}
 
-    fc, duration, addr1 = \
-        struct.unpack_from(hdr_fmt, packet, offset)
+    fc, duration, addr1 = _hdr_struct.unpack_from(packet, offset)
+    type, subtype, layout, qos = _fc_classes[fc & 0xff]
 
-    offset += hdr_len
+    offset += _hdr_struct.size
     mac = {
         'fc': fc,
+        'type': type,
+        'subtype': subtype,
         'duration': duration * .001024,
-        'addr1': macstr(addr1),
+        'addr1': addr(addr1),
     }
 
-    if is_blkack(mac):
-        blkack_fmt = "<6sHH8s"
-        blkack_len = struct.calcsize(blkack_fmt)
-        if len(packet) - offset < blkack_len:
+    if layout == _LAYOUT_ADDR1:
+        return offset, mac
+
+    if layout == _LAYOUT_ADDR2:
+        if len(packet) - offset < _addr2_struct.size:
+            return offset, mac
+        addr2, = _addr2_struct.unpack_from(packet, offset)
+        mac['addr2'] = addr(addr2)
+        return offset + _addr2_struct.size, mac
+
+    if layout == _LAYOUT_BLKACKREQ:
+        if len(packet) - offset < _blkackreq_struct.size:
+            return offset, mac
+        addr2, bar_ctrl, bar_ssc = \
+            _blkackreq_struct.unpack_from(packet, offset)
+        mac.update({
+            'addr2': addr(addr2),
+            'bar_ctrl': bar_ctrl,
+            'bar_ssc': bar_ssc,
+        })
+        return offset + _blkackreq_struct.size, mac
+
+    if layout == _LAYOUT_BLKACK:
+        if len(packet) - offset < _blkack_struct.size:
             return offset, mac
 
         addr2, ba_ctrl, ba_ssc, ba_bitmap = \
-            struct.unpack_from(blkack_fmt, packet, offset)
-        offset += blkack_len
+            _blkack_struct.unpack_from(packet, offset)
+        offset += _blkack_struct.size
         mac.update({
-            'addr2': macstr(addr2),
+            'addr2': addr(addr2),
             'ba_ctrl': ba_ctrl,
             'ba_ssc': ba_ssc,
             'ba_bitmap': ba_bitmap
         })
         return offset, mac
 
-    three_addr_fmt = "<6s6sH"
-    three_addr_len = struct.calcsize(three_addr_fmt)
-    if len(packet) - offset < three_addr_len:
+    if len(packet) - offset < _three_addr_struct.size:
         return offset, mac
 
     addr2, addr3, seq = \
-        struct.unpack_from(three_addr_fmt, packet, offset)
-    offset += three_addr_len
+        _three_addr_struct.unpack_from(packet, offset)
+    offset += _three_addr_struct.size
     mac.update({
-        'addr2': macstr(addr2),
-        'addr3': macstr(addr3),
+        'addr2': addr(addr2),
+        'addr3': addr(addr3),
         'seq': seq >> 4,
         'frag': seq & 0x0f
     })
 
-    if is_qos(mac):
-        four_addr_fmt = "<6s"
-        four_addr_len = struct.calcsize(four_addr_fmt)
-        if len(packet) - offset < four_addr_len:
+    if type == FC_TYPE_DATA and fc & 0x0300 == 0x0300:
+        # WDS: ToDS and FromDS
+        if len(packet) - offset < _addr4_struct.size:
             return offset, mac
 
-        addr4, = struct.unpack_from(four_addr_fmt, packet, offset)
-        offset += four_addr_len
-        mac.update({
-            'addr4': macstr(addr4)
-        })
+        addr4, = _addr4_struct.unpack_from(packet, offset)
+        offset += _addr4_struct.size
+        mac['addr4'] = addr(addr4)
 
-        qos_ctrl_fmt = "<H"
-        qos_ctrl_len = struct.calcsize(qos_ctrl_fmt)
-        if len(packet) - offset < qos_ctrl_len:
+    if qos:
+        if len(packet) - offset < _qos_ctrl_struct.size:
             return offset, mac
 
-        qos_ctrl, = struct.unpack_from(qos_ctrl_fmt, packet, offset)
+        qos_ctrl, = _qos_ctrl_struct.unpack_from(packet, offset)
+        offset += _qos_ctrl_struct.size
         tid = qos_ctrl & 0xf
         eosp = (qos_ctrl >> 4) & 1
         mesh_ps = (qos_ctrl >> 9) & 1
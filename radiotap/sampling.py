@@ -0,0 +1,174 @@
+"""
+    sampling and load shedding in front of the parser
+
+    example:
+    >>> import radiotap.pcap as rp, radiotap.sampling as rs
+    >>> sampler = rs.AdaptiveSampler(budget=0.5)
+    >>> for tstamp, weight, radiotap, mac in rs.sample_records(
+    ...         rp.read_pcap('foo.pcap'), sampler):
+    ...     packets += weight
+
+    A sampler decides from the raw packet whether it gets parsed and
+    returns the weight of the record it keeps (the number of offered
+    packets it stands for), so counts and sums multiplied by the weight
+    stay unbiased.  Dropped packets cost a few byte reads, never a parse.
+"""
+import time
+import zlib
+
+from radiotap import radiotap as _rt
+
+# statuses of radiotap_parse_checked() whose records are yielded
+_USABLE = (_rt.PARSE_OK, _rt.PARSE_UNKNOWN_FIELD)
+
+class Sampler(object):
+    """
+    Keep every packet.  Subclasses override sample(), which returns the
+    weight of a kept packet or 0 to drop it; parsed() is told how long
+    each kept packet took to parse.
+    """
+
+    def __init__(self):
+        self.offered = 0
+        self.kept = 0
+
+    def sample(self, packet):
+        self.offered += 1
+        self.kept += 1
+        return 1
+
+    def parsed(self, seconds):
+        pass
+
+class EveryNth(Sampler):
+    """Deterministically keep one packet in n, with weight n."""
+
+    def __init__(self, n):
+        super(EveryNth, self).__init__()
+        if n < 1:
+            raise ValueError('n must be at least 1')
+        self.n = n
+
+    def sample(self, packet):
+        self.offered += 1
+        if (self.offered - 1) % self.n:
+            return 0
+        self.kept += 1
+        return self.n
+
+def _station(packet):
+    """Raw transmitter address (addr1 for frames without one), or None."""
+    if len(packet) < 4:
+        return None
+    rtlen = packet[2] | (packet[3] << 8)
+    if len(packet) < rtlen + 10:
+        return None
+    if len(packet) >= rtlen + 16 and \
+            _rt._fc_classes[packet[rtlen]][2] != _rt._LAYOUT_ADDR1:
+        return bytes(packet[rtlen + 10:rtlen + 16])
+    return bytes(packet[rtlen + 4:rtlen + 10])
+
+class StationSampler(Sampler):
+    """
+    Keep all packets of about one station in n, chosen by a hash of the
+    transmitter address (addr2, or addr1 for frames without one), with
+    weight n.  The same stations are picked on every run and every
+    sensor using the same salt, so per-station statistics stay whole.
+    Packets without a MAC header are sampled one in n.
+    """
+
+    def __init__(self, n, salt=b''):
+        super(StationSampler, self).__init__()
+        if n < 1:
+            raise ValueError('n must be at least 1')
+        self.n = n
+        self.salt = salt
+        self._threshold = (1 << 32) // n
+        self._unaddressed = 0
+
+    def sample(self, packet):
+        self.offered += 1
+        station = _station(packet)
+        if station is None:
+            self._unaddressed += 1
+            keep = (self._unaddressed - 1) % self.n == 0
+        else:
+            keep = zlib.crc32(self.salt + station) < self._threshold
+        if not keep:
+            return 0
+        self.kept += 1
+        return self.n
+
+class AdaptiveSampler(Sampler):
+    """
+    Keep as many packets as fit in budget, the fraction of one core to
+    spend parsing.  Every interval seconds the keep probability is set
+    from the packets offered and the mean parse time measured during the
+    previous interval; kept packets are spread evenly and weighted by the
+    inverse of the probability.
+    """
+
+    def __init__(self, budget=0.5, interval=1.0, min_probability=1e-4,
+                 clock=time.perf_counter):
+        super(AdaptiveSampler, self).__init__()
+        if interval <= 0:
+            raise ValueError('interval must be positive')
+        self.budget = budget
+        self.interval = interval
+        self.min_probability = min_probability
+        self.probability = 1.
+        self._clock = clock
+        self._started = clock()
+        self._offered = 0
+        self._parsed = 0
+        self._seconds = 0.
+        self._credit = 0.
+
+    def _adjust(self, now):
+        elapsed = now - self._started
+        # a clock that did not advance gives no rate to adjust to
+        if self._parsed and elapsed > 0:
+            demand = self._offered / elapsed * self._seconds / self._parsed
+            probability = self.budget / demand if demand else 1.
+            self.probability = max(min(probability, 1.), self.min_probability)
+        self._started = now
+        self._offered = self._parsed = 0
+        self._seconds = 0.
+
+    def sample(self, packet):
+        self.offered += 1
+        self._offered += 1
+        now = self._clock()
+        if now - self._started >= self.interval:
+            self._adjust(now)
+
+        self._credit += self.probability
+        if self._credit < 1.:
+            return 0
+        self._credit -= 1.
+        self.kept += 1
+        return 1. / self.probability
+
+    def parsed(self, seconds):
+        self._parsed += 1
+        self._seconds += seconds
+
+def sample_records(records, sampler):
+    """
+    Parse the (timestamp, packet) records kept by sampler and yield
+    (timestamp, weight, radiotap, mac) tuples.  Kept records with a
+    malformed radiotap header are skipped, see radiotap_parse_checked().
+    """
+    clock = time.perf_counter
+    for tstamp, packet in records:
+        weight = sampler.sample(packet)
+        if not weight:
+            continue
+        started = clock()
+        status, off, radiotap = _rt.radiotap_parse_checked(packet)
+        usable = status in _USABLE
+        if usable:
+            off, mac = _rt.ieee80211_parse(packet, off)
+        sampler.parsed(clock() - started)
+        if usable:
+            yield tstamp, weight, radiotap, mac
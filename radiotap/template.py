@@ -0,0 +1,150 @@
+"""
+    precompiled radiotap header builder for frame injection
+
+    example:
+    >>> from radiotap.template import RadiotapTemplate
+    >>> tpl = RadiotapTemplate(['rate', 'tx_flags', 'data_retries'],
+    ...                        tx_flags=0x0008)
+    >>> buf = bytearray(tpl.size + len(frame))
+    >>> buf[tpl.size:] = frame
+    >>> tpl.pack_into(buf, 0, rate=6.0)
+
+    The presence bitmaps, alignment padding and field offsets are worked
+    out once; pack_into() copies the prebuilt header and patches only the
+    fields whose values are passed.  Headers built here parse back with
+    radiotap_parse() to the same values.
+"""
+import struct
+
+from radiotap import radiotap as _rt
+
+# values taken by each field, where they differ from the names
+# radiotap_parse() returns, and how to turn them into the raw values
+_encoders = {
+    2: (('rate',), lambda rate: (int(round(rate * 2)),)),
+    19: (('mcs_known', 'mcs_flags', 'mcs_index'), None),
+    21: (('vht_known', 'vht_flags', 'vht_bw', 'vht_mcs_nss', 'vht_coding',
+          'vht_group_id', 'vht_partial_aid'),
+         lambda known, flags, bw, mcs_nss, coding, group_id, partial_aid:
+             (known, flags, bw) + tuple(mcs_nss) + (coding, group_id,
+                                                    partial_aid)),
+    23: (('he_data1', 'he_data2', 'he_data3', 'he_data4', 'he_data5',
+          'he_data6'), None),
+    24: (('he_mu_flags1', 'he_mu_flags2', 'he_mu_ru_channel1',
+          'he_mu_ru_channel2'),
+         lambda flags1, flags2, channel1, channel2:
+             (flags1, flags2) + tuple(channel1) + tuple(channel2)),
+}
+
+_tuple_values = {'vht_mcs_nss': (0,) * 4,
+                 'he_mu_ru_channel1': (0,) * 4,
+                 'he_mu_ru_channel2': (0,) * 4}
+
+def _field_inputs(field_id):
+    if field_id in _encoders:
+        return _encoders[field_id]
+    return _rt._field_layouts[field_id][2], None
+
+class RadiotapTemplate(object):
+    """
+    Radiotap header with a fixed set of fields.
+
+    fields names the radiotap fields to include, by any name
+    radiotap_parse() reports for them ('rate', 'mcs_index', ...).
+    vendor is a sequence of (oui, subns, data) or (oui, subns, data,
+    present) vendor namespaces appended after the radiotap fields.
+    Keyword arguments set default field values, 0 otherwise; they use
+    the radiotap_parse() names except for rate in Mbps, vht_mcs_nss (the
+    four per-user bytes) and the raw HE values.
+    """
+
+    def __init__(self, fields, vendor=(), **defaults):
+        field_ids = set()
+        for name in fields:
+            field_id = _rt._field_ids.get(name)
+            if field_id is None or field_id >= len(_rt._field_layouts):
+                raise ValueError('cannot build radiotap field %r' % (name,))
+            field_ids.add(field_id)
+        field_ids = sorted(field_ids)
+
+        # presence bitmaps: one radiotap word, then one word per vendor
+        # namespace, each announcing the next with bits 30 and 31
+        words = [sum(1 << i for i in field_ids)]
+        for ns in vendor:
+            words[-1] |= (1 << 30) | (1 << 31)
+            words.append(ns[3] if len(ns) > 3 else 0)
+
+        offset = 4 + 4 * len(words)
+        self._fields = []
+        self._by_name = {}
+        values = {}
+        for field_id in field_ids:
+            names, encode = _field_inputs(field_id)
+            offset = _rt.align(offset, _rt._field_layouts[field_id][0])
+            field = (_rt._field_structs[field_id], offset, names, encode)
+            self._fields.append(field)
+            for name in names:
+                self._by_name[name] = field
+                values[name] = _tuple_values.get(name, 0)
+            offset += _rt._field_structs[field_id].size
+
+        unknown = set(defaults) - set(values)
+        if unknown:
+            raise ValueError('not in template: %s' % ', '.join(sorted(unknown)))
+        values.update(defaults)
+        self._values = values
+
+        vendor_parts = []
+        for ns in vendor:
+            oui, subns, data = ns[:3]
+            pad = _rt.align(offset, 2) - offset
+            vendor_parts.append(b'\x00' * pad +
+                                struct.pack('<3sBH', oui, subns, len(data)) +
+                                bytes(data))
+            offset += pad + 6 + len(data)
+
+        self.size = offset
+        self.present = tuple(words)
+        header = bytearray(offset)
+        struct.pack_into('<BBH%dI' % len(words), header, 0, 0, 0, offset, *words)
+        for field in self._fields:
+            self._pack_field(header, 0, field, values)
+        vendor_data = b''.join(vendor_parts)
+        header[offset - len(vendor_data):] = vendor_data
+        self.header = bytes(header)
+
+    @staticmethod
+    def _pack_field(buf, offset, field, values):
+        st, field_offset, names, encode = field
+        raw = [values[name] for name in names]
+        if encode is not None:
+            raw = encode(*raw)
+        st.pack_into(buf, offset + field_offset, *raw)
+
+    def pack_into(self, buf, offset=0, **values):
+        """
+        Write the header into buf at offset, with the given field values
+        overriding the defaults.  Returns the offset past the header.
+        """
+        end = offset + self.size
+        buf[offset:end] = self.header
+        if values:
+            patched = None
+            for name in values:
+                try:
+                    field = self._by_name[name]
+                except KeyError:
+                    raise ValueError('not in template: %s' % name)
+                if patched is None:
+                    patched = dict(self._values)
+                    patched.update(values)
+                self._pack_field(buf, offset, field, patched)
+        return end
+
+    def pack(self, **values):
+        """Return the header as bytes, see pack_into()."""
+        if not values:
+            return self.header
+        buf = bytearray(self.size)
+        self.pack_into(buf, 0, **values)
+        return bytes(buf)
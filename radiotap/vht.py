@@ -2,6 +2,7 @@
     vht lookups and helpers
     see http://www.radiotap.org/defined-fields/VHT
 """
+from types import MappingProxyType
 
 # vht rate lookups taken from http://mcsindex.com/
 vht_rate_table = [
@@ -115,39 +116,63 @@ vht_bandwidth_lut = [
     (160, "20UUU", 7),
 ]
 
-def vht_rate(vht_mcs_index, nss, gi, bandwidthMHz):
-    """vht_mcs_index is 0-9
-            gi: 0=long 1=short"""
+vht_mcs_descr = (
+    ("BPSK", "1/2"),
+    ("QPSK", "1/2"),
+    ("QPSK", "3/4"),
+    ("16QAM", "1/2"),
+    ("16QAM", "3/4"),
+    ("64QAM", "2/3"),
+    ("64QAM", "3/4"),
+    ("64QAM", "5/6"),
+    ("256QAM", "3/4"),
+    ("256QAM", "5/6"),
+)
+
+_vht_bw_index = {20: 0, 40: 1, 80: 2, 160: 3}
 
-    def calculate_column_index(gi, bandwidthMHz):
-        """ gi: 0=long 1=short"""
-        column_offset_by_bwMHz = {20: 0, 40: 2, 80: 4, 160: 6}
-        return column_offset_by_bwMHz[bandwidthMHz] + gi
+def _vht_key(vht_mcs_index, nss, gi, bw_index):
+    """pack a (mcs, nss, gi, bandwidth index) tuple into a table index"""
+    return (vht_mcs_index << 7) | (nss << 3) | (gi << 2) | bw_index
 
-    def calculate_row_index(vht_index, nss):
-        return vht_index + (nss - 1) * 10
+def _build_vht_tables():
+    rates = [None] * (1 << 11)
+    descriptions = [None] * (1 << 11)
+    for mcs in range(16):
+        for nss in range(16):
+            for gi in range(2):
+                for bw, bw_index in _vht_bandwidth_index_items:
+                    key = _vht_key(mcs, nss, gi, bw_index)
+                    rate = None
+                    if mcs < 10 and 1 <= nss <= 8:
+                        rate = vht_rate_table[mcs + (nss - 1) * 10][2 * bw_index + gi]
+                    rates[key] = rate
+                    descriptions[key] = MappingProxyType({
+                        'vht_mcs_index': mcs,
+                        'vht_mcs_descr': vht_mcs_descr[mcs] if mcs < 10 else None,
+                        'vht_rate_mbps': rate,
+                    })
+    return tuple(rates), tuple(descriptions)
 
-    col = calculate_column_index(gi, bandwidthMHz)
-    row = calculate_row_index(vht_mcs_index, nss)
-    return vht_rate_table[row][col]
+_vht_bandwidth_index_items = sorted(_vht_bw_index.items())
+_vht_rates, _vht_descriptions = _build_vht_tables()
+
+def vht_rate(vht_mcs_index, nss, gi, bandwidthMHz):
+    """vht_mcs_index is 0-9
+            gi: 0=long 1=short
+       Returns None for combinations without a defined rate."""
+    bw_index = _vht_bw_index.get(bandwidthMHz)
+    if bw_index is None or not (0 <= vht_mcs_index < 16 and 0 <= nss < 16):
+        return None
+    return _vht_rates[_vht_key(vht_mcs_index, nss, gi & 1, bw_index)]
 
 
 def vht_rate_description(vht_mcs_index, nss, gi, bandwidthMHz):
-    mcs_by_vht_index \
-        = {
-        0: ("BPSK", "1/2"),
-        1: ("QPSK", "1/2"),
-        2: ("QPSK", "3/2"),
-        3: ("16QAM", "1/2"),
-        4: ("16QAM", "3/4"),
-        5: ("64QAM", "2/3"),
-        6: ("64QAM", "3/4"),
-        7: ("64QAM", "5/6"),
-        8: ("256QAM", "3/4"),
-        9: ("256QAM", "5/6"),
-    }
-    gi_desc = {0: 800, 1: 400}
-    return {'vht_mcs_index': vht_mcs_index,
-            'vht_mcs_descr': mcs_by_vht_index[vht_mcs_index],
-            'vht_rate_mbps': vht_rate(vht_mcs_index, nss, gi, bandwidthMHz),
-            }
+    """Return a shared read-only mapping describing the rate; the mcs
+    description and rate are None when undefined."""
+    bw_index = _vht_bw_index.get(bandwidthMHz)
+    if bw_index is None or not (0 <= vht_mcs_index < 16 and 0 <= nss < 16):
+        return MappingProxyType({'vht_mcs_index': vht_mcs_index,
+                                 'vht_mcs_descr': None,
+                                 'vht_rate_mbps': None})
+    return _vht_descriptions[_vht_key(vht_mcs_index, nss, gi & 1, bw_index)]
@@ -46,7 +46,8 @@ def print_vendor(row):
              datastr(data, ' ')))
 
 def parse_file(fn):
-    pkt = open(fn, 'rb').read()
+    # slicing a memoryview does not copy the remaining records
+    pkt = memoryview(open(fn, 'rb').read())
 
     while len(pkt):
         off, radiotap = r.radiotap_parse(pkt, valuelist=True)
@@ -0,0 +1,69 @@
+import pickle
+
+import pytest
+
+import radiotap as r
+from radiotap.aggregate import Aggregator, Histogram, RSSI_EDGES
+from radiotap.template import RadiotapTemplate
+
+from test_pcap import MAC_HDR
+
+TPL = RadiotapTemplate(['flags', 'rate', 'chan_freq', 'dbm_antsignal'],
+                       chan_freq=5180)
+
+def _frames(signals, flags=0):
+    for signal in signals:
+        pkt = TPL.pack(flags=flags, rate=24.0, dbm_antsignal=signal) + MAC_HDR
+        off, radiotap = r.radiotap_parse(pkt)
+        off, mac = r.ieee80211_parse(pkt, off)
+        yield radiotap, mac, len(pkt)
+
+def test_histogram_clamps():
+    h = Histogram(RSSI_EDGES)
+    for value in (-120, -100, -42, -42, 5):
+        h.add(value)
+    assert h.to_dict() == {-100: 2, -42: 2, 0: 1}
+    assert h.total() == 5
+
+def test_update():
+    agg = Aggregator()
+    for i, (radiotap, mac, length) in enumerate(_frames([-40, -41, -70],
+                                                        flags=0x10)):
+        agg.update(radiotap, mac, length, tstamp=float(i))
+    stats = agg.to_dict()
+    assert list(stats['channels']) == [5180]
+    station = stats['stations'][r.ieee80211_parse(MAC_HDR, 0)[1]['addr2']]
+    assert station['packets'] == 3
+    assert station['bytes'] == 3 * (TPL.size + len(MAC_HDR))
+    assert station['flags'] == {'fcs': 3}
+    assert station['rssi'] == {-41: 1, -40: 1, -70: 1}
+    assert station['rate'] == {24: 3}
+    assert (station['first_seen'], station['last_seen']) == (0., 2.)
+
+def test_eviction_and_merge():
+    radiotap, mac, length = next(_frames([-50]))
+    a = Aggregator(max_stations=2)
+    b = Aggregator(max_stations=2)
+    for i in range(3):
+        a.update(radiotap, dict(mac, addr2=i), length)
+    b.update(radiotap, dict(mac, addr2=2), length)
+    assert list(a.stations) == [1, 2] and a.evicted == 1
+
+    a.merge(pickle.loads(pickle.dumps(b)))
+    assert a.stations[2].packets == 2
+    assert a.channels[5180].packets == 4
+    assert a.channels[5180].rssi.to_dict() == {-50: 4}
+
+def test_update_columns():
+    np = pytest.importorskip('numpy')
+    from radiotap.batch import radiotap_parse_batch
+
+    packets = [TPL.pack(dbm_antsignal=-60) + MAC_HDR,
+               RadiotapTemplate(['rate']).pack(rate=6.0) + MAC_HDR]
+    rows = radiotap_parse_batch(packets)
+    agg = Aggregator()
+    agg.update_columns(rows, macs=[{'addr2': 'a'}, {'addr2': 'b'}])
+    assert agg.stations['a'].rssi.to_dict() == {-60: 1}
+    assert agg.stations['b'].rssi.total() == 0
+    assert agg.stations['b'].rate.to_dict() == {6: 1}
+    assert list(agg.channels) == [5180]
@@ -0,0 +1,54 @@
+import asyncio
+import socket
+
+import radiotap as r
+from radiotap import pcap
+from radiotap.aio import read_pcap_stream
+
+from test_pcap import MAC_HDR, _write_pcap
+from test_radiotap import VHT_HDR, _header
+
+async def _stream(data):
+    """Feed data through a socket pair and collect the stream."""
+    rsock, wsock = socket.socketpair()
+    reader, rwriter = await asyncio.open_connection(sock=rsock)
+    wreader, writer = await asyncio.open_connection(sock=wsock)
+
+    async def feed():
+        # odd chunk sizes split headers and records
+        for i in range(0, len(data), 37):
+            writer.write(data[i:i + 37])
+            await writer.drain()
+        writer.close()
+
+    task = asyncio.ensure_future(feed())
+    got = [rec async for rec in read_pcap_stream(reader)]
+    await task
+    rwriter.close()
+    return got
+
+def test_stream_over_socketpair(tmp_path):
+    fn = str(tmp_path / 'capture.pcap')
+    _write_pcap(fn, [(i, VHT_HDR + MAC_HDR) for i in range(20)] +
+                [(20, VHT_HDR)])
+    data = open(fn, 'rb').read()
+    # drop half of the last record
+    data = data[:-10]
+    expected = list(pcap.read_pcap(fn, parse=True))[:-1]
+    assert asyncio.run(_stream(data)) == expected
+
+def test_malformed_record_skipped(tmp_path):
+    fn = str(tmp_path / 'capture.pcap')
+    good = [VHT_HDR + MAC_HDR, VHT_HDR]
+    bad = [
+        _header([1 << 31], b''),        # extended bitmap past the packet
+        b'\x01' + VHT_HDR[1:],          # bad version
+        VHT_HDR[:6],                    # shorter than the fixed header
+    ]
+    _write_pcap(fn, [(0, good[0])] + [(1, pkt) for pkt in bad] +
+                [(2, good[1])])
+    expected = []
+    for tstamp, pkt in zip((0, 2), good):
+        off, radiotap = r.radiotap_parse(pkt)
+        expected.append((tstamp, radiotap, r.ieee80211_parse(pkt, off)[1]))
+    assert asyncio.run(_stream(open(fn, 'rb').read())) == expected
@@ -0,0 +1,77 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import radiotap.airtime as ra
+import radiotap.batch as rb
+from radiotap.template import RadiotapTemplate
+
+LEGACY = RadiotapTemplate(['TSFT', 'flags', 'rate', 'chan_freq'],
+                          chan_freq=2412, flags=0x10)
+HT = RadiotapTemplate(['TSFT', 'flags', 'chan_freq', 'mcs_index'],
+                      chan_freq=5180, mcs_known=0x07)
+AMPDU = RadiotapTemplate(['TSFT', 'chan_freq', 'mcs_index', 'ampdu_refnum'],
+                         chan_freq=5180, mcs_known=0x07, mcs_index=7)
+VHT = RadiotapTemplate(['TSFT', 'chan_freq', 'vht_known'], chan_freq=5180,
+                       vht_known=0x0044, vht_bw=4, vht_mcs_nss=(0x92, 0, 0, 0))
+
+def test_frame_airtime():
+    headers = [
+        LEGACY.pack(rate=6.0),                 # OFDM
+        LEGACY.pack(rate=1.0),                 # DSSS, long preamble
+        LEGACY.pack(rate=11.0, flags=0x12),    # CCK, short preamble
+        HT.pack(mcs_index=7),                  # FCS not captured
+        HT.pack(mcs_index=15, mcs_flags=0x04), # 2 streams, short GI
+        VHT.pack(),                            # MCS 9, 2 streams, 80 MHz
+        RadiotapTemplate(['TSFT']).pack(),     # no rate
+    ]
+    rows = rb.radiotap_parse_batch(headers)
+    lengths = [100, 100, 100, 1500, 1500, 1500, 100]
+    airtime = ra.frame_airtime(rows, lengths)
+
+    # 20 + 4 * ceil((16 + 800 + 6) / 24)
+    assert airtime[0] == 160.
+    assert airtime[1] == 192. + 800.
+    assert airtime[2] == pytest.approx(96. + 800. / 11)
+    # 32 + 4 + 4 * ceil((16 + 8 * 1504 + 6) / 260)
+    assert airtime[3] == 36. + 4 * 47
+    # 32 + 2 * 4 + 3.6 * ceil(12054 / round(144.4 * 3.6))
+    assert airtime[4] == pytest.approx(40. + 3.6 * 24)
+    # 36 + 2 * 4 + 4 * ceil(12054 / 3120)
+    assert airtime[5] == 44. + 4 * 4
+    assert np.isnan(airtime[6])
+
+def test_ampdu_shares_preamble():
+    headers = [AMPDU.pack(ampdu_refnum=1), AMPDU.pack(ampdu_refnum=1),
+               AMPDU.pack(ampdu_refnum=2)]
+    rows = rb.radiotap_parse_batch(headers)
+    airtime = ra.frame_airtime(rows, [99, 99, 99])
+    # 4 byte delimiter, 103 bytes of MPDU and FCS padded to 104
+    payload = 8 * 108 * 4. / 260
+    assert airtime[0] == pytest.approx(36. + 4 * 22 / 260. + payload)
+    assert airtime[1] == pytest.approx(payload)
+    assert airtime[2] == airtime[0]
+
+def test_utilization():
+    headers = [LEGACY.pack(TSFT=1000000, rate=6.0),
+               LEGACY.pack(TSFT=1000500, rate=6.0),
+               HT.pack(TSFT=1100000, mcs_index=7),
+               LEGACY.pack(TSFT=1250000, chan_freq=2437, rate=6.0),
+               RadiotapTemplate(['rate']).pack(rate=6.0)]
+    rows = rb.radiotap_parse_batch(headers)
+    lengths = [100, 100, 1500, 100, 100]
+
+    usage = ra.channel_utilization(rows, lengths, interval=100000)
+    assert usage['start'] == 1000000
+    assert usage['keys'].tolist() == [2412, 2437, 5180]
+    assert usage['frames'].tolist() == [[2, 0, 0], [0, 0, 1], [0, 1, 0]]
+    assert usage['busy'][0, 0] == 320.
+    assert usage['busy'][1, 2] == 224.
+    assert usage['utilization'][2, 1] == 160. / 100000
+
+    stations = np.array([1, 2, 1, 2, 3], dtype=np.uint64)
+    usage = ra.station_utilization(rows, lengths, stations, interval=1000000,
+                                   start=0)
+    assert usage['keys'].tolist() == [1, 2]
+    assert usage['busy'].shape == (2, 2)
+    assert usage['busy'][1].tolist() == [384., 320.]
@@ -0,0 +1,38 @@
+import radiotap as r
+from radiotap.ampdu import AmpduAssembler, assemble
+from radiotap.template import RadiotapTemplate
+
+TPL = RadiotapTemplate(['mcs_index', 'dbm_antsignal', 'ampdu_refnum'],
+                       mcs_known=0x07, mcs_index=7)
+
+def _subframe(refnum, flags=0, signal=-50):
+    off, radiotap = r.radiotap_parse(
+        TPL.pack(ampdu_refnum=refnum, ampdu_flags=flags, dbm_antsignal=signal))
+    return radiotap
+
+def test_last_subframe():
+    asm = AmpduAssembler()
+    for i in range(63):
+        assert asm.add(_subframe(1, 0x0004, -50 - i % 3), 100, float(i)) == []
+    assert asm.add(_subframe(1, 0x0014), 100) == []
+    done = asm.add(_subframe(1, 0x000c), 1500, 63.)
+    assert len(done) == 1
+    aggregate = done[0]
+    assert aggregate['complete']
+    assert (aggregate['subframes'], aggregate['bytes']) == (64, 63 * 100 + 1500)
+    assert aggregate['delim_crc_errors'] == 1
+    assert (aggregate['signal_min'], aggregate['signal_max']) == (-52, -50)
+    assert aggregate['rate'] == 65.0
+    assert (aggregate['first_seen'], aggregate['last_seen']) == (0., 63.)
+    assert asm.flush() == []
+
+def test_window():
+    frames = [(_subframe(refnum), 10, None) for refnum in (1, 1, 2, 3, 2, 4)]
+    aggregates = list(assemble(frames, window=2))
+    assert [(a['refnum'], a['subframes'], a['complete'])
+            for a in aggregates] == [(1, 2, False), (3, 1, False),
+                                     (2, 2, False), (4, 1, False)]
+
+def test_no_ampdu():
+    off, radiotap = r.radiotap_parse(RadiotapTemplate(['rate']).pack())
+    assert AmpduAssembler().add(radiotap) == []
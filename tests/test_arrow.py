@@ -0,0 +1,61 @@
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+import radiotap as r
+from radiotap import arrow
+
+from test_pcap import MAC_HDR
+from test_radiotap import VHT_HDR, _header
+
+def _rows(with_length=False):
+    vendor = _header([(1 << 1) | (1 << 30) | (1 << 31), 1],
+                     b'\x10\x00\x00\x11\x22\x01\x03\x00abc')
+    for i, pkt in enumerate([VHT_HDR + MAC_HDR, vendor, VHT_HDR]):
+        radiotap_len, radiotap = r.radiotap_parse(pkt)
+        off, mac = r.ieee80211_parse(pkt, radiotap_len)
+        if with_length:
+            yield float(i), radiotap, mac, radiotap_len
+        else:
+            yield float(i), radiotap, mac
+
+def test_record_batches():
+    batches = list(arrow.record_batches(_rows(), batch_size=2))
+    assert [b.num_rows for b in batches] == [2, 1]
+    assert all(b.schema == arrow.arrow_schema() for b in batches)
+
+    table = pa.Table.from_batches(batches).to_pydict()
+    assert table['tstamp'] == [0., 1., 2.]
+    assert table['chan_freq'] == [5180, None, 5180]
+    assert table['vht_user0_rate_mbps'] == [1300.0, None, 1300.0]
+    assert table['vht_user1_rate_mbps'] == [None] * 3
+    assert table['addr2'] == ['66:77:88:99:aa:bb', None, None]
+    assert table['seq'] == [1, None, None]
+    assert table['vendor'][1] == [{'oui': b'\x00\x11\x22', 'subns': 1,
+                                   'present': 1, 'data': b'abc'}]
+    assert table['vendor'][0] is None
+    assert table['radiotap_len'] == [None] * 3
+
+def test_radiotap_len_and_extended_vendor_presence():
+    # vendor presence bits continue in a second word, up to bit 52
+    vendor = _header([(1 << 1) | (1 << 30) | (1 << 31), 1 | (1 << 31), 1 << 20],
+                     b'\x10\x00\x00\x11\x22\x01\x03\x00abc')
+    rows = list(_rows(with_length=True))
+    rows.append((3., r.radiotap_parse(vendor)[1], {}, len(vendor)))
+    table = pa.Table.from_batches(arrow.record_batches(rows)).to_pydict()
+    assert table['radiotap_len'] == [len(VHT_HDR), 23, len(VHT_HDR),
+                                     len(vendor)]
+    assert table['vendor'][3][0]['present'] == (1 << 52) | 1
+
+def test_write_parquet(tmp_path):
+    fn = str(tmp_path / 'out.parquet')
+    assert arrow.write_parquet(fn, _rows(), row_group_size=2) == 3
+    f = pq.ParquetFile(fn)
+    assert f.metadata.num_row_groups == 2
+    assert f.schema_arrow == arrow.arrow_schema()
+    assert f.read().column('dbm_antsignal').to_pylist() == [-76, None, -76]
+
+    arrow.write_parquet(fn, _rows(with_length=True))
+    assert pq.read_table(fn).column('radiotap_len').to_pylist() == [
+        len(VHT_HDR), 23, len(VHT_HDR)]
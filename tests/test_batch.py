@@ -0,0 +1,64 @@
+import struct
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import radiotap as r
+from radiotap.batch import radiotap_parse_batch
+
+from test_radiotap import VHT_HDR, _header
+
+def test_batch_matches_radiotap_parse():
+    packets = [
+        VHT_HDR,
+        _header([0x3], struct.pack('<Q', 1234) + b'\x10'),
+        VHT_HDR,
+        _header([(1 << 19)], b'\x07\x04\x07'),
+        b'\x01\x00',
+    ]
+    rows = radiotap_parse_batch(packets)
+    assert len(rows) == len(packets)
+    for row, packet in zip(rows, packets):
+        off, fields = r.radiotap_parse(packet)
+        assert row['radiotap_len'] == off
+        for name, value in fields.items():
+            if name in rows.dtype.names and value is not None:
+                assert row[name] == value, name
+
+    assert rows['vht_rate_mbps'][0] == 1300.0
+    assert rows['vht_nss'][0] == 3
+    assert rows['present'][1] == 0x3
+    assert np.isnan(rows['mcs_rate'][0])
+
+def test_batch_repeated_fields():
+    # dbm_antsignal and antenna again in two more radiotap namespaces
+    packet = _header([(1 << 5) | (1 << 29) | (1 << 31),
+                      (1 << 5) | (1 << 11) | (1 << 29) | (1 << 31),
+                      (1 << 5) | (1 << 11)],
+                     bytes([0xc4, 0xc0, 0, 0xc2, 1]))
+    rows = radiotap_parse_batch([packet, VHT_HDR])
+    off, fields = r.radiotap_parse(packet)
+    assert rows['status'].tolist() == [r.radiotap.PARSE_OK] * 2
+    assert rows['radiotap_len'][0] == off
+    assert (rows['dbm_antsignal'][0], rows['antenna'][0]) == (
+        fields['dbm_antsignal'], fields['antenna']) == (-62, 1)
+    assert rows['present'][0] == (1 << 5) | (1 << 11)
+
+def test_batch_status():
+    vendor = _header([(1 << 1) | (1 << 30) | (1 << 31), 1],
+                     b'\x10\x00\x00\x11\x22\x01\xff\x00abc')
+    packets = [
+        VHT_HDR,
+        b'\x01' * 8,
+        VHT_HDR[:2] + struct.pack('<H', 30) + VHT_HDR[4:30],
+        _header([1 << 1 | 1 << 31, 1], b'\x10'),
+        vendor,
+        struct.pack('<BBHI', 0, 0, 8, 1 << 31),
+    ]
+    rows = radiotap_parse_batch(packets)
+    assert [r.PARSE_STATUS_NAMES[s] for s in rows['status']] == [
+        'ok', 'bad_version', 'truncated', 'unknown_field', 'vendor_overrun',
+        'truncated']
+    assert rows['TSFT'][2] == rows['TSFT'][0]
+    assert rows['flags'][3] == rows['flags'][4] == 0x10
@@ -0,0 +1,67 @@
+import struct
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import radiotap as r
+import radiotap.blockack as rb
+
+STA1 = b'\x00\x11\x22\x33\x44\x55'
+STA2 = b'\x00\x11\x22\x33\x44\x66'
+
+def _blockack(seq, bitmap, tid=0, addr2=STA2, ba_type=0x0004):
+    return struct.pack('<BBH6s6sHHQ', 0x94, 0, 0, STA1, addr2,
+                       ba_type | (tid << 12), seq << 4, bitmap)
+
+def _macs(frames):
+    return [r.ieee80211_parse(frame, 0)[1] for frame in frames]
+
+def test_popcount():
+    values = np.array([0, 1, 0xff, (1 << 64) - 1], dtype=np.uint64)
+    assert rb.popcount(values).tolist() == [0, 1, 8, 64]
+    assert rb._highest_bit(values).tolist() == [0, 1, 8, 64]
+
+def test_analyze():
+    frames = [
+        _blockack(100, 0b1011),              # seq 102 missing
+        _blockack(5, 0b1, tid=5),             # another flow
+        _blockack(102, 0b11),                 # 102 retransmitted, 103 acked
+        _blockack(300, 0b1),                  # window jumped
+        _blockack(4094, 0xffff, tid=5),       # seq wraps
+    ]
+    macs = _macs(frames)
+    macs.insert(1, {'fc': 0})
+    columns = rb.blockack_columns(macs)
+    assert columns['index'].tolist() == [0, 2, 3, 4, 5]
+    assert columns['flow'].tolist() == [0, 1, 0, 0, 1]
+
+    frames = rb.analyze(columns)
+    assert frames['acked'].tolist() == [3, 1, 2, 1, 16]
+    assert frames['missing'].tolist() == [1, 0, 0, 0, 0]
+    assert frames['advance'].tolist() == [0, 0, 2, 198, 4089]
+    assert frames['retransmitted'].tolist() == [0, 0, 1, 0, 0]
+    assert frames['abandoned'].tolist() == [0, 0, 0, 0, 0]
+
+    totals = rb.summarize(columns, frames)
+    assert totals['blockacks'].tolist() == [3, 2]
+    assert totals['tid'].tolist() == [0, 5]
+    assert totals['retransmitted'].tolist() == [1, 0]
+
+def test_abandoned():
+    columns = rb.blockack_columns(_macs([_blockack(10, 0b1101),
+                                         _blockack(14, 0b1)]))
+    frames = rb.analyze(columns)
+    assert frames['abandoned'].tolist() == [0, 1]
+    assert frames['retransmitted'].tolist() == [0, 0]
+
+def test_other_variants_skipped():
+    basic = struct.pack('<BBH6s6sHH', 0x94, 0, 0, STA1, STA2, 0x0000,
+                        10 << 4) + b'\x01\x00' * 64
+    frames = [_blockack(10, 0b1), basic,
+              _blockack(10, 0b11, ba_type=0x0006),     # multi-TID
+              _blockack(10, 0b111, ba_type=0x000c),    # GCR
+              _blockack(11, 0b1)]
+    columns = rb.blockack_columns(_macs(frames))
+    assert columns['index'].tolist() == [0, 4]
+    assert rb.analyze(columns)['acked'].tolist() == [1, 1]
@@ -0,0 +1,102 @@
+import pytest
+
+import radiotap as r
+from radiotap import pcap
+from radiotap.filter import compile_filter
+from radiotap.template import RadiotapTemplate
+
+from test_pcap import MAC_HDR, _write_pcap
+from test_radiotap import VHT_HDR, _header
+
+ACK = b'\xd4\x00\x00\x00' + b'\x00\x11\x22\x33\x44\x55'
+VENDOR = _header([(1 << 5) | (1 << 30) | (1 << 31), 1],
+                 b'\xc4\x00\x00\x00\x11\x22\x01\x00\x00')
+PACKETS = [VHT_HDR + MAC_HDR, VHT_HDR + ACK, VHT_HDR, VENDOR + MAC_HDR,
+           RadiotapTemplate(['rate']).pack(rate=6.0) + MAC_HDR, b'\x00']
+
+def _slow_match(expression, packet):
+    """Reference result through radiotap_parse() and ieee80211_parse()."""
+    try:
+        off, radiotap = r.radiotap_parse(packet)
+    except Exception:
+        return False
+    if not off:
+        return False
+    off, mac = r.ieee80211_parse(packet, off, addr_format='bytes')
+    values = dict(radiotap, **mac)
+    for name in ('addr1', 'addr2', 'addr3'):
+        if name in values:
+            values[name] = ':'.join('%02x' % b for b in values[name])
+    values.update(mgmt=0, ctrl=1, data=2, ext=3)
+    try:
+        return bool(eval(expression, {}, values))
+    except (NameError, TypeError):
+        return False
+
+@pytest.mark.parametrize('expression', [
+    'chan_freq == 5180 and dbm_antsignal > -70 and type == data',
+    'chan_freq == 5180 and dbm_antsignal < -70 and type == data',
+    'dbm_antsignal <= -60',
+    'type == ctrl or rate >= 6',
+    'not type == data',
+    "addr2 == '66:77:88:99:aa:bb'",
+    'subtype in (8, 13) and flags & 0x40',
+    '-80 < dbm_antsignal < -70',
+    'vht_bandwidth == 80 and vht_gi != 0',
+])
+def test_matches_parse(expression):
+    keep = compile_filter(expression)
+    for packet in PACKETS:
+        assert keep.match(packet) == _slow_match(expression, packet), packet
+
+def test_absent_fields():
+    keep = compile_filter('mcs_index == 7 or TSFT != 0')
+    assert [keep(p) for p in PACKETS] == [True, True, True, False, False,
+                                          False]
+    # a comparison on an absent field is false, so its negation is true
+    assert compile_filter('not TSFT == 0')(PACKETS[4])
+    assert compile_filter('mcs_index == 7') is compile_filter('mcs_index == 7')
+
+@pytest.mark.parametrize('expression', [
+    'foo == 1', 'vht_user == 1', 'chan_freq == dbm_antsignal', 'chan_freq',
+    'chan_freq in 5180', "addr1 & 1", 'chan_freq ==', '1 == 1',
+])
+def test_invalid(expression):
+    if expression == 'chan_freq':
+        compile_filter(expression)
+        return
+    with pytest.raises(ValueError):
+        compile_filter(expression)
+
+def test_read_pcap_where(tmp_path):
+    fn = str(tmp_path / 'capture')
+    _write_pcap(fn, [(1., VHT_HDR + MAC_HDR), (2., VHT_HDR + ACK)])
+    got = list(pcap.read_pcap(fn, parse=True, where='type == data'))
+    assert [ts for ts, _, _ in got] == [1.]
+
+def test_batch_where():
+    pytest.importorskip('numpy')
+    from radiotap.batch import radiotap_parse_batch
+    rows = radiotap_parse_batch(PACKETS, where='chan_freq == 5180')
+    assert len(rows) == 3
+
+def test_malformed_headers_never_match(tmp_path):
+    import struct
+    truncated_bitmap = struct.pack('<BBHI', 0, 0, 8, 1 << 31)
+    overrun = _header([(1 << 1) | (1 << 30) | (1 << 31), 1],
+                      b'\x10\x00\x00\x11\x22\x01\xff\x00abc')
+    keep = compile_filter('chan_freq == 5180')
+    assert [keep(p) for p in (VHT_HDR, truncated_bitmap, overrun,
+                              b'\x00\x00')] == [True, False, False, False]
+    assert not compile_filter('flags == 0x10 or not flags')(overrun)
+
+    fn = str(tmp_path / 'capture')
+    _write_pcap(fn, [(1., VHT_HDR), (2., truncated_bitmap)])
+    got = list(pcap.read_pcap(fn, where='chan_freq == 5180'))
+    assert [ts for ts, _ in got] == [1.]
+
+    pytest.importorskip('numpy')
+    from radiotap.batch import radiotap_parse_batch
+    rows = radiotap_parse_batch([VHT_HDR, truncated_bitmap],
+                                where='chan_freq == 5180')
+    assert rows['status'].tolist() == [0]
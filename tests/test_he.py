@@ -0,0 +1,59 @@
+import struct
+
+import radiotap as r
+from radiotap import he, vht
+
+from test_radiotap import _header
+
+def test_he_rates():
+    # 1SS, 0.8us GI
+    assert he.he_rate(11, 1, 0, 2) == 600.5
+    assert he.he_rate(0, 1, 0, 0) == 8.6
+    assert he.he_rate(7, 2, 2, 1) == 292.5
+    assert he.he_rate(12, 1, 0, 0) is None
+    assert he.eht_rate(13, 2, 0, 4) == 5764.7
+
+def test_vht_tables():
+    descr = vht.vht_rate_description(9, 3, 1, 80)
+    assert descr is vht.vht_rate_description(9, 3, 1, 80)
+    assert descr['vht_rate_mbps'] == 1300.0
+    try:
+        descr['vht_rate_mbps'] = 0
+    except TypeError:
+        pass
+    else:
+        assert False
+    assert vht.vht_rate(10, 1, 0, 20) is None
+    assert vht.vht_rate_description(12, 1, 0, 20)['vht_mcs_descr'] is None
+
+def test_mcs_index_out_of_table():
+    off, fields = r.radiotap_parse(_header([1 << 19], b'\x07\x00\x40'))
+    assert fields['mcs_index'] == 64
+    assert fields['mcs_rate'] is None
+
+def test_he_field():
+    # SU PPDU, MCS 11, 80 MHz, 0.8us GI, 2 streams
+    data = struct.pack('<6H', 0x4020, 0x0002, 0x0b00, 0, 0x0002, 0x0002)
+    off, fields = r.radiotap_parse(_header([1 << 23], data))
+    assert fields['he_mcs'] == 11
+    assert fields['he_nss'] == 2
+    assert fields['he_bandwidth'] == 80
+    assert fields['he_rate_mbps'] == 1201.0
+
+def test_eht_tlvs():
+    usig = struct.pack('<HHIII', 33, 12, 0x0002 | (4 << 15), 0, 0)
+    eht_data = [0] * 9
+    eht_data[0] = 0 << 7
+    user = 0x0002 | 0x0010 | (13 << 20) | (2 << 24)
+    eht = struct.pack('<HH', 34, 44) + struct.pack('<11I', 0x0004, *(eht_data + [user]))
+    unknown = struct.pack('<HH', 99, 2) + b'ab\x00\x00'
+    # flags, then the TLV list aligned to 4 bytes
+    hdr = _header([(1 << 1) | (1 << 28)], b'\x10\x00\x00\x00' + usig + eht + unknown)
+    for fields in (r.radiotap_parse(hdr)[1], r.radiotap_parse_lazy(hdr)[1].to_dict()):
+        assert fields['flags'] == 0x10
+        assert fields['eht_bandwidth'] == 320
+        assert (fields['eht_mcs'], fields['eht_nss'], fields['eht_gi']) == (13, 2, 0)
+        assert fields['eht_rate_mbps'] == 5764.7
+        assert fields['tlvs'][0][0] == 99
+        assert fields['tlvs'][0][1] == b'ab'
+    assert r.radiotap_parse_lazy(hdr)[1].eht_mcs == 13
@@ -0,0 +1,109 @@
+import struct
+
+import radiotap as r
+import radiotap.ie as ri
+
+A1 = b'\xff' * 6
+A2 = b'\x66\x77\x88\x99\xaa\xbb'
+
+def _ie(element_id, data):
+    return struct.pack('<BB', element_id, len(data)) + data
+
+HT_CAP = struct.pack('<HB16sHIB', 0x0062, 0x17, b'\xff\xff' + bytes(14),
+                     0, 0, 0)
+VHT_CAP = struct.pack('<IHHHH', 0x0000006c, 0xfffa, 0, 0xfffa, 0)
+HE_CAP = (b'\x23' + bytes(6) + b'\x0c' + bytes(10) +
+          struct.pack('<HHHH', 0xfffa, 0xfffa, 0xfffe, 0xfffe))
+RSN = (struct.pack('<H', 1) + b'\x00\x0f\xac\x04' +
+       struct.pack('<H', 1) + b'\x00\x0f\xac\x04' +
+       struct.pack('<H', 2) + b'\x00\x0f\xac\x02\x00\x0f\xac\x08' +
+       struct.pack('<H', 0x00cc))
+
+IES = (_ie(ri.IE_SSID, b'lab-net') +
+       _ie(ri.IE_SUPPORTED_RATES, b'\x82\x84\x8b\x96') +
+       _ie(ri.IE_DS_PARAMETER_SET, b'\x24') +
+       _ie(ri.IE_RSN, RSN) +
+       _ie(ri.IE_HT_CAPABILITIES, HT_CAP) +
+       _ie(ri.IE_VHT_CAPABILITIES, VHT_CAP) +
+       _ie(ri.IE_EXTENSION, HE_CAP) +
+       _ie(ri.IE_VENDOR_SPECIFIC, b'\x00\x50\xf2\x02\x01') +
+       _ie(ri.IE_VENDOR_SPECIFIC, b'\x00\x50\xf2\x04'))
+
+BEACON = (struct.pack('<HH', 0x0080, 0) + A1 + A2 + A2 + struct.pack('<H', 0) +
+          struct.pack('<QHH', 123456789, 100, 0x0411) + IES)
+
+def test_beacon():
+    off, mac = r.ieee80211_parse(BEACON, 0)
+    off, mgmt = ri.mgmt_parse(BEACON, off, mac)
+    assert off == len(BEACON)
+    assert (mgmt['timestamp'], mgmt['beacon_interval'],
+            mgmt['capability']) == (123456789, 100, 0x0411)
+
+    ies = mgmt['ies']
+    assert not ies.truncated
+    assert list(ies) == [0, 1, 3, 48, 45, 191, 0xff23, 221, 221]
+    assert ies.get('ssid') == b'lab-net'
+    assert ies[ri.IE_DS_PARAMETER_SET] == 36
+    assert ri.IE_SUPPORTED_RATES in ies and ri.IE_TIM not in ies
+    assert ies.get(ri.IE_SUPPORTED_RATES) == b'\x82\x84\x8b\x96'
+    assert [bytes(v) for v in ies.all(ri.IE_VENDOR_SPECIFIC)] == [
+        b'\x00\x50\xf2\x02\x01', b'\x00\x50\xf2\x04']
+
+    rsn = ies['rsn']
+    assert ri.CIPHER_SUITES[rsn['group_cipher']] == 'CCMP-128'
+    assert [ri.AKM_SUITES[s] for s in rsn['akm_suites']] == ['PSK', 'SAE']
+    assert rsn['rsn_capabilities'] == 0x00cc and 'pmkids' not in rsn
+
+    ht = ies['ht_capabilities']
+    assert (ht['chan_width_40'], ht['sgi_20'], ht['sgi_40']) == (1, 1, 1)
+    assert ht['rx_mcs_bitmask'] == 0xffff
+
+    vht = ies['vht_capabilities']
+    assert (vht['sgi_80'], vht['rx_nss'], vht['tx_nss']) == (1, 2, 2)
+
+    he = ies['he_capabilities']
+    assert he['chan_width_set'] == 0x06
+    assert (he['rx_nss'], he['rx_mcs_160']) == (2, 0xfffe)
+    assert 'rx_mcs_80p80' not in he
+
+    assert sorted(ies.decode()) == ['ds_parameter_set', 'he_capabilities',
+                                    'ht_capabilities', 'rsn', 'ssid',
+                                    'vht_capabilities']
+
+def test_find_ie():
+    body = 36
+    assert ri.find_ie(BEACON, body, ri.IE_SSID) == b'lab-net'
+    assert ri.find_ie(BEACON, body, ri.IE_HE_CAPABILITIES) == HE_CAP[1:]
+    assert ri.find_ie(BEACON, body, ri.IE_TIM) is None
+
+def test_truncated_and_malformed():
+    pkt = BEACON[:-3]
+    off, mac = r.ieee80211_parse(pkt, 0)
+    off, mgmt = ri.mgmt_parse(pkt, off, mac)
+    ies = mgmt['ies']
+    assert ies.truncated
+    assert len(ies.all(ri.IE_VENDOR_SPECIFIC)) == 1
+
+    # an HT capabilities element too short to decode
+    short = BEACON[:36] + _ie(ri.IE_HT_CAPABILITIES, b'\x00\x01')
+    off, mgmt = ri.mgmt_parse(short, 24, r.ieee80211_parse(short, 0)[1])
+    assert ri.IE_HT_CAPABILITIES in mgmt['ies']
+    assert mgmt['ies'].get(ri.IE_HT_CAPABILITIES) is None
+
+def test_other_frames():
+    data = struct.pack('<HH', 0x0008, 0) + A1 + A2 + A2 + bytes(2) + IES
+    off, mac = r.ieee80211_parse(data, 0)
+    assert ri.mgmt_parse(data, off, mac) == (off, {})
+
+    # FCS excluded through end
+    probe = struct.pack('<HH', 0x0040, 0) + A1 + A2 + A2 + bytes(2) + \
+        _ie(ri.IE_SSID, b'') + b'\xde\xad\xbe\xef'
+    off, mac = r.ieee80211_parse(probe, 0)
+    off, mgmt = ri.mgmt_parse(probe, off, mac, end=len(probe) - 4)
+    assert mgmt['ies'].get('ssid') == b'' and not mgmt['ies'].truncated
+
+    reassoc = struct.pack('<HH', 0x0020, 0) + A1 + A2 + A2 + bytes(2) + \
+        struct.pack('<HH', 0x0411, 10) + A2
+    off, mac = r.ieee80211_parse(reassoc, 0)
+    off, mgmt = ri.mgmt_parse(reassoc, off, mac)
+    assert mgmt['current_ap'] == '66:77:88:99:aa:bb' and not len(mgmt['ies'])
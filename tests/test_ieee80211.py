@@ -0,0 +1,63 @@
+import struct
+
+import radiotap as r
+
+A1 = b'\x00\x11\x22\x33\x44\x55'
+A2 = b'\x66\x77\x88\x99\xaa\xbb'
+A3 = b'\x02\x00\x00\x00\x00\x01'
+A4 = b'\x02\x00\x00\x00\x00\x02'
+
+def test_qos_data():
+    pkt = struct.pack('<HH', 0x0188, 44) + A1 + A2 + A3 + \
+        struct.pack('<HH', 0x1230, 0x0015)
+    off, mac = r.ieee80211_parse(pkt, 0)
+    assert off == len(pkt)
+    assert (mac['type'], mac['subtype']) == (2, 8)
+    assert mac['addr2'] == '66:77:88:99:aa:bb'
+    assert 'addr4' not in mac
+    assert (mac['seq'], mac['tid'], mac['eosp']) == (0x123, 5, 1)
+
+def test_data_offset():
+    # the body of QoS data starts after QoS control, of plain data after seq
+    qos = struct.pack('<HH', 0x0088, 0) + A1 + A2 + A3 + \
+        struct.pack('<HH', 0, 0x0003) + b'\xaa\xaa\x03'
+    off, mac = r.ieee80211_parse(qos, 0)
+    assert off == 26 and mac['tid'] == 3
+    data = struct.pack('<HH', 0x0008, 0) + A1 + A2 + A3 + \
+        struct.pack('<H', 0) + b'\xaa\xaa\x03'
+    off, mac = r.ieee80211_parse(data, 0)
+    assert off == 24 and 'tid' not in mac
+
+def test_wds_data():
+    pkt = struct.pack('<HH', 0x0388, 0) + A1 + A2 + A3 + \
+        struct.pack('<H', 0) + A4 + struct.pack('<H', 3)
+    off, mac = r.ieee80211_parse(pkt, 0, addr_format='int')
+    assert off == len(pkt)
+    assert mac['addr4'] == 0x020000000002
+    assert mac['tid'] == 3
+
+def test_control_frames():
+    ack = struct.pack('<HH', 0x00d4, 0) + A1 + b'\xff' * 12
+    off, mac = r.ieee80211_parse(ack, 0)
+    assert off == 10 and 'addr2' not in mac
+
+    rts = struct.pack('<HH', 0x00b4, 0) + A1 + A2
+    off, mac = r.ieee80211_parse(rts, 0, addr_format='bytes')
+    assert off == 16 and mac['addr2'] == A2
+
+    trigger = struct.pack('<HH', 0x0024, 0) + A1 + A2 + b'\x00' * 8
+    off, mac = r.ieee80211_parse(trigger, 0, addr_format='bytes')
+    assert off == 16 and (mac['addr1'], mac['addr2']) == (A1, A2)
+
+    blkack = struct.pack('<HH', 0x0094, 0) + A1 + A2 + \
+        struct.pack('<HH', 0x0005, 0x0640) + b'\xff' * 8
+    off, mac = r.ieee80211_parse(blkack, 0)
+    assert r.radiotap.is_blkack(mac)
+    assert (mac['ba_ssc'], mac['ba_bitmap']) == (0x0640, b'\xff' * 8)
+
+def test_addresses_are_interned():
+    pkt = struct.pack('<HH', 0x0080, 0) + A1 + A2 + A3 + b'\x00\x00'
+    _, mac1 = r.ieee80211_parse(pkt, 0)
+    _, mac2 = r.ieee80211_parse(bytes(bytearray(pkt)), 0)
+    assert mac1['addr3'] is mac2['addr3']
+    assert (mac1['type'], mac1['subtype']) == (0, 8)
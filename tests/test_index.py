@@ -0,0 +1,89 @@
+import struct
+
+import pytest
+
+import radiotap as r
+from radiotap import index as ri
+
+from test_pcap import MAC_HDR, RECORDS, _write_pcap, _write_pcapng
+from test_radiotap import VHT_HDR
+
+STA = '66:77:88:99:aa:bb'
+
+@pytest.mark.parametrize('writer', [_write_pcap, _write_pcapng])
+def test_query(tmp_path, writer):
+    fn = str(tmp_path / 'capture')
+    writer(fn, RECORDS)
+    with ri.CaptureIndex(fn) as idx:
+        assert len(idx) == 2
+        entry = idx.entry(0)
+        off, radiotap = r.radiotap_parse(VHT_HDR)
+        assert entry['tsft'] == radiotap['TSFT']
+        assert entry['valid'] & ri.HAS_ADDR2
+        assert (entry['type'], entry['subtype']) == (2, 8)
+        assert entry['addr2'] == bytes.fromhex(STA.replace(':', ''))
+        assert idx.entry(1)['valid'] & ri.HAS_ADDR1 == 0
+        assert bytes(idx.packet(1)) == VHT_HDR
+
+        assert idx.select(start=2, end=3) == [1]
+        assert idx.select(station=STA) == [0]
+        assert idx.select(station=0x00112233445) == []
+        assert idx.select(tsft_start=radiotap['TSFT'] + 1) == []
+        (tstamp, radiotap, mac), = idx.query(station=STA)
+        assert tstamp == pytest.approx(1.5)
+        assert mac['addr2'] == STA
+
+def test_incremental(tmp_path):
+    fn = str(tmp_path / 'capture')
+    _write_pcap(fn, RECORDS)
+    assert ri.build_index(fn) == 2
+    assert ri.build_index(fn) == 0
+
+    # append a record and a partial one, as a live capture would
+    pkt = VHT_HDR + MAC_HDR
+    with open(fn, 'ab') as f:
+        f.write(struct.pack('<IIII', 3, 0, len(pkt), len(pkt)) + pkt)
+        f.write(struct.pack('<IIII', 4, 0, len(pkt), len(pkt)) + pkt[:5])
+    with ri.CaptureIndex(fn, update=False) as idx:
+        assert len(idx) == 2
+        assert idx.update() == 1
+        assert idx.select(start=3) == [2]
+        assert idx.update() == 0
+
+    # capture replaced by a shorter one
+    _write_pcap(fn, RECORDS[1:])
+    assert ri.build_index(fn) == 1
+
+    # by one of the same size, then by a longer one
+    _write_pcap(fn, [(7.5, VHT_HDR)])
+    assert ri.build_index(fn) == 1
+    with ri.CaptureIndex(fn) as idx:
+        assert idx.entry(0)['tstamp'] == 7.5
+    _write_pcap(fn, [(8.5, VHT_HDR + MAC_HDR)] * 3)
+    assert ri.build_index(fn) == 3
+
+def test_select_time_range(tmp_path):
+    fn = str(tmp_path / 'capture')
+    records = [(ts / 4., VHT_HDR + MAC_HDR) for ts in range(40)]
+    for order in (records, records[20:] + records[:20]):
+        _write_pcap(fn, order)
+        with ri.CaptureIndex(fn) as idx:
+            for start, end in [(None, 3), (2, None), (2, 5.25), (5, 2),
+                               (-1, 100), (20, 30)]:
+                expected = [i for i, (ts, _) in enumerate(order)
+                            if (start is None or ts >= start) and
+                            (end is None or ts < end)]
+                assert idx.select(start=start, end=end) == expected
+                assert idx.select(start=start, end=end, station=STA) == \
+                    expected
+            assert idx._sorted_by_time() == (order is records)
+
+def test_array(tmp_path):
+    np = pytest.importorskip('numpy')
+    fn = str(tmp_path / 'capture')
+    _write_pcap(fn, RECORDS)
+    with ri.CaptureIndex(fn) as idx:
+        entries = idx.array()
+        assert entries['tstamp'].tolist() == pytest.approx([1.5, 2.25])
+        assert entries['length'].tolist() == [len(d) for _, d in RECORDS]
+        del entries
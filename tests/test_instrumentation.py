@@ -0,0 +1,37 @@
+import struct
+
+import pytest
+
+import radiotap as r
+
+from test_radiotap import VHT_HDR, _header
+
+@pytest.fixture
+def inst():
+    r.enable_instrumentation(timing_sample=2)
+    yield
+    r.disable_instrumentation()
+
+def test_disabled():
+    assert r.instrumentation_snapshot() is None
+
+def test_counters(inst):
+    vendor = _header([(1 << 1) | (1 << 30) | (1 << 31), 1],
+                     b'\x10\x00\x00\x11\x22\x01\x00\x00')
+    unknown = _header([1 << 31, 1], b'')
+    for packet in (VHT_HDR, VHT_HDR, vendor, unknown, b'\x00\x00',
+                   b'\x01' * 8):
+        r.radiotap_parse(packet)
+
+    # TSFT announced but the packet ends after the bitmap
+    with pytest.raises(struct.error):
+        r.radiotap_parse(struct.pack('<BBHI', 0, 0, 8, 1))
+
+    snap = r.instrumentation_snapshot()
+    assert snap['headers'] == 7
+    assert (snap['truncated'], snap['bad_version']) == (1, 1)
+    assert snap['errors'] == 1
+    assert snap['fields']['radiotap'][21] == 2
+    assert snap['unknown_fields'] == {32: 1}
+    assert snap['vendor_namespaces'] == {'00:11:22/1': 1}
+    assert snap['timing']['_parse_vht']['calls'] == 1
@@ -0,0 +1,76 @@
+from radiotap import pcap
+from radiotap.parallel import parse_file_parallel
+
+from test_pcap import MAC_HDR, _write_pcap, _write_pcapng
+from test_radiotap import VHT_HDR
+
+def test_parallel_matches_sequential(tmp_path):
+    fn = str(tmp_path / 'capture.pcap')
+    _write_pcap(fn, [(i, VHT_HDR + MAC_HDR) for i in range(50)])
+    expected = list(pcap.read_pcap(fn, parse=True))
+
+    stats = {}
+    got = list(parse_file_parallel(fn, workers=2, chunk_records=7, stats=stats))
+    assert got == expected
+    assert stats['packets'] == 50
+
+    got = list(parse_file_parallel(fn, workers=2, chunk_records=7,
+                                   ordered=False))
+    assert sorted(got, key=lambda r: r[0]) == expected
+
+def test_process_executor_detaches_tlvs(tmp_path):
+    import struct
+
+    from test_radiotap import _header
+
+    # flags, then an unknown TLV returned as (type, data)
+    tlv_hdr = _header([(1 << 1) | (1 << 28)], b'\x10\x00\x00\x00' +
+                      struct.pack('<HH', 99, 2) + b'ab\x00\x00')
+    fn = str(tmp_path / 'capture.pcap')
+    _write_pcap(fn, [(i, (tlv_hdr if i % 2 else VHT_HDR) + MAC_HDR)
+                     for i in range(20)])
+    expected = list(pcap.read_pcap(fn, parse=True))
+
+    got = list(parse_file_parallel(fn, workers=2, chunk_records=3))
+    assert got == expected
+    assert got[1][1]['tlvs'] == [(99, b'ab')]
+    assert isinstance(got[1][1]['tlvs'][0][1], bytes)
+
+def test_parallel_pcapng(tmp_path):
+    fn = str(tmp_path / 'capture.pcapng')
+    _write_pcapng(fn, [(i, VHT_HDR + MAC_HDR) for i in range(50)])
+    expected = list(pcap.read_pcap(fn, parse=True))
+    assert list(parse_file_parallel(fn, workers=2, chunk_records=7)) == \
+        expected
+
+def test_thread_executor(tmp_path):
+    fn = str(tmp_path / 'capture.pcap')
+    _write_pcap(fn, [(i, VHT_HDR + MAC_HDR) for i in range(50)])
+    expected = list(pcap.read_pcap(fn, parse=True))
+
+    stats = {}
+    got = list(parse_file_parallel(fn, workers=4, chunk_records=3,
+                                   stats=stats, executor='thread'))
+    assert got == expected
+    assert (stats['packets'], stats['executor']) == (50, 'thread')
+
+def test_shared_caches_across_threads():
+    import concurrent.futures
+
+    import radiotap as r
+    from test_radiotap import _header
+
+    r.plan_cache_clear()
+    r.enable_instrumentation()
+    try:
+        # more layouts than the cache holds, so threads evict each other's
+        packets = [_header([i << 1], b'\x00' * 64) for i in range(400)]
+        expected = [r.radiotap_parse(p) for p in packets]
+        with concurrent.futures.ThreadPoolExecutor(8) as pool:
+            for _ in range(4):
+                assert list(pool.map(r.radiotap_parse, packets)) == expected
+        info = r.plan_cache_info()
+        assert info.hits + info.misses == 5 * len(packets)
+        assert r.instrumentation_snapshot()['headers'] == 5 * len(packets)
+    finally:
+        r.disable_instrumentation()
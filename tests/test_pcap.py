@@ -0,0 +1,90 @@
+import struct
+
+import pytest
+
+from radiotap import pcap
+
+from test_radiotap import VHT_HDR
+
+# QoS data frame header following the radiotap header
+MAC_HDR = (b'\x88\x01\x2c\x00' + b'\x00\x11\x22\x33\x44\x55' +
+           b'\x66\x77\x88\x99\xaa\xbb' + b'\x00\x11\x22\x33\x44\x55' +
+           b'\x10\x00')
+
+def _write_pcap(path, records, linktype=127):
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 65535, linktype))
+        for ts, data in records:
+            f.write(struct.pack('<IIII', int(ts), int(ts * 1e6) % 1000000,
+                                len(data), len(data)))
+            f.write(data)
+
+def _block(block_type, body):
+    body += b'\x00' * (-len(body) % 4)
+    length = len(body) + 12
+    return struct.pack('<II', block_type, length) + body + struct.pack('<I', length)
+
+def _write_pcapng(path, records):
+    with open(path, 'wb') as f:
+        f.write(_block(0x0a0d0d0a, struct.pack('<IHHq', 0x1a2b3c4d, 1, 0, -1)))
+        # ethernet interface, then radiotap with nanosecond resolution
+        f.write(_block(1, struct.pack('<HHI', 1, 0, 0)))
+        f.write(_block(1, struct.pack('<HHI', 127, 0, 0) +
+                       struct.pack('<HHB3x', 9, 1, 9) + struct.pack('<HH', 0, 0)))
+        f.write(_block(6, struct.pack('<IIIII', 0, 0, 0, 4, 4) + b'\xff' * 4))
+        for ts, data in records:
+            ticks = int(round(ts * 1e9))
+            f.write(_block(6, struct.pack('<IIIII', 1, ticks >> 32,
+                                          ticks & 0xffffffff,
+                                          len(data), len(data)) + data))
+
+RECORDS = [(1.5, VHT_HDR + MAC_HDR), (2.25, VHT_HDR)]
+
+@pytest.mark.parametrize('writer', [_write_pcap, _write_pcapng])
+def test_read_records(tmp_path, writer):
+    fn = str(tmp_path / 'capture')
+    writer(fn, RECORDS)
+    got = [(ts, bytes(pkt)) for ts, pkt in pcap.read_pcap(fn)]
+    assert [bytes(d) for _, d in RECORDS] == [d for _, d in got]
+    assert [ts for ts, _ in got] == pytest.approx([ts for ts, _ in RECORDS])
+
+@pytest.mark.parametrize('writer', [_write_pcap, _write_pcapng])
+def test_records_from_index(tmp_path, writer):
+    fn = str(tmp_path / 'capture')
+    writer(fn, RECORDS)
+    with pcap.PcapReader(fn) as reader:
+        offsets = reader.index()
+        assert len(offsets) == 2
+        (ts, pkt), = reader.records(offsets[1])
+        assert bytes(pkt) == VHT_HDR
+
+@pytest.mark.parametrize('writer', [_write_pcap, _write_pcapng])
+def test_chunks(tmp_path, writer):
+    fn = str(tmp_path / 'capture')
+    writer(fn, [(i, VHT_HDR + bytes([i])) for i in range(10)])
+    with pcap.PcapReader(fn) as reader:
+        expected = [(ts, bytes(pkt)) for ts, pkt in reader.records()]
+        chunks = reader.chunks(4)
+        assert [start for start, _, _ in chunks] == reader.index()[::4]
+        assert chunks[-1][1] is None
+        got = [(ts, bytes(pkt)) for start, end, state in chunks
+               for ts, pkt in reader.records(start, end, state)]
+        assert got == expected
+        if writer is _write_pcapng:
+            # the interfaces carried in state, not rescanned from offset 0
+            start, end, state = chunks[1]
+            assert state[0] == '<' and len(state[1]) == 2
+            assert len(list(reader.records(start, end, ('<', ())))) == 0
+
+def test_read_parsed(tmp_path):
+    fn = str(tmp_path / 'capture.pcap')
+    _write_pcap(fn, RECORDS)
+    (ts, radiotap, mac), _ = pcap.read_pcap(fn, parse=True)
+    assert radiotap['chan_freq'] == 5180
+    assert mac['addr2'] == '66:77:88:99:aa:bb'
+
+def test_wrong_linktype(tmp_path):
+    fn = str(tmp_path / 'capture.pcap')
+    _write_pcap(fn, RECORDS, linktype=1)
+    with pytest.raises(ValueError):
+        pcap.PcapReader(fn)
@@ -0,0 +1,293 @@
+import struct
+
+import pytest
+
+import radiotap as r
+from radiotap import radiotap as rt
+
+# Frame 1 of test_vht.test_ac_rate_1, radiotap header only
+VHT_HDR = (b"\x00\x00&\x00+H \x00)m\x18\x10\x00\x00\x00\x00@\x00<\x14@\x01\xb4\x00"
+           b"\x00\x00D\x00\x04\x04\x93\x00\x00\x00\x00\x00\x00\x00")
+
+def _slow_parse(packet):
+    """Walk the header field by field through the _parse_* functions."""
+    version, pad, radiotap_len, present = struct.unpack_from('<BBHI', packet)
+    offset = 8
+    while present & (1 << 31):
+        present, = struct.unpack_from('<I', packet, offset)
+        offset += 4
+    fields = {}
+    for namespace, i in rt._present_bits(packet, 4, offset):
+        if i is None:
+            continue
+        offset, f = rt._parse_radiotap_field(namespace, i, packet, offset)
+        fields.update(f)
+        if offset == radiotap_len or offset is None:
+            break
+    return fields
+
+def _header(present, body):
+    words = struct.pack('<%dI' % len(present), *present)
+    return struct.pack('<BBH', 0, 0, 4 + len(words) + len(body)) + words + body
+
+def test_plan_matches_field_parsers():
+    r.plan_cache_clear()
+    hdrs = [
+        VHT_HDR,
+        # TSFT after flags forces 7 bytes of padding
+        _header([0x3], struct.pack('<Q', 1234) + b'\x10'),
+        # flags, rate, tx_flags, mcs, ampdu
+        _header([(1 << 1) | (1 << 2) | (1 << 15) | (1 << 19) | (1 << 20)],
+                b'\x10\x0c\x00\x00\x07\x04\x07\x00\x00\x00\x00\x00'
+                b'\x11\x22\x33\x44\x08\x00\x00\x00'),
+        # extended bitmap, second word restarts the radiotap namespace
+        _header([(1 << 5) | (1 << 29) | (1 << 31), 1 << 3],
+                b'\xc4\x00\x3c\x14\x40\x01'),
+    ]
+    for hdr in hdrs:
+        off, fields = r.radiotap_parse(hdr)
+        assert off == len(hdr)
+        assert fields == _slow_parse(hdr)
+
+def test_plan_cache_counters():
+    r.plan_cache_clear()
+    for _ in range(3):
+        r.radiotap_parse(VHT_HDR)
+    info = r.plan_cache_info()
+    assert (info.hits, info.misses, info.currsize) == (2, 1, 1)
+
+def test_plan_cache_hits_do_not_lock():
+    cache = rt._PlanCache(2, lambda key: [key])
+    plan = cache.lookup(1)
+    assert cache.lookup(1) is plan
+    lock, cache._lock = cache._lock, None
+    assert cache.lookup(1) is plan
+    cache._lock = lock
+    cache.lookup(2)
+    cache.lookup(3)
+    assert (len(cache), cache.hits, cache.misses) == (2, 2, 3)
+    assert 1 not in cache._plans
+
+def test_plan_cache_is_bounded():
+    r.plan_cache_clear()
+    for i in range(rt.PLAN_CACHE_SIZE + 10):
+        r.radiotap_parse(_header([i << 1], b'\x00' * 64))
+    assert r.plan_cache_info().currsize == rt.PLAN_CACHE_SIZE
+
+def test_truncated_fields_fall_back():
+    # radiotap_len stops right after flags although rate is announced
+    hdr = struct.pack('<BBHIB', 0, 0, 9, 0x6, 0x10) + b'\x0c'
+    assert r.radiotap_parse(hdr) == (9, {'flags': 0x10})
+
+def test_valuelist():
+    off, fields = r.radiotap_parse(VHT_HDR, valuelist=True)
+    assert [list(f)[0] for f in fields] == [
+        'TSFT', 'flags', 'chan_freq', 'dbm_antsignal', 'antenna',
+        'rx_flags', 'vht_known']
+
+def test_vendor_namespace_is_not_copied():
+    hdr = _header([(1 << 1) | (1 << 30) | (1 << 31), 1 << 0],
+                  b'\x10\x00' + b'\x00\x11\x22\x01' + struct.pack('<H', 4) +
+                  b'abcd')
+    for packet in (hdr, bytearray(hdr), memoryview(hdr)):
+        off, fields = r.radiotap_parse(packet)
+        assert off == len(hdr)
+        assert fields['flags'] == 0x10
+        vendor = fields[b'\x00\x11\x22']
+        assert isinstance(vendor['data'], memoryview)
+        assert vendor['data'] == b'abcd'
+        assert vendor['present'] == 1
+
+def _vendor_header(present, data):
+    # flags at 12, the vendor data starts at 20 (4 mod 8)
+    return _header([(1 << 1) | (1 << 30) | (1 << 31), present],
+                   b'\x10\x00' + b'\x00\x11\x22\x01' +
+                   struct.pack('<H', len(data)) + data)
+
+def test_vendor_decoder():
+    data = struct.pack('<2b2xQ', -40, -42, 1 << 40)
+    r.register_vendor_namespace('00:11:22', 1, [
+        ('chain_rssi', '2b'), None, (('counter',), 'Q')])
+    try:
+        off, fields = r.radiotap_parse(_vendor_header(0b101, data))
+        vendor = fields[b'\x00\x11\x22']
+        assert vendor['present'] == 0b101
+        # counter is aligned to 8 in the header, not in the vendor data
+        assert vendor['chain_rssi'] == (-40, -42)
+        assert vendor['counter'] == 1 << 40
+
+        # decoding stops at a presence bit the layout lacks
+        off, fields = r.radiotap_parse(_vendor_header(0b1001, data))
+        vendor = fields[b'\x00\x11\x22']
+        assert vendor['chain_rssi'] == (-40, -42) and 'counter' not in vendor
+
+        # fields that do not fit the data are left alone
+        off, fields = r.radiotap_parse(_vendor_header(0b101, data[:8]))
+        assert 'chain_rssi' not in fields[b'\x00\x11\x22']
+
+        status, off, fields = r.radiotap_parse_checked(
+            _vendor_header(0b101, data), valuelist=True)
+        assert status == rt.PARSE_OK
+        assert fields[-1]['counter'] == 1 << 40
+    finally:
+        r.unregister_vendor_namespace(b'\x00\x11\x22', 1)
+
+    off, fields = r.radiotap_parse(_vendor_header(0b101, data))
+    assert 'counter' not in fields[b'\x00\x11\x22']
+
+def test_vendor_registration_during_compile(monkeypatch):
+    data = struct.pack('<2b2xQ', -40, -42, 1 << 40)
+    compile = rt._vendor_plans.compile
+
+    def racing_compile(key):
+        # the layout changes after this plan read the old one
+        plan = compile(key)
+        monkeypatch.setattr(rt._vendor_plans, 'compile', compile)
+        r.register_vendor_namespace('00:11:22', 1, [('chain_rssi', '2b')])
+        return plan
+
+    r.register_vendor_namespace('00:11:22', 1, [('chain_rssi', 'b')])
+    monkeypatch.setattr(rt._vendor_plans, 'compile', racing_compile)
+    try:
+        off, fields = r.radiotap_parse(_vendor_header(0b1, data))
+        assert fields[b'\x00\x11\x22']['chain_rssi'] == -40
+        off, fields = r.radiotap_parse(_vendor_header(0b1, data))
+        assert fields[b'\x00\x11\x22']['chain_rssi'] == (-40, -42)
+    finally:
+        r.unregister_vendor_namespace(b'\x00\x11\x22', 1)
+
+def test_vendor_decoder_errors():
+    for fields in ([('data', 'B')], [(('a', 'b'), 'B')]):
+        try:
+            r.register_vendor_namespace(b'\x00\x11\x22', 1, fields)
+        except ValueError:
+            pass
+        else:
+            assert False, fields
+    try:
+        r.register_vendor_namespace(b'\x00\x11', 1, [('a', 'B')])
+    except ValueError:
+        pass
+    else:
+        assert False
+
+def test_lazy_header():
+    off, hdr = r.radiotap_parse_lazy(VHT_HDR)
+    off2, fields = r.radiotap_parse(VHT_HDR)
+    assert off == off2
+    assert hdr.dbm_antsignal == fields['dbm_antsignal']
+    assert hdr['chan_flags'] == fields['chan_flags']
+    assert 'mcs_rate' not in hdr
+    assert hdr.get('mcs_rate') is None
+    assert sorted(hdr) == sorted(fields)
+    assert hdr.to_dict() == fields
+
+    # U-SIG and an unknown TLV, but no EHT TLV
+    usig = struct.pack('<HHIII', 33, 12, 0x0002 | (4 << 15), 0, 0)
+    tlv_hdr = _header([(1 << 1) | (1 << 28)], b'\x10\x00\x00\x00' + usig +
+                      struct.pack('<HH', 99, 2) + b'ab\x00\x00')
+    off, fields = r.radiotap_parse(tlv_hdr)
+    for access in ('contains', 'keys', 'get'):
+        off, hdr = r.radiotap_parse_lazy(tlv_hdr)
+        if access == 'contains':
+            assert 'eht_user_info' not in hdr and 'eht_known' not in hdr
+            assert 'usig_common' in hdr and 'tlvs' in hdr
+        elif access == 'get':
+            assert hdr.get('eht_data') is None and 'eht_data' not in hdr
+        assert sorted(hdr) == sorted(fields)
+        assert hdr.to_dict() == fields
+    off, hdr = r.radiotap_parse_lazy(tlv_hdr)
+    assert hdr.to_dict() == fields and sorted(hdr) == sorted(fields)
+
+def test_lazy_header_fallback():
+    off, hdr = r.radiotap_parse_lazy(b'\x01\x00')
+    assert (off, len(hdr)) == (0, 0)
+    hdr = _header([(1 << 1) | (1 << 30) | (1 << 31), 0],
+                  b'\x10\x00' + b'\x00\x11\x22\x01\x00\x00')
+    off, lazy = r.radiotap_parse_lazy(hdr)
+    assert lazy.flags == 0x10
+    assert lazy.to_dict() == r.radiotap_parse(hdr)[1]
+
+def test_lazy_header_copy():
+    import copy
+    import pickle
+
+    off, fields = r.radiotap_parse(VHT_HDR)
+    off, hdr = r.radiotap_parse_lazy(memoryview(VHT_HDR + b'frame'))
+    assert hdr.dbm_antsignal == -76
+    for dup in (copy.copy(hdr), copy.deepcopy(hdr),
+                pickle.loads(pickle.dumps(hdr))):
+        assert dup.length == off and dup.present == hdr.present
+        assert dup.to_dict() == fields
+    assert pickle.loads(pickle.dumps(
+        r.radiotap_parse_lazy(b'\x01\x00')[1])).length == 0
+    with pytest.raises(AttributeError):
+        hdr._missing
+
+def test_field_projection():
+    wanted = r.compile_fields(['dbm_antsignal', 'chan_freq'])
+    off, fields = r.radiotap_parse(VHT_HDR, fields=wanted)
+    assert off == len(VHT_HDR)
+    assert fields == {'dbm_antsignal': -76, 'chan_freq': 5180,
+                      'chan_flags': 0x140}
+    assert r.radiotap_parse(VHT_HDR, fields=['TSFT'])[1] == {
+        'TSFT': 270036265}
+
+def test_field_projection_slow_path():
+    hdr = _header([(1 << 1) | (1 << 3) | (1 << 30) | (1 << 31), 1],
+                  b'\x10\x00\x3c\x14\x40\x01' + b'\x00\x11\x22\x01' +
+                  struct.pack('<H', 2) + b'ab')
+    assert r.radiotap_parse(hdr, fields=['chan_freq'])[1] == {
+        'chan_freq': 5180, 'chan_flags': 0x140}
+    off, fields = r.radiotap_parse(hdr, fields=['flags', b'\x00\x11\x22'])
+    assert fields['flags'] == 0x10
+    assert fields[b'\x00\x11\x22']['data'] == b'ab'
+
+def test_field_projection_unknown_name():
+    try:
+        r.compile_fields(['no_such_field'])
+    except ValueError:
+        pass
+    else:
+        assert False
+
+def test_field_layouts_match_parsers():
+    # every fixed-size field, after a flags byte to exercise alignment
+    for i in range(len(rt._field_layouts)):
+        hdr = _header([(1 << 1) | (1 << i)], bytes(range(1, 33)))
+        assert r.radiotap_parse(hdr)[1] == _slow_parse(hdr), i
+
+def test_parse_checked():
+    vendor = _header([(1 << 1) | (1 << 30) | (1 << 31), 1],
+                     b'\x10\x00\x00\x11\x22\x01\x03\x00abc')
+    cases = [
+        (VHT_HDR, rt.PARSE_OK, len(VHT_HDR)),
+        (vendor, rt.PARSE_OK, len(vendor)),
+        (b'\x00\x00\x08', rt.PARSE_TRUNCATED, 0),
+        (b'\x01' * 8, rt.PARSE_BAD_VERSION, 0),
+        # extended bitmap running past radiotap_len
+        (struct.pack('<BBHI', 0, 0, 8, 1 << 31) + b'\xff' * 8,
+         rt.PARSE_TRUNCATED, 0),
+        # VHT field cut short: the fields before it are still decoded
+        (VHT_HDR[:2] + struct.pack('<H', 30) + VHT_HDR[4:30],
+         rt.PARSE_TRUNCATED, 30),
+        (_header([1 << 1 | 1 << 28 | 1 << 31, 1 << 1], b'\x10'),
+         rt.PARSE_OK, 13),
+        (_header([1 << 1 | 1 << 31, 1], b'\x10'), rt.PARSE_UNKNOWN_FIELD, 13),
+        # vendor skip_length past the end of the header
+        (vendor[:-5] + b'\xff\x00abc', rt.PARSE_VENDOR_OVERRUN, len(vendor)),
+        # vendor namespace then a field past the end of the header
+        (_header([(1 << 30) | (1 << 31), 1 << 29 | 1 << 31, 1],
+                 b'\x00\x11\x22\x01\x00\x00'),
+         rt.PARSE_TRUNCATED, 22),
+    ]
+    for packet, status, offset in cases:
+        got = r.radiotap_parse_checked(packet)
+        assert got[:2] == (status, offset), packet
+        assert r.PARSE_STATUS_NAMES[status]
+
+    status, off, fields = r.radiotap_parse_checked(cases[5][0])
+    assert fields['TSFT'] == r.radiotap_parse(VHT_HDR)[1]['TSFT']
+    assert 'vht_known' not in fields
+    assert r.radiotap_parse_checked(VHT_HDR, fields=['TSFT'])[2] == \
+        {'TSFT': 270036265}
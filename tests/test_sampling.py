@@ -0,0 +1,66 @@
+import pytest
+
+from radiotap import sampling
+
+from test_pcap import MAC_HDR
+from test_radiotap import VHT_HDR
+
+def _frame(station):
+    return VHT_HDR + MAC_HDR[:10] + bytes([0, 0, 0, 0, 0, station]) + \
+        MAC_HDR[16:]
+
+def test_every_nth():
+    sampler = sampling.EveryNth(3)
+    records = [(float(i), _frame(0)) for i in range(10)]
+    got = list(sampling.sample_records(records, sampler))
+    assert [(ts, weight) for ts, weight, _, _ in got] == \
+        [(0., 3), (3., 3), (6., 3), (9., 3)]
+    assert got[0][2]['chan_freq'] == 5180
+    assert (sampler.offered, sampler.kept) == (10, 4)
+
+def test_station():
+    sampler = sampling.StationSampler(4, salt=b'x')
+    kept = set()
+    for rounds in range(3):
+        for station in range(256):
+            if sampler.sample(_frame(station)):
+                kept.add(station)
+    # the same stations every time, about a quarter of them
+    assert sampler.kept == 3 * len(kept)
+    assert 32 < len(kept) < 96
+    assert sampling.StationSampler(1).sample(b'\x00') == 1
+
+def test_adaptive():
+    now = [0.]
+    sampler = sampling.AdaptiveSampler(budget=0.5, interval=1.,
+                                       clock=lambda: now[0])
+    # 1000 packets per second offered, 1ms each to parse: twice the budget
+    total = 0.
+    for i in range(3000):
+        now[0] = i / 1000.
+        weight = sampler.sample(b'')
+        if weight:
+            sampler.parsed(0.001)
+            total += weight
+    assert sampler.probability == pytest.approx(0.5)
+    assert total == pytest.approx(3000, rel=0.01)
+    assert sampler.kept == pytest.approx(2000, rel=0.01)
+
+def test_adaptive_clock_edge_cases():
+    with pytest.raises(ValueError):
+        sampling.AdaptiveSampler(interval=0)
+    # an adjustment at the time of the previous one leaves it alone
+    sampler = sampling.AdaptiveSampler(interval=1., clock=lambda: 0.)
+    sampler.sample(b'')
+    sampler.parsed(0.001)
+    sampler._adjust(0.)
+    assert sampler.probability == 1.
+
+def test_sample_records_skips_malformed():
+    bad = VHT_HDR[:2] + b'\x08\x00\x00\x00\x00\x80'   # bitmap past the packet
+    records = [(0., _frame(1)), (1., bad), (2., b'\x01' + VHT_HDR[1:]),
+               (3., _frame(2))]
+    got = list(sampling.sample_records(records, sampling.Sampler()))
+    assert [(tstamp, weight) for tstamp, weight, _, _ in got] == [(0., 1),
+                                                                 (3., 1)]
+    assert got[1][2]['dbm_antsignal'] == -76
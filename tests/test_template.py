@@ -0,0 +1,37 @@
+import radiotap as r
+from radiotap.template import RadiotapTemplate
+
+def test_round_trip():
+    tpl = RadiotapTemplate(
+        ['rate', 'tx_flags', 'data_retries', 'mcs_index', 'vht_known', 'TSFT'],
+        tx_flags=0x0008, mcs_known=0x07, mcs_flags=0x04,
+        vht_known=0x0044, vht_flags=0x04, vht_bw=4, vht_mcs_nss=(0x93, 0, 0, 0))
+    for values in ({}, {'rate': 6.0, 'data_retries': 3, 'mcs_index': 7,
+                        'TSFT': 1 << 40}):
+        hdr = tpl.pack(**values)
+        assert len(hdr) == tpl.size
+        off, fields = r.radiotap_parse(hdr + b'payload')
+        assert off == tpl.size
+        assert fields['tx_flags'] == 0x0008
+        assert fields['vht_user'][0]['vht_rate_mbps'] == 1300.0
+        for name, value in values.items():
+            assert fields[name] == value
+    assert fields['mcs_rate'] == 72.2
+
+def test_pack_into_and_vendor():
+    tpl = RadiotapTemplate(['flags'], vendor=[(b'\x00\x11\x22', 1, b'abc', 1)])
+    buf = bytearray(tpl.size + 4)
+    assert tpl.pack_into(buf, 0, flags=0x10) == tpl.size
+    off, fields = r.radiotap_parse(bytes(buf))
+    assert off == tpl.size
+    assert fields['flags'] == 0x10
+    vendor = fields[b'\x00\x11\x22']
+    assert (vendor['subns'], vendor['data'], vendor['present']) == (1, b'abc', 1)
+
+def test_unknown_field():
+    try:
+        RadiotapTemplate(['rate'], chan_freq=2412)
+    except ValueError:
+        pass
+    else:
+        assert False